@@ -4,13 +4,222 @@ Document Loader
 Charge les documents PDF et images pour traitement OCR
 """
 
+import ctypes
+import hashlib
+import io
 import logging
+import mmap
 import os
-from typing import Optional
+import threading
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as FuturesTimeout
+from typing import Dict, Iterable, Iterator, List, Optional
 from pathlib import Path
 
+from utils.cache import LRUCache
+from utils.deadline import Deadline, DeadlineExceeded
+from utils.text_view import TextView
+
 logger = logging.getLogger("OCREngine.Loader")
 
+# Langues Tesseract et résolution de rasterisation pour les PDF scannés
+PDF_OCR_LANG = 'fra+eng'
+PDF_OCR_DPI = 200  # 200 DPI pour meilleure qualité
+
+
+def _ocr_page_image(image, lang: str, timeout: float = 0) -> str:
+    """
+    OCR d'une page rasterisée (exécuté dans un worker du pool de processus)
+    
+    Fonction de module pour rester picklable par ProcessPoolExecutor.
+    `timeout` (secondes, 0 = illimité) tue le process tesseract au-delà.
+    """
+    import pytesseract
+    return pytesseract.image_to_string(image, lang=lang, timeout=timeout)
+
+
+def _is_tesseract_timeout(error: Exception) -> bool:
+    """pytesseract signale un timeout par RuntimeError('Tesseract process timeout')"""
+    return isinstance(error, RuntimeError) and 'timeout' in str(error).lower()
+
+
+# PDFium n'est pas thread-safe : un seul appel à la fois par processus
+_PDFIUM_LOCK = threading.Lock()
+
+
+class PDFSource:
+    """
+    Session PDF partagée par les extracteurs texte et le rasteriseur
+    
+    Les octets du PDF sont lus une seule fois (mappés en mémoire quand
+    ils viennent du disque) puis transmis tels quels à PyPDF2,
+    pdfplumber et au rendu des pages. Le document PDFium, le lecteur
+    PyPDF2 et le nombre de pages sont créés à la demande et réutilisés.
+    
+    Usage:
+        with PDFSource.from_path("scan.pdf") as pdf:
+            pages = pdf.page_count
+    """
+    
+    def __init__(self, data, name: str, path: Optional[str] = None):
+        """
+        Args:
+            data: Contenu du PDF (bytes ou mmap)
+            name: Nom du fichier (logs)
+            path: Chemin disque si le PDF vient d'un fichier
+        """
+        self._data = data
+        self.name = name
+        self.path = path
+        self.size = len(data)
+        self._pdfium_doc = None
+        self._pypdf2_reader = None
+        self._page_count: Optional[int] = None
+    
+    @classmethod
+    def from_path(cls, file_path: str) -> 'PDFSource':
+        """Ouvre un PDF disque en mémoire mappée (sans copie)"""
+        with open(file_path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                data = b''
+            else:
+                # ACCESS_COPY : mapping privé, exposable sans copie à PDFium
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+        return cls(data, os.path.basename(file_path), path=file_path)
+    
+    def __enter__(self) -> 'PDFSource':
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+    
+    def stream(self):
+        """Flux lisible positionné au début, adossé au même buffer"""
+        if isinstance(self._data, mmap.mmap):
+            self._data.seek(0)
+            return self._data
+        return io.BytesIO(self._data)
+    
+    def has_text_layer_hint(self) -> bool:
+        """
+        Sonde rapide de la couche texte (sans parsing)
+        
+        Un PDF sans aucune ressource /Font (et sans object streams qui
+        pourraient la masquer) ne contient pas de texte extractible.
+        """
+        return self._data.find(b'/Font') != -1 or self._data.find(b'/ObjStm') != -1
+    
+    @property
+    def has_pdfium(self) -> bool:
+        try:
+            import pypdfium2  # noqa: F401
+            return True
+        except ImportError:
+            return False
+    
+    def pdfium_document(self):
+        """Document PDFium ouvert sur le buffer partagé (appeler sous _PDFIUM_LOCK)"""
+        if self._pdfium_doc is None:
+            import pypdfium2 as pdfium
+            if isinstance(self._data, mmap.mmap):
+                buffer = (ctypes.c_char * self.size).from_buffer(self._data)
+            else:
+                buffer = self._data
+            self._pdfium_doc = pdfium.PdfDocument(buffer)
+        return self._pdfium_doc
+    
+    def pypdf2_reader(self):
+        """Lecteur PyPDF2 ouvert sur le buffer partagé"""
+        if self._pypdf2_reader is None:
+            import PyPDF2
+            self._pypdf2_reader = PyPDF2.PdfReader(self.stream())
+        return self._pypdf2_reader
+    
+    @property
+    def page_count(self) -> int:
+        """Nombre de pages (PDFium, PyPDF2 ou pdfinfo selon disponibilité)"""
+        if self._page_count is None:
+            if self.has_pdfium:
+                with _PDFIUM_LOCK:
+                    self._page_count = len(self.pdfium_document())
+            elif self._pypdf2_reader is not None:
+                self._page_count = len(self._pypdf2_reader.pages)
+            else:
+                from pdf2image import pdfinfo_from_bytes, pdfinfo_from_path
+                info = pdfinfo_from_path(self.path) if self.path else pdfinfo_from_bytes(bytes(self._data))
+                self._page_count = int(info['Pages'])
+        return self._page_count
+    
+    def render_pages(self, pages: List[int], dpi: int = PDF_OCR_DPI, window: int = 1) -> Iterator:
+        """
+        Rasterise les pages demandées (générateur)
+        
+        PDFium rend chaque page depuis le document déjà ouvert. Sans
+        pypdfium2, repli sur pdf2image/poppler par fenêtres de `window`
+        pages consécutives. Chaque image est libérée une fois consommée.
+        
+        Args:
+            pages: Numéros de pages (1-based, croissants)
+            dpi: Résolution de rendu
+            window: Pages rendues à la fois (repli poppler)
+        
+        Yields:
+            Image PIL de chaque page demandée, dans l'ordre
+        """
+        if self.has_pdfium:
+            for page_number in pages:
+                with _PDFIUM_LOCK:
+                    page = self.pdfium_document()[page_number - 1]
+                    try:
+                        image = page.render(scale=dpi / 72).to_pil()
+                    finally:
+                        page.close()
+                yield image
+                del image
+            return
+        
+        from pdf2image import convert_from_bytes, convert_from_path
+        
+        for first_page, last_page in _page_windows(pages, window):
+            logger.debug(f"Converting pages {first_page}-{last_page} to images (poppler)...")
+            if self.path:
+                images = convert_from_path(self.path, dpi=dpi, first_page=first_page, last_page=last_page)
+            else:
+                images = convert_from_bytes(bytes(self._data), dpi=dpi, first_page=first_page, last_page=last_page)
+            
+            while images:
+                image = images.pop(0)
+                yield image
+                del image
+    
+    def close(self):
+        """Libère le document PDFium, le lecteur et le mapping mémoire"""
+        if self._pdfium_doc is not None:
+            with _PDFIUM_LOCK:
+                self._pdfium_doc.close()
+            self._pdfium_doc = None
+        self._pypdf2_reader = None
+        if isinstance(self._data, mmap.mmap) and not self._data.closed:
+            try:
+                self._data.close()
+            except BufferError:
+                # Buffer encore exporté : libéré avec le dernier objet qui le référence
+                pass
+
+
+def _page_windows(pages: List[int], window: int) -> Iterator[tuple]:
+    """Découpe des pages en plages consécutives d'au plus `window` pages"""
+    start = previous = None
+    for page in pages:
+        if start is not None and page == previous + 1 and page - start < window:
+            previous = page
+            continue
+        if start is not None:
+            yield start, previous
+        start = previous = page
+    if start is not None:
+        yield start, previous
+
 
 class Document:
     """
@@ -33,6 +242,15 @@ class Document:
         self.text_content = text_content
         self.metadata = metadata or {}
         self.filename = os.path.basename(file_path)
+        self._view: Optional[TextView] = None
+    
+    @property
+    def view(self) -> TextView:
+        """Formes dérivées du texte (minuscules, lignes...), partagées par toutes les étapes"""
+        # Recréée si text_content a été réassigné
+        if self._view is None or self._view.text is not (self.text_content or ''):
+            self._view = TextView(self.text_content)
+        return self._view
     
     def get_text(self) -> str:
         """Retourne le texte complet du document"""
@@ -40,7 +258,7 @@ class Document:
     
     def get_lines(self) -> list:
         """Retourne les lignes du document"""
-        return self.text_content.split('\n')
+        return list(self.view.lines)
     
     def __repr__(self):
         return f"Document(filename={self.filename}, text_length={len(self.text_content)})"
@@ -72,7 +290,31 @@ class DocumentLoader:
         self.has_pytesseract = self._check_import('pytesseract')
         self.has_pillow = self._check_import('PIL')
         
+        # OCR parallèle par page (pool de processus partagé entre documents)
+        processing = config.get('processing', {}) or {}
+        self.parallel_enabled = bool(processing.get('parallel_enabled', False))
+        self.max_workers = max(1, int(processing.get('max_workers') or os.cpu_count() or 1))
+        # Plafond de pages en vol par document : un scan de 40 pages
+        # ne doit pas monopoliser tous les workers
+        self.max_pages_per_document = max(1, int(processing.get('max_pages_per_document', self.max_workers)))
+        # Nombre de pages rasterisées à la fois (mémoire ~constante)
+        self.raster_window = max(1, int(processing.get('raster_window', 1)))
+        # Budget d'un appel Tesseract (une page)
+        self.page_timeout = float(processing.get('page_timeout_seconds', 60))
+        self._page_pool: Optional[ProcessPoolExecutor] = None
+        self._page_pool_lock = threading.Lock()
+        
+        # Cache du texte OCR par page (pages répétées : CGV, pages de garde...)
+        page_cache_config = config.get('page_cache', {}) or {}
+        self.page_cache: Optional[LRUCache] = None
+        if page_cache_config.get('enabled', False):
+            self.page_cache = LRUCache(
+                max_entries=page_cache_config.get('max_entries', 2048),
+                max_bytes=page_cache_config.get('max_bytes', 16 * 1024 * 1024)
+            )
+        
         logger.info(f"Document Loader initialized (PyPDF2: {self.has_pypdf2}, pdfplumber: {self.has_pdfplumber}, pytesseract: {self.has_pytesseract})")
+        logger.info(f"Page OCR pool: parallel={self.parallel_enabled}, workers={self.max_workers}, max_pages_per_document={self.max_pages_per_document}")
     
     def _check_import(self, module_name: str) -> bool:
         """Vérifie si un module est disponible"""
@@ -82,12 +324,13 @@ class DocumentLoader:
         except ImportError:
             return False
     
-    def load(self, file_path: str) -> Document:
+    def load(self, file_path: str, deadline: Optional[Deadline] = None) -> Document:
         """
         Charge un document depuis un fichier
         
         Args:
             file_path: Chemin vers le fichier
+            deadline: Échéance de la requête (OCR des pages interrompu au-delà)
         
         Returns:
             Document chargé
@@ -105,10 +348,10 @@ class DocumentLoader:
         
         # Dispatcher selon l'extension
         if file_extension == '.pdf':
-            return self._load_pdf(file_path)
+            return self._load_pdf(file_path, deadline)
         
         elif file_extension in ['.png', '.jpg', '.jpeg', '.tiff', '.bmp']:
-            return self._load_image(file_path)
+            return self._load_image(file_path, deadline=deadline)
         
         elif file_extension == '.txt':
             return self._load_text(file_path)
@@ -116,147 +359,414 @@ class DocumentLoader:
         else:
             raise ValueError(f"Unsupported file format: {file_extension}")
     
-    def _load_pdf(self, file_path: str) -> Document:
+    def load_bytes(self, data, filename: str, deadline: Optional[Deadline] = None) -> Document:
+        """
+        Charge un document directement depuis un buffer mémoire
+        
+        Aucun fichier temporaire : le buffer est transmis tel quel au
+        parsing PDF ou au décodage d'image.
+        
+        Args:
+            data: Contenu du fichier (bytes, bytearray ou memoryview)
+            filename: Nom d'origine (l'extension détermine le format)
+            deadline: Échéance de la requête (OCR des pages interrompu au-delà)
+        
+        Returns:
+            Document chargé
+        
+        Raises:
+            ValueError: Si format non supporté
+        """
+        file_extension = Path(filename).suffix.lower()
+        
+        logger.info(f"Loading document from memory: {filename} ({len(data)} bytes)")
+        
+        # Dispatcher selon l'extension
+        if file_extension == '.pdf':
+            if not isinstance(data, bytes):
+                data = bytes(data)
+            with PDFSource(data, os.path.basename(filename)) as pdf:
+                return self._load_pdf_source(pdf, filename, deadline)
+        
+        elif file_extension in ['.png', '.jpg', '.jpeg', '.tiff', '.bmp']:
+            return self._load_image(io.BytesIO(data), filename, deadline)
+        
+        elif file_extension == '.txt':
+            text = bytes(data).decode('utf-8')
+            logger.info(f"Text file loaded: {len(text)} chars")
+            return Document(filename, text, {'method': 'direct_text'})
+        
+        else:
+            raise ValueError(f"Unsupported file format: {file_extension}")
+    
+    def _load_pdf(self, file_path: str, deadline: Optional[Deadline] = None) -> Document:
+        """Charge un PDF disque via une session PDFSource (fichier lu une seule fois)"""
+        with PDFSource.from_path(file_path) as pdf:
+            return self._load_pdf_source(pdf, file_path, deadline)
+    
+    def _load_pdf_source(self, pdf: PDFSource, file_path: str,
+                         deadline: Optional[Deadline] = None) -> Document:
         """
-        Charge un PDF avec détection automatique PDF texte vs PDF scanné
+        Charge un PDF avec détection PDF texte vs PDF scanné, page par page
         
         Logique :
-        1. Essayer extraction texte (PyPDF2/pdfplumber)
-        2. Si texte vide ou < 50 chars → considérer comme scanné
-        3. Basculer vers OCR image
+        1. Extraire la couche texte de chaque page (PyPDF2/pdfplumber)
+        2. Page avec >= 50 chars → conservée telle quelle (mode TEXT)
+        3. Page sans couche texte → rasterisée puis OCR (mode IMAGE)
+        
+        Un PDF avec première page numérique et annexes scannées est donc
+        traité en mode MIXED, sans rasteriser les pages déjà textuelles.
+        
+        Échéance dépassée pendant l'OCR : les pages restantes gardent leur
+        couche texte et le document est marqué `truncated`.
         """
         logger.info(f"DOCUMENT_LOADER_SIGNATURE: _load_pdf called for {os.path.basename(file_path)}")
         
-        pdf_text_detected = False
-        extracted_text = ""
+        page_texts: List[str] = []
         
-        # === ÉTAPE 1 : TENTATIVE EXTRACTION TEXTE ===
+        # === ÉTAPE 1 : EXTRACTION COUCHE TEXTE PAR PAGE ===
+        
+        # Sonde rapide : aucune police → pas de couche texte, inutile de parser
+        text_layer_possible = pdf.has_text_layer_hint()
+        if not text_layer_possible:
+            logger.info("PDF probe: no font resources, skipping text extraction")
+            try:
+                page_texts = [''] * pdf.page_count
+            except Exception as e:
+                logger.warning(f"Page count probe failed: {e}")
         
         # Essayer d'abord PyPDF2 (pour PDF textuels)
-        if self.has_pypdf2:
+        if text_layer_possible and self.has_pypdf2:
             try:
-                text = self._extract_pdf_pypdf2(file_path)
-                if text.strip():
-                    extracted_text = text
-                    logger.info(f"PyPDF2: extracted {len(text)} chars")
+                page_texts = self._extract_pdf_pypdf2(pdf)
+                logger.info(f"PyPDF2: extracted {sum(len(t) for t in page_texts)} chars from {len(page_texts)} page(s)")
             except Exception as e:
                 logger.warning(f"PyPDF2 failed: {e}")
         
         # Si pas de texte, essayer pdfplumber
-        if not extracted_text and self.has_pdfplumber:
+        if text_layer_possible and not any(t.strip() for t in page_texts) and self.has_pdfplumber:
             try:
-                text = self._extract_pdf_pdfplumber(file_path)
-                if text.strip():
-                    extracted_text = text
-                    logger.info(f"pdfplumber: extracted {len(text)} chars")
+                texts = self._extract_pdf_pdfplumber(pdf)
+                if any(t.strip() for t in texts) or not page_texts:
+                    page_texts = texts
+                    logger.info(f"pdfplumber: extracted {sum(len(t) for t in texts)} chars from {len(texts)} page(s)")
             except Exception as e:
                 logger.warning(f"pdfplumber failed: {e}")
         
-        # === ÉTAPE 2 : DÉCISION PDF TEXTE VS SCANNÉ ===
+        # === ÉTAPE 2 : DÉCISION TEXTE VS SCANNÉ PAR PAGE ===
         
-        # Seuil : minimum 50 caractères pour considérer comme "texte natif"
+        # Seuil : minimum 50 caractères pour considérer une page comme "texte natif"
         MIN_TEXT_THRESHOLD = 50
         
-        if extracted_text.strip() and len(extracted_text.strip()) >= MIN_TEXT_THRESHOLD:
-            pdf_text_detected = True
-            logger.info(f"PDF_TEXT_DETECTED=true, OCR_MODE=TEXT (text_len={len(extracted_text)})")
-            return Document(file_path, extracted_text, {
+        image_pages = [
+            i + 1 for i, page_text in enumerate(page_texts)
+            if len(page_text.strip()) < MIN_TEXT_THRESHOLD
+        ]
+        if not page_texts:
+            # Couche texte illisible : traiter tout le document en image
+            image_pages = None
+        
+        pages_meta = [
+            {'page': i + 1, 'ocr_mode': 'TEXT', 'text_length': len(page_text)}
+            for i, page_text in enumerate(page_texts)
+        ]
+        pdf_text_detected = len(pages_meta) > len(image_pages or [])
+        
+        if image_pages == []:
+            text = '\n'.join(page_texts)
+            logger.info(f"PDF_TEXT_DETECTED=true, OCR_MODE=TEXT (text_len={len(text)}, pages={len(page_texts)})")
+            return Document(file_path, text, {
                 'method': 'text_extraction',
                 'ocr_mode': 'TEXT',
-                'pdf_text_detected': True
+                'pdf_text_detected': True,
+                'pages': pages_meta
             })
         
-        # === ÉTAPE 3 : PDF SCANNÉ → OCR IMAGE ===
+        # === ÉTAPE 3 : PAGES SCANNÉES → OCR IMAGE ===
         
-        logger.info(f"PDF_TEXT_DETECTED=false, OCR_MODE=IMAGE (text_len={len(extracted_text)})")
-        logger.info("OCR_IMAGE_START: Converting PDF to images for OCR...")
+        logger.info(f"PDF_TEXT_DETECTED={str(pdf_text_detected).lower()}, "
+                    f"OCR_MODE={'MIXED' if pdf_text_detected else 'IMAGE'} "
+                    f"(image_pages={image_pages if image_pages is not None else 'all'})")
+        logger.info("OCR_IMAGE_START: Converting PDF pages to images for OCR...")
         
-        # Fallback : OCR avec pytesseract (PDF scanné)
-        if self.has_pytesseract:
-            try:
-                text = self._extract_pdf_ocr(file_path)
-                logger.info(f"OCR_IMAGE_OK: Extracted {len(text)} chars via OCR")
-                logger.info(f"OCR_IMAGE_TEXT_LEN={len(text)}")
-                
-                return Document(file_path, text, {
-                    'method': 'tesseract_ocr',
-                    'ocr_mode': 'IMAGE',
-                    'pdf_text_detected': False
+        if not self.has_pytesseract:
+            if pdf_text_detected:
+                # Pas d'OCR disponible : conserver les pages textuelles
+                logger.warning("NO_OCR_METHOD_AVAILABLE: image pages skipped, keeping text layer only")
+                for page in image_pages:
+                    pages_meta[page - 1]['ocr_mode'] = 'NONE'
+                return Document(file_path, '\n'.join(page_texts), {
+                    'method': 'text_extraction',
+                    'ocr_mode': 'MIXED',
+                    'pdf_text_detected': True,
+                    'pages': pages_meta
                 })
-            except Exception as e:
-                logger.error(f"OCR_IMAGE_FAILED: {e}")
-                raise ValueError(f"OCR failed on scanned PDF: {e}")
+            
+            # Si rien n'a marché
+            logger.error("NO_OCR_METHOD_AVAILABLE: pytesseract not found")
+            raise ValueError(f"Could not extract text from PDF: {file_path}. Install PyPDF2, pdfplumber or pytesseract")
         
-        # Si rien n'a marché
-        logger.error("NO_OCR_METHOD_AVAILABLE: pytesseract not found")
-        raise ValueError(f"Could not extract text from PDF: {file_path}. Install PyPDF2, pdfplumber or pytesseract")
+        ocr_status = {}
+        try:
+            ocr_texts = self._extract_pdf_ocr(pdf, pages=image_pages, deadline=deadline, status=ocr_status)
+        except Exception as e:
+            logger.error(f"OCR_IMAGE_FAILED: {e}")
+            raise ValueError(f"OCR failed on scanned PDF: {e}")
+        
+        for page, ocr_text in ocr_texts.items():
+            while len(page_texts) < page:
+                page_texts.append('')
+                pages_meta.append({'page': len(page_texts), 'ocr_mode': 'TEXT', 'text_length': 0})
+            if ocr_text is None:
+                # Budget Tesseract dépassé sur cette page
+                pages_meta[page - 1]['ocr_mode'] = 'TIMEOUT'
+                continue
+            # Garder la couche texte si l'OCR n'apporte pas plus de contenu
+            if len(ocr_text.strip()) >= len(page_texts[page - 1].strip()):
+                page_texts[page - 1] = ocr_text
+            pages_meta[page - 1].update({'ocr_mode': 'IMAGE', 'text_length': len(page_texts[page - 1])})
+        
+        text = '\n'.join(page_texts)
+        ocr_mode = 'MIXED' if pdf_text_detected else 'IMAGE'
+        logger.info(f"OCR_IMAGE_OK: Extracted {len(text)} chars ({len(ocr_texts)} page(s) via OCR, mode={ocr_mode})")
+        logger.info(f"OCR_IMAGE_TEXT_LEN={len(text)}")
+        
+        metadata = {
+            'method': 'mixed' if pdf_text_detected else 'tesseract_ocr',
+            'ocr_mode': ocr_mode,
+            'pdf_text_detected': pdf_text_detected,
+            'pages': pages_meta
+        }
+        if ocr_status.get('truncated') or None in ocr_texts.values():
+            metadata['truncated'] = True
+            logger.warning(f"OCR_IMAGE_TRUNCATED: time budget exhausted "
+                           f"({sum(1 for t in ocr_texts.values() if t is not None)}/{len(image_pages or ocr_texts)} page(s) OCRed)")
+        
+        return Document(file_path, text, metadata)
     
-    def _extract_pdf_pypdf2(self, file_path: str) -> str:
-        """Extrait texte avec PyPDF2"""
-        import PyPDF2
-        
-        text = []
-        with open(file_path, 'rb') as f:
-            reader = PyPDF2.PdfReader(f)
-            for page in reader.pages:
-                text.append(page.extract_text())
-        
-        return '\n'.join(text)
+    def _extract_pdf_pypdf2(self, pdf: PDFSource) -> List[str]:
+        """Extrait le texte de chaque page avec PyPDF2"""
+        reader = pdf.pypdf2_reader()
+        return [page.extract_text() or '' for page in reader.pages]
     
-    def _extract_pdf_pdfplumber(self, file_path: str) -> str:
-        """Extrait texte avec pdfplumber"""
+    def _extract_pdf_pdfplumber(self, pdf: PDFSource) -> List[str]:
+        """Extrait le texte de chaque page avec pdfplumber"""
         import pdfplumber
         
         text = []
-        with pdfplumber.open(file_path) as pdf:
-            for page in pdf.pages:
-                page_text = page.extract_text()
-                if page_text:
-                    text.append(page_text)
+        with pdfplumber.open(pdf.stream()) as plumber_pdf:
+            for page in plumber_pdf.pages:
+                text.append(page.extract_text() or '')
         
-        return '\n'.join(text)
+        return text
     
-    def _extract_pdf_ocr(self, file_path: str) -> str:
+    def _extract_pdf_ocr(self, pdf: PDFSource, pages: Optional[List[int]] = None,
+                         deadline: Optional[Deadline] = None,
+                         status: Optional[dict] = None) -> Dict[int, Optional[str]]:
         """
-        Extrait texte d'un PDF scanné via OCR
+        Extrait texte des pages scannées d'un PDF via OCR
+        
+        Les pages sont rasterisées une à une depuis la session PDF
+        (PDFium, ou poppler par fenêtres de `raster_window` pages) et
+        transmises à l'OCR au fil de l'eau : la mémoire reste stable
+        quel que soit le nombre de pages.
         
         Nécessite :
-        - pdf2image (Python lib)
-        - poppler-utils (pdftoppm binary)
+        - pypdfium2, ou pdf2image + poppler-utils (pdftoppm binary)
         - tesseract-ocr (binary + lang data)
+        
+        Args:
+            pdf: Session PDF
+            pages: Numéros de pages (1-based) à OCRiser, None = toutes
+            deadline: Échéance ; au-delà, les pages restantes sont abandonnées
+            status: Dict rempli avec `truncated=True` si l'échéance est atteinte
+        
+        Returns:
+            dict numéro de page → texte OCR (None = timeout Tesseract)
         """
         try:
-            from pdf2image import convert_from_path
             import pytesseract
+            if not pdf.has_pdfium:
+                import pdf2image
         except ImportError as e:
-            raise ValueError(f"OCR dependencies missing: {e}. Install: pip install pdf2image pytesseract")
+            raise ValueError(f"OCR dependencies missing: {e}. Install: pip install pypdfium2 pytesseract")
         
         try:
-            # Convertir PDF en images (nécessite poppler-utils)
-            logger.debug(f"Converting PDF to images (requires poppler-utils)...")
-            images = convert_from_path(file_path, dpi=200)  # 200 DPI pour meilleure qualité
-            logger.info(f"Converted to {len(images)} image(s)")
+            if pages is None:
+                pages = list(range(1, pdf.page_count + 1))
             
-            # OCR sur chaque page
-            text = []
-            for i, image in enumerate(images):
-                logger.debug(f"OCR page {i+1}/{len(images)}...")
-                # Utiliser fra+eng pour meilleur résultat
-                page_text = pytesseract.image_to_string(image, lang='fra+eng')
-                text.append(page_text)
-                logger.debug(f"  → Page {i+1}: {len(page_text)} chars")
+            logger.info(f"Rasterising {len(pages)} page(s) at {PDF_OCR_DPI} DPI "
+                        f"({'pdfium' if pdf.has_pdfium else f'poppler, window={self.raster_window}'})")
+            
+            # OCR des pages au fil de la rasterisation (en parallèle si activé)
+            images = pdf.render_pages(pages, dpi=PDF_OCR_DPI, window=self.raster_window)
+            text = {}
+            try:
+                for page, page_text in zip(pages, self._iter_ocr_pages(images, deadline=deadline)):
+                    if not text:
+                        logger.info(f"OCR first page ready: {len(page_text or '')} chars")
+                    text[page] = page_text
+            except DeadlineExceeded as e:
+                logger.warning(f"OCR stopped after {len(text)}/{len(pages)} page(s): {e}")
+                if status is not None:
+                    status['truncated'] = True
+            finally:
+                images.close()
             
-            full_text = '\n'.join(text)
-            logger.info(f"OCR completed: {len(full_text)} total chars from {len(images)} page(s)")
+            logger.info(f"OCR completed: {sum(len(t or '') for t in text.values())} total chars from {len(text)} page(s)")
             
-            return full_text
+            return text
             
         except Exception as e:
             logger.error(f"PDF to image conversion or OCR failed: {e}")
-            raise ValueError(f"OCR processing failed: {e}. Check poppler-utils and tesseract installation.")
+            raise ValueError(f"OCR processing failed: {e}. Check pypdfium2/poppler-utils and tesseract installation.")
+    
+    def _get_page_pool(self) -> ProcessPoolExecutor:
+        """Retourne le pool de processus OCR (créé à la première utilisation)"""
+        with self._page_pool_lock:
+            if self._page_pool is None:
+                self._page_pool = ProcessPoolExecutor(max_workers=self.max_workers)
+                logger.info(f"Page OCR pool started ({self.max_workers} workers)")
+            return self._page_pool
+    
+    def _page_cache_key(self, image, lang: str, dpi: Optional[int]) -> str:
+        """Clé du cache page : hash des pixels + langue + DPI"""
+        digest = hashlib.sha256()
+        digest.update(f"{image.mode}:{image.size}:{lang}:{dpi}".encode('utf-8'))
+        digest.update(image.tobytes())
+        return digest.hexdigest()
+    
+    def _cache_page_text(self, key: str, text: str):
+        """Enregistre le texte OCR d'une page dans le cache"""
+        self.page_cache.put(key, text, size=len(text.encode('utf-8')))
+    
+    def _iter_ocr_pages(self, images: Iterable, lang: str = PDF_OCR_LANG,
+                        dpi: Optional[int] = PDF_OCR_DPI,
+                        deadline: Optional[Deadline] = None) -> Iterator[Optional[str]]:
+        """
+        OCR d'une suite de pages, texte produit dans l'ordre des pages
+        
+        Générateur : le texte d'une page est disponible dès qu'elle est
+        traitée, sans attendre la rasterisation des suivantes. En mode
+        parallèle, au plus `max_pages_per_document` pages du document
+        sont soumises au pool en même temps (fenêtre glissante).
+        
+        Les pages déjà vues (même image, langue et DPI) sont servies par
+        le cache page sans passer par Tesseract.
+        
+        Chaque appel Tesseract est borné par min(page_timeout, temps
+        restant) : une page trop lente produit None. Échéance dépassée
+        entre deux pages : DeadlineExceeded, les pages en vol sont annulées.
+        
+        Args:
+            images: Images des pages (liste ou itérable)
+            lang: Langues Tesseract
+            dpi: Résolution de rasterisation (partie de la clé de cache)
+            deadline: Échéance de la requête (None = illimitée)
+        
+        Yields:
+            Texte de chaque page (None si timeout Tesseract), dans l'ordre
+        
+        Raises:
+            DeadlineExceeded: échéance dépassée
+        """
+        deadline = deadline or Deadline()
+        parallel = self.parallel_enabled and self.max_workers > 1
+        pool = self._get_page_pool() if parallel else None
+        # File ordonnée : (clé cache, texte connu ou Future)
+        in_flight = deque()
+        pending = {}  # clé → Future (pages identiques dans le même document)
+        
+        def page_timeout() -> float:
+            # pytesseract : 0 = illimité ; plancher à 0.1 s si le budget est presque épuisé
+            timeout = deadline.timeout(self.page_timeout or None)
+            return 0 if timeout is None else max(0.1, timeout)
+        
+        def collect():
+            key, item = in_flight.popleft()
+            if not isinstance(item, Future):
+                return item
+            try:
+                page_text = item.result(timeout=deadline.timeout())
+            except FuturesTimeout:
+                raise DeadlineExceeded("Time budget exhausted while waiting for page OCR")
+            except RuntimeError as e:
+                if not _is_tesseract_timeout(e):
+                    raise
+                page_text = None
+            if key is not None:
+                pending.pop(key, None)
+                if page_text is not None:
+                    self._cache_page_text(key, page_text)
+            return page_text
+        
+        try:
+            for i, image in enumerate(images):
+                deadline.check(f"OCR of page {i+1}")
+                key = self._page_cache_key(image, lang, dpi) if self.page_cache is not None else None
+                cached = self.page_cache.get(key) if key is not None else None
+                
+                if cached is not None:
+                    logger.debug(f"OCR page {i+1}: page cache hit")
+                    in_flight.append((None, cached))
+                elif key is not None and key in pending:
+                    logger.debug(f"OCR page {i+1}: identical to a page in flight")
+                    in_flight.append((None, pending[key]))
+                elif parallel:
+                    # Fenêtre pleine : attendre la plus ancienne page (préserve l'ordre)
+                    while sum(1 for _, item in in_flight if isinstance(item, Future)) >= self.max_pages_per_document:
+                        yield collect()
+                    logger.debug(f"OCR page {i+1} submitted to pool")
+                    future = pool.submit(_ocr_page_image, image, lang, page_timeout())
+                    if key is not None:
+                        pending[key] = future
+                    in_flight.append((key, future))
+                else:
+                    logger.debug(f"OCR page {i+1}...")
+                    try:
+                        page_text = _ocr_page_image(image, lang, page_timeout())
+                    except RuntimeError as e:
+                        if not _is_tesseract_timeout(e):
+                            raise
+                        logger.warning(f"OCR page {i+1}: Tesseract timeout")
+                        page_text = None
+                    else:
+                        logger.debug(f"  → Page {i+1}: {len(page_text)} chars")
+                        if key is not None:
+                            self._cache_page_text(key, page_text)
+                    in_flight.append((None, page_text))
+                del image
+                
+                # Pages déjà connues en tête de file : les produire sans attendre
+                while in_flight and not isinstance(in_flight[0][1], Future):
+                    yield collect()
+            
+            while in_flight:
+                yield collect()
+        finally:
+            # Échéance dépassée ou générateur abandonné : libérer les workers
+            for _, item in in_flight:
+                if isinstance(item, Future):
+                    item.cancel()
+    
+    def close(self):
+        """Arrête le pool de processus OCR"""
+        with self._page_pool_lock:
+            if self._page_pool is not None:
+                self._page_pool.shutdown(wait=True, cancel_futures=True)
+                self._page_pool = None
     
-    def _load_image(self, file_path: str) -> Document:
-        """Charge une image via OCR"""
+    def _load_image(self, source, file_path: Optional[str] = None,
+                    deadline: Optional[Deadline] = None) -> Document:
+        """
+        Charge une image via OCR
+        
+        Args:
+            source: Chemin du fichier ou flux binaire (upload en mémoire)
+            file_path: Nom du document (par défaut, le chemin source)
+            deadline: Échéance (au-delà : texte vide, document `truncated`)
+        """
+        file_path = file_path or source
         if not self.has_pytesseract:
             raise ValueError("pytesseract required for image OCR. Install: pip install pytesseract")
         
@@ -264,8 +774,15 @@ class DocumentLoader:
             import pytesseract
             from PIL import Image
             
-            image = Image.open(file_path)
-            text = pytesseract.image_to_string(image, lang='fra')
+            image = Image.open(source)
+            try:
+                text = next(self._iter_ocr_pages([image], lang='fra', dpi=None, deadline=deadline))
+            except DeadlineExceeded:
+                text = None
+            
+            if text is None:
+                logger.warning("Image OCR skipped: time budget exhausted")
+                return Document(file_path, '', {'method': 'tesseract_ocr', 'truncated': True})
             
             logger.info(f"Image loaded with OCR: {len(text)} chars")
             
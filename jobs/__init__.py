@@ -0,0 +1,13 @@
+"""Asynchronous OCR job queue"""
+
+from .backend import Job, JobBackend, SQLiteJobBackend, create_backend
+from .queue import JobQueue, QueueFullError
+
+__all__ = [
+    'Job',
+    'JobBackend',
+    'SQLiteJobBackend',
+    'create_backend',
+    'JobQueue',
+    'QueueFullError'
+]
@@ -0,0 +1,269 @@
+"""
+Backends de la file de jobs OCR
+
+- JobBackend : interface (stockage des jobs, réservation atomique)
+- SQLiteJobBackend : backend par défaut, fichier local, sans service externe,
+  partageable entre workers prefork
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger("OCREngine.Jobs")
+
+# Statuts d'un job
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+@dataclass
+class Job:
+    """Job OCR asynchrone"""
+    id: str
+    status: str
+    filename: str
+    params: Dict[str, Any]
+    attempts: int
+    max_attempts: int
+    created_at: float
+    updated_at: float
+    data: Optional[bytes] = None
+    # Disponible pour un worker depuis (retry : après le délai, bail expiré : fin du bail)
+    available_at: Optional[float] = None
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    expires_at: Optional[float] = None
+
+    def to_dict(self) -> dict:
+        """Vue publique du job (sans le contenu du fichier)"""
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'filename': self.filename,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at,
+            'error': self.error,
+            'result': self.result
+        }
+
+
+class JobBackend:
+    """
+    Interface d'un backend de file de jobs
+
+    `claim` doit être atomique : un job n'est réservé que par un seul
+    worker, y compris entre processus.
+    """
+
+    def enqueue(self, job: Job):
+        raise NotImplementedError
+
+    def claim(self, lease_seconds: float) -> Optional[Job]:
+        """Réserve le prochain job prêt (ou dont le bail a expiré)"""
+        raise NotImplementedError
+
+    def complete(self, job_id: str, result: Dict[str, Any], ttl: float):
+        raise NotImplementedError
+
+    def fail(self, job_id: str, error: str, retry_at: Optional[float], ttl: float):
+        """Échec : remis en file à `retry_at`, ou définitif si None"""
+        raise NotImplementedError
+
+    def get(self, job_id: str) -> Optional[Job]:
+        raise NotImplementedError
+
+    def counts(self) -> Dict[str, int]:
+        """Nombre de jobs par statut"""
+        raise NotImplementedError
+
+    def purge_expired(self) -> int:
+        """Supprime les jobs terminés dont le TTL est dépassé"""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class SQLiteJobBackend(JobBackend):
+    """
+    Backend SQLite (mode WAL)
+
+    Le fichier peut être partagé par plusieurs processus : la réservation
+    se fait dans une transaction IMMEDIATE. Un job `running` dont le bail
+    a expiré (worker tué) est de nouveau réservable.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            status TEXT NOT NULL,
+            filename TEXT NOT NULL,
+            params TEXT NOT NULL,
+            data BLOB,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL,
+            available_at REAL NOT NULL,
+            lease_until REAL,
+            result TEXT,
+            error TEXT,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL,
+            expires_at REAL
+        );
+        CREATE INDEX IF NOT EXISTS idx_jobs_ready ON jobs (status, available_at);
+        CREATE INDEX IF NOT EXISTS idx_jobs_expires ON jobs (expires_at);
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: Fichier SQLite (créé si absent)
+        """
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # Une connexion par thread (sqlite3 n'aime pas le partage)
+        self._local = threading.local()
+
+        conn = self._conn()
+        conn.executescript(self.SCHEMA)
+        logger.info(f"SQLite job backend ready: {path}")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _row_to_job(row: sqlite3.Row, with_data: bool = False) -> Job:
+        return Job(
+            id=row['id'],
+            status=row['status'],
+            filename=row['filename'],
+            params=json.loads(row['params']),
+            attempts=row['attempts'],
+            max_attempts=row['max_attempts'],
+            created_at=row['created_at'],
+            updated_at=row['updated_at'],
+            data=bytes(row['data']) if with_data and row['data'] is not None else None,
+            available_at=row['lease_until'] if row['status'] == RUNNING else row['available_at'],
+            result=json.loads(row['result']) if row['result'] else None,
+            error=row['error'],
+            expires_at=row['expires_at']
+        )
+
+    def enqueue(self, job: Job):
+        self._conn().execute(
+            "INSERT INTO jobs (id, status, filename, params, data, attempts, max_attempts,"
+            " available_at, created_at, updated_at) VALUES (?, ?, ?, ?, ?, 0, ?, ?, ?, ?)",
+            (job.id, QUEUED, job.filename, json.dumps(job.params), job.data,
+             job.max_attempts, job.created_at, job.created_at, job.created_at)
+        )
+
+    def claim(self, lease_seconds: float) -> Optional[Job]:
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE (status = ? AND available_at <= ?)"
+                " OR (status = ? AND lease_until < ?)"
+                " ORDER BY available_at LIMIT 1",
+                (QUEUED, now, RUNNING, now)
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+
+            conn.execute(
+                "UPDATE jobs SET status = ?, attempts = attempts + 1, lease_until = ?,"
+                " updated_at = ? WHERE id = ?",
+                (RUNNING, now + lease_seconds, now, row['id'])
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        job = self._row_to_job(row, with_data=True)
+        job.status = RUNNING
+        job.attempts += 1
+        job.updated_at = now
+        return job
+
+    def complete(self, job_id: str, result: Dict[str, Any], ttl: float):
+        now = time.time()
+        self._conn().execute(
+            "UPDATE jobs SET status = ?, result = ?, error = NULL, data = NULL,"
+            " lease_until = NULL, updated_at = ?, expires_at = ? WHERE id = ?",
+            (DONE, json.dumps(result, ensure_ascii=False, default=str), now, now + ttl, job_id)
+        )
+
+    def fail(self, job_id: str, error: str, retry_at: Optional[float], ttl: float):
+        now = time.time()
+        if retry_at is not None:
+            self._conn().execute(
+                "UPDATE jobs SET status = ?, error = ?, available_at = ?, lease_until = NULL,"
+                " updated_at = ? WHERE id = ?",
+                (QUEUED, error, retry_at, now, job_id)
+            )
+        else:
+            self._conn().execute(
+                "UPDATE jobs SET status = ?, error = ?, data = NULL, lease_until = NULL,"
+                " updated_at = ?, expires_at = ? WHERE id = ?",
+                (FAILED, error, now, now + ttl, job_id)
+            )
+
+    def get(self, job_id: str) -> Optional[Job]:
+        row = self._conn().execute(
+            "SELECT * FROM jobs WHERE id = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (job_id, time.time())
+        ).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def counts(self) -> Dict[str, int]:
+        counts = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+        for row in self._conn().execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status"):
+            counts[row['status']] = row['n']
+        return counts
+
+    def purge_expired(self) -> int:
+        cursor = self._conn().execute(
+            "DELETE FROM jobs WHERE expires_at IS NOT NULL AND expires_at <= ?",
+            (time.time(),)
+        )
+        return cursor.rowcount
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def create_backend(jobs_config: dict) -> JobBackend:
+    """Construit le backend depuis la section `jobs` de la configuration"""
+    jobs_config = jobs_config or {}
+    backend = jobs_config.get('backend', 'sqlite')
+
+    if backend == 'sqlite':
+        return SQLiteJobBackend(jobs_config.get('path', 'memory/jobs.db'))
+
+    raise ValueError(f"Unknown job backend: {backend}")
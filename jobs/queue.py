@@ -0,0 +1,239 @@
+"""
+File de jobs OCR asynchrones
+
+File bornée + pool de threads workers. Le traitement est délégué à un
+handler `handler(filename, data, params) -> dict` fourni par l'appelant.
+"""
+
+import logging
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+from .backend import Job, JobBackend, QUEUED, RUNNING, create_backend
+
+logger = logging.getLogger("OCREngine.Jobs")
+
+
+class QueueFullError(Exception):
+    """La file a atteint sa profondeur maximale"""
+
+
+class JobQueue:
+    """
+    File de jobs avec retries, TTL des résultats et métriques
+
+    Les workers sont des threads démarrés par `start()` (après le fork en
+    mode prefork). Un job en échec est remis en file avec un délai
+    croissant jusqu'à `max_attempts` tentatives.
+    """
+
+    def __init__(self,
+                 backend: JobBackend,
+                 handler: Callable[[str, bytes, Dict[str, Any]], Dict[str, Any]],
+                 workers: int = 1,
+                 max_queued: int = 100,
+                 max_attempts: int = 3,
+                 retry_backoff: float = 5.0,
+                 result_ttl: float = 3600.0,
+                 lease_seconds: float = 900.0,
+                 poll_interval: float = 1.0):
+        """
+        Args:
+            backend: Stockage des jobs
+            handler: Traitement d'un job, retourne le résultat (JSON)
+            workers: Nombre de threads workers
+            max_queued: Profondeur maximale (jobs en attente)
+            max_attempts: Nombre maximal de tentatives par job
+            retry_backoff: Délai de base avant retry (doublé à chaque échec)
+            result_ttl: Durée de conservation des résultats (secondes)
+            lease_seconds: Durée du bail d'un job en cours (reprise si worker tué)
+            poll_interval: Intervalle de scrutation du backend
+        """
+        self.backend = backend
+        self.handler = handler
+        self.workers = max(1, int(workers))
+        self.max_queued = max(1, int(max_queued))
+        self.max_attempts = max(1, int(max_attempts))
+        self.retry_backoff = float(retry_backoff)
+        self.result_ttl = float(result_ttl)
+        self.lease_seconds = float(lease_seconds)
+        self.poll_interval = float(poll_interval)
+
+        self._threads: List[threading.Thread] = []
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        self._stats_lock = threading.Lock()
+
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.retried = 0
+        self._wait_time = 0.0
+        self._run_time = 0.0
+
+    @classmethod
+    def from_config(cls, jobs_config: dict, handler) -> Optional['JobQueue']:
+        """Construit la file depuis la section `jobs` (None si désactivée)"""
+        jobs_config = jobs_config or {}
+        if not jobs_config.get('enabled', True):
+            return None
+
+        return cls(
+            backend=create_backend(jobs_config),
+            handler=handler,
+            workers=jobs_config.get('workers', 1),
+            max_queued=jobs_config.get('max_queued', 100),
+            max_attempts=jobs_config.get('max_attempts', 3),
+            retry_backoff=jobs_config.get('retry_backoff_seconds', 5),
+            result_ttl=jobs_config.get('result_ttl_seconds', 3600),
+            lease_seconds=jobs_config.get('lease_seconds', 900),
+            poll_interval=jobs_config.get('poll_interval_seconds', 1)
+        )
+
+    def submit(self, filename: str, data: bytes, params: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Met un document en file
+
+        Returns:
+            ID du job
+
+        Raises:
+            QueueFullError: profondeur maximale atteinte
+        """
+        if self.backend.counts()[QUEUED] >= self.max_queued:
+            raise QueueFullError(f"Job queue full ({self.max_queued} queued)")
+
+        now = time.time()
+        job = Job(
+            id=uuid.uuid4().hex,
+            status=QUEUED,
+            filename=filename,
+            params=params or {},
+            attempts=0,
+            max_attempts=self.max_attempts,
+            created_at=now,
+            updated_at=now,
+            data=data
+        )
+        self.backend.enqueue(job)
+
+        with self._stats_lock:
+            self.submitted += 1
+        self._wakeup.set()
+
+        logger.info(f"Job queued: {job.id} ({filename}, {len(data)} bytes)")
+        return job.id
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """Retourne le job (None si inconnu ou expiré)"""
+        return self.backend.get(job_id)
+
+    def start(self):
+        """Démarre les threads workers"""
+        if self._threads:
+            return
+        self._stop.clear()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker_loop, name=f"ocr-job-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"Job queue started ({self.workers} workers)")
+
+    def stop(self, timeout: float = 30.0):
+        """Arrête les workers (le job en cours se termine)"""
+        self._stop.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        self.backend.close()
+
+    def run_pending(self) -> int:
+        """Traite les jobs prêts dans le thread courant (retourne le nombre traité)"""
+        processed = 0
+        while self._run_one():
+            processed += 1
+        return processed
+
+    def _worker_loop(self):
+        last_purge = 0.0
+        while not self._stop.is_set():
+            try:
+                if time.monotonic() - last_purge > 60:
+                    purged = self.backend.purge_expired()
+                    if purged:
+                        logger.info(f"Purged {purged} expired jobs")
+                    last_purge = time.monotonic()
+
+                if self._run_one():
+                    continue
+            except Exception as e:
+                logger.error(f"Job worker error: {e}", exc_info=True)
+
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+    def _run_one(self) -> bool:
+        """Réserve et exécute un job ; False si la file est vide"""
+        job = self.backend.claim(self.lease_seconds)
+        if job is None:
+            return False
+
+        if job.attempts > job.max_attempts:
+            # Bail expiré sur la dernière tentative (worker tué)
+            self.backend.fail(job.id, job.error or "Job lease expired", None, self.result_ttl)
+            with self._stats_lock:
+                self.failed += 1
+            return True
+
+        started = time.time()
+        with self._stats_lock:
+            # Attente depuis la disponibilité du job (hors délai de retry)
+            self._wait_time += started - (job.available_at or job.created_at)
+
+        try:
+            result = self.handler(job.filename, job.data, job.params)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            if job.attempts < job.max_attempts:
+                retry_at = time.time() + self.retry_backoff * (2 ** (job.attempts - 1))
+                self.backend.fail(job.id, error, retry_at, self.result_ttl)
+                with self._stats_lock:
+                    self.retried += 1
+                logger.warning(f"Job {job.id} failed (attempt {job.attempts}/{job.max_attempts}), retrying: {error}")
+            else:
+                self.backend.fail(job.id, error, None, self.result_ttl)
+                with self._stats_lock:
+                    self.failed += 1
+                logger.error(f"Job {job.id} failed permanently: {error}")
+            return True
+        finally:
+            with self._stats_lock:
+                self._run_time += time.time() - started
+
+        self.backend.complete(job.id, result, self.result_ttl)
+        with self._stats_lock:
+            self.completed += 1
+        logger.info(f"Job {job.id} done in {time.time() - started:.2f}s")
+        return True
+
+    def metrics(self) -> dict:
+        """Profondeur de file et compteurs (ce processus)"""
+        counts = self.backend.counts()
+        with self._stats_lock:
+            started = self.completed + self.failed + self.retried
+            return {
+                'depth': counts[QUEUED],
+                'running': counts[RUNNING],
+                'by_status': counts,
+                'max_queued': self.max_queued,
+                'workers': self.workers,
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'failed': self.failed,
+                'retried': self.retried,
+                'avg_wait_seconds': self._wait_time / started if started else 0.0,
+                'avg_run_seconds': self._run_time / started if started else 0.0
+            }
@@ -9,6 +9,9 @@ from datetime import datetime
 from typing import Dict, Optional, List, Tuple
 from copy import deepcopy
 
+from utils.patterns import DIGITS, PatternRegistry, ScanResult, TriggerScanner
+from utils.text_view import TextView, as_text_view
+
 logger = logging.getLogger("OCREngine.Level1")
 
 
@@ -89,17 +92,182 @@ class OCRLevel1:
         'billed to', 'ship to'
     ]
     
-    def __init__(self, config: dict):
+    # Patterns date d'émission avec contexte (prioritaires)
+    DATE_CONTEXT_PATTERNS = [
+        r"(?:Date\s*d[''']?émission|Date\s*de\s*facture|Invoice\s*date|Date)\s*:?\s*(\d{1,2})\s*[/-]\s*(\d{1,2})\s*[/-]\s*(\d{4})",
+        r"(?:Date\s*d[''']?émission|Date\s*de\s*facture|Invoice\s*date|Date)\s*:?\s*(\d{1,2})\s+(janvier|février|f[ée]vrier|mars|avril|mai|juin|juillet|ao[ûu]t|septembre|octobre|novembre|d[ée]cembre)\s+(\d{4})",
+        r"(?:Date\s*d[''']?émission|Date\s*de\s*facture|Invoice\s*date|Date)\s*:?\s*(\d{4})\s*[/-]\s*(\d{1,2})\s*[/-]\s*(\d{1,2})",
+    ]
+    
+    # Préfixe date d'échéance (combiné avec DATE_PATTERNS)
+    DATE_ECHEANCE_PREFIX = r'(?:échéance|due\s+date|payment\s+due)[\s:]+'
+    
+    # Montant : 140.23 ou 140,23 ou 24.99 ou 24,99 (avec espaces possibles)
+    AMOUNT_VALUE = r'([\d\s]+)[,.]([\d]{2})'
+    
+    # Total TTC / Total / Montant dû / Amount due
+    TTC_PATTERNS = [
+        r'(?:Total\s*TTC|TOTAL\s*TTC|Total|TOTAL|Montant\s*d[ûu]|Amount\s*due|Net\s*[àa]\s*payer)\s*:?\s*' + AMOUNT_VALUE,
+        r'(?:TTC|TOTAL)\s*:?\s*' + AMOUNT_VALUE,
+        r'MONTANT\s*=?\s*' + AMOUNT_VALUE,  # Pour Carrefour
+    ]
+    
+    # Total HT / Subtotal / Hors taxe
+    HT_PATTERNS = [
+        r'(?:Total\s*HT|TOTAL\s*HT|Total\s*hors\s*taxe[s]?|Subtotal|Sous-total)\s*:?\s*' + AMOUNT_VALUE,
+        r'(?:HT|Hors\s*taxe)\s*:?\s*' + AMOUNT_VALUE,
+    ]
+    
+    # TVA / Montant TVA / VAT Amount
+    MONTANT_TVA_PATTERNS = [
+        r'(?:Montant\s*TVA|TVA|VAT\s*Amount)\s*:?\s*' + AMOUNT_VALUE,
+        r'(?:TVA|VAT)\s*:?\s*' + AMOUNT_VALUE,
+    ]
+    
+    # Référence document : (pattern, confiance, nom)
+    # IMPORTANT : patterns doivent contenir AU MOINS un chiffre pour éviter les faux positifs
+    REFERENCE_PATTERNS = [
+        # Patterns avec label explicite (haute confiance)
+        # Match : "Numéro de facture : N8WY0KFA-0003" ou "Invoice Number: 12345"
+        (r'N[°oúu]m[eé]ro\s*(?:de\s*)?facture\s*:?\s*([A-Z0-9\-_]{3,25})(?:\b|$|\s)', 0.95, 'facture_label_fr'),
+        (r'Invoice\s+Number\s*:?\s*([A-Z0-9\-_]{3,25})(?:\b|$|\s)', 0.95, 'invoice_number'),
+        (r'N[°oú]\s*(?:de\s*)?facture\s*:?\s*([A-Z0-9\-_]{3,25})(?:\b|$|\s)', 0.95, 'facture_label'),
+        (r'FACTURE\s*N[°oú]?\s*:?\s*([A-Z0-9\-_]{3,25})(?:\b|$|\s)', 0.90, 'facture_prefix'),
+        (r'N[°oú]\s*FACTURE\s*:?\s*([A-Z0-9\-_]{3,25})(?:\b|$|\s)', 0.90, 'facture_prefix'),
+        
+        # Patterns pour tickets
+        (r'N[°oú]\s*(?:de\s*)?ticket\s*:?\s*([A-Z0-9\-_]{3,25})(?:\b|$|\s)', 0.90, 'ticket_label'),
+        (r'TICKET\s*N[°oú]?\s*:?\s*([A-Z0-9\-_]{3,25})(?:\b|$|\s)', 0.85, 'ticket_prefix'),
+        
+        # Patterns pour devis
+        (r'N[°oú]\s*(?:de\s*)?devis\s*:?\s*([A-Z0-9\-_]{3,25})(?:\b|$|\s)', 0.90, 'devis_label'),
+        (r'DEVIS\s*N[°oú]?\s*:?\s*([A-Z0-9\-_]{3,25})(?:\b|$|\s)', 0.85, 'devis_prefix'),
+        
+        # Pattern générique: N° suivi de code alphanumérique (>= 5 caractères)
+        (r'N[°oú]\s*:?\s*([A-Z0-9\-_]{5,25})(?:\b|$|\s)', 0.70, 'generic_number'),
+    ]
+    
+    # SIRET avec label (SIRET: xxxxx), puis 14 chiffres consécutifs
+    SIRET_LABEL_PATTERN = r'(?:SIRET|Siret)[\s:]+([\ d\s]{14,})'
+    SIRET_RAW_PATTERN = r'\b(\d{14})\b'
+    
+    # TVA intracommunautaire
+    NUMERO_TVA_PATTERNS = [
+        r'(?:TVA|VAT|N°\s*TVA)[\s:]+([A-Z]{2}\d+)',
+        r'(?:EU\s*OSS\s*VAT|EU\s*VAT)[\s:]+([A-Z]{2}\d+)',
+    ]
+    
+    # Adresse générique : numéro + rue/road/avenue
+    ADRESSE_PATTERN = r'(\d+[,\s]+[A-Z][A-Za-z\s]+(?:Street|Road|Avenue|Rue|Boulevard|Rd|Ave)[^,\n]*(?:,\s*[A-Z\s]+)?(?:,\s*[A-Z]{2}\s*\d+)?)'
+    
+    # Client / destinataire
+    CLIENT_PATTERNS = [
+        r'(?:Client|À|To|Bill\s+to|Facturé\s+à)[\s:]+([A-Z][A-Za-z\s-]+)',
+        r'(?:Destinataire)[\s:]+([A-Z][A-Za-z\s-]+)',
+    ]
+    
+    # Suffixes de raison sociale (fallback émetteur)
+    COMPANY_SUFFIX_PATTERN = r'\b(PTE\.?|LTD\.?|SARL|SAS|SA|Inc\.?|LLC|Corp\.?|Company|GmbH)\b'
+    
+    def __init__(self, config: dict, patterns: Optional[PatternRegistry] = None):
         """
         Initialise OCR Level 1
         
         Args:
             config: Configuration globale du système
+            patterns: Registre de patterns partagé (créé par l'engine)
         """
         self.config = config
         self.confidence_threshold = config.get('ocr_level1', {}).get('confidence_threshold', 0.7)
+        self.patterns = patterns if patterns is not None else PatternRegistry()
+        self._compile_patterns(self.patterns)
         logger.info("OCR Level 1 initialized")
     
+    def _compile_patterns(self, registry: PatternRegistry):
+        """Compile une seule fois tous les patterns du niveau 1"""
+        I = re.IGNORECASE
+        compile = registry.compile
+        many = registry.compile_many
+        
+        # Nettoyage texte OCR
+        self.re_clean_amount = compile('level1.clean.amount', r'(\d+[,\.]\d{2})')
+        self.re_clean_spaced_letters = compile('level1.clean.spaced_letters', r'\b[A-Za-z]\s+[A-Za-z]\s+[A-Za-z]')
+        self.re_clean_letter_gap = compile('level1.clean.letter_gap', r'(?<=[A-Za-z])\s+(?=[A-Za-z])')
+        self.re_clean_marked_amount = compile('level1.clean.marked_amount', r'<MONTANT>([^<]+?)(?:<|$|\s)')
+        self.re_clean_spaces = compile('level1.clean.spaces', r' {2,}')
+        self.re_clean_newlines = compile('level1.clean.newlines', r'\n{3,}')
+        self.re_whitespace = compile('level1.whitespace', r'\s+')
+        self.re_digit = compile('level1.digit', r'\d')
+        
+        # Type, dates, montants, TVA
+        self.re_type = {
+            doc_type: many(f'level1.type.{doc_type}', patterns, I)
+            for doc_type, patterns in self.TYPE_PATTERNS.items()
+        }
+        self.re_date_context = many('level1.date.context', self.DATE_CONTEXT_PATTERNS, I)
+        self.re_date = many('level1.date.generic', self.DATE_PATTERNS, I)
+        self.re_date_echeance = many(
+            'level1.date.echeance', [self.DATE_ECHEANCE_PREFIX + p for p in self.DATE_PATTERNS], I
+        )
+        self.re_ttc = many('level1.amount.ttc', self.TTC_PATTERNS, I)
+        self.re_ht = many('level1.amount.ht', self.HT_PATTERNS, I)
+        self.re_montant_tva = many('level1.amount.tva', self.MONTANT_TVA_PATTERNS, I)
+        self.re_line_amount = many('level1.amount.line', self.AMOUNT_PATTERNS)
+        self.re_tva_rate = many('level1.tva_rate', self.TVA_PATTERNS, I)
+        
+        # Référence
+        self.re_reference_gap = compile('level1.reference.gap', r'(?<=[A-Za-z0-9])\s+(?=[A-Za-z0-9])')
+        self.re_reference_separators = compile('level1.reference.separators', r'[\s\-_]+')
+        self.re_reference = [
+            (compile(f'level1.reference.{i}', pattern, I), confidence, pattern_name)
+            for i, (pattern, confidence, pattern_name) in enumerate(self.REFERENCE_PATTERNS)
+        ]
+        
+        # Émetteur / client / identifiants
+        self.re_control_chars = compile('level1.emetteur.control_chars', r'[\x00-\x1F]')
+        self.re_emetteur_letter_gap = compile('level1.emetteur.letter_gap', r'(?<=[a-zA-Z])\s(?=[a-zA-Z])')
+        self.re_company_suffix = compile('level1.emetteur.company_suffix', self.COMPANY_SUFFIX_PATTERN, I)
+        self.re_client = many('level1.client', self.CLIENT_PATTERNS, re.MULTILINE | I)
+        self.re_siret_label = compile('level1.siret.label', self.SIRET_LABEL_PATTERN, I)
+        self.re_siret_raw = compile('level1.siret.raw', self.SIRET_RAW_PATTERN)
+        self.re_numero_tva = many('level1.numero_tva', self.NUMERO_TVA_PATTERNS, I)
+        self.re_adresse = compile('level1.adresse', self.ADRESSE_PATTERN, I)
+        
+        # Balayage unique du texte nettoyé : chaque pattern est déclaré avec les
+        # mots-clés (ou DIGITS) par lesquels toute correspondance commence
+        scanner = self.scanner = TriggerScanner(registry, 'level1.scan')
+        for compiled in self.re_date_context:
+            scanner.add(compiled, ('date', 'invoice'))
+        for compiled in self.re_date + [self.re_siret_raw, self.re_adresse]:
+            scanner.add(compiled, (DIGITS,))
+        for compiled in self.re_date_echeance:
+            scanner.add(compiled, ('échéance', 'due', 'payment'))
+        for compiled, triggers in zip(self.re_ttc, [('total', 'montant', 'amount', 'net'), ('ttc', 'total'), ('montant',)]):
+            scanner.add(compiled, triggers)
+        for compiled, triggers in zip(self.re_ht, [('total', 'subtotal', 'sous-total'), ('ht', 'hors')]):
+            scanner.add(compiled, triggers)
+        for compiled, triggers in zip(self.re_montant_tva, [('montant', 'tva', 'vat'), ('tva', 'vat')]):
+            scanner.add(compiled, triggers)
+        for compiled, triggers in zip(self.re_tva_rate, [('tva',), ('vat',), (DIGITS,)]):
+            scanner.add(compiled, triggers)
+        for compiled, triggers in zip(self.re_client, [('client', 'à', 'to', 'bill', 'facturé'), ('destinataire',)]):
+            scanner.add(compiled, triggers)
+        for compiled, triggers in zip(self.re_numero_tva, [('tva', 'vat', 'n°'), ('eu',)]):
+            scanner.add(compiled, triggers)
+        scanner.add(self.re_siret_label, ('siret',))
+        scanner.build()
+        
+        # Références : balayage du texte sans espaces parasites (autre texte)
+        self.reference_scanner = TriggerScanner(registry, 'level1.scan.reference')
+        numero = ('n°', 'no', 'nú')
+        reference_triggers = [
+            numero + ('nu',), ('invoice',), numero, ('facture',), numero,
+            numero, ('ticket',), numero, ('devis',), numero
+        ]
+        for (compiled, _, _), triggers in zip(self.re_reference, reference_triggers):
+            self.reference_scanner.add(compiled, triggers)
+        self.reference_scanner.build()
+    
     def _clean_ocr_text(self, text: str) -> str:
         """Nettoyage ULTRA-ROBUSTE du texte OCR
         
@@ -118,21 +286,21 @@ class OCRLevel1:
         for line in text.split('\n'):
             # Protéger les montants : ajouter des marqueurs temporaires
             # "Total 24,99" → "Total <MONTANT>24,99"
-            line = re.sub(r'(\d+[,\.]\d{2})', r'<MONTANT>\1', line)
+            line = self.re_clean_amount.sub(r'<MONTANT>\1', line)
             
             # Si la ligne contient beaucoup d'espaces isolés, les retirer
-            if re.search(r'\b[A-Za-z]\s+[A-Za-z]\s+[A-Za-z]', line):
+            if self.re_clean_spaced_letters.search(line):
                 # Retirer espaces entre LETTRES isolées : "F a c t u r e" → "Facture"
-                line = re.sub(r'(?<=[A-Za-z])\s+(?=[A-Za-z])', '', line)
+                line = self.re_clean_letter_gap.sub('', line)
             
             # Retirer espaces entre CHIFFRES isolés : "2 4 , 9 9" → "24,99"
             # MAIS uniquement dans les marqueurs <MONTANT>
             if '<MONTANT>' in line:
                 # Extraire les montants protégés
-                montants = re.findall(r'<MONTANT>([^<]+?)(?:<|$|\s)', line)
+                montants = self.re_clean_marked_amount.findall(line)
                 for montant in montants:
                     # Nettoyer les espaces dans le montant
-                    montant_clean = re.sub(r'\s+', '', montant)
+                    montant_clean = self.re_whitespace.sub('', montant)
                     line = line.replace(f'<MONTANT>{montant}', f' {montant_clean}')
             
             # Retirer les marqueurs restants
@@ -142,10 +310,10 @@ class OCRLevel1:
         text = '\n'.join(lines)
         
         # 3. Normaliser espaces multiples (mais garder au moins 1 espace)
-        text = re.sub(r' {2,}', ' ', text)
+        text = self.re_clean_spaces.sub(' ', text)
         
         # 4. Nettoyer sauts de ligne multiples
-        text = re.sub(r'\n{3,}', '\n\n', text)
+        text = self.re_clean_newlines.sub('\n\n', text)
         
         return text.strip()
     
@@ -162,12 +330,13 @@ class OCRLevel1:
         """
         from ocr_engine import OCRResult, FieldValue
         
-        text = document.get_text()
-        text_original = text  # Garder l'original BRUT pour le JSON final
+        raw = as_text_view(document)
+        text_original = raw.text  # Garder l'original BRUT pour le JSON final
         
-        # [FIX ULTRA-ROBUSTE] Nettoyage complet du texte OCR
-        text = self._clean_ocr_text(text)
-        text_lower = text.lower()
+        # [FIX ULTRA-ROBUSTE] Nettoyage complet du texte OCR (mémorisé sur la vue du document)
+        clean = raw.memo('ocr1_clean', lambda: TextView(self._clean_ocr_text(raw.text)))
+        text = clean.text
+        text_lower = clean.lower
         
         # LOG DEBUG : afficher les premiers 300 caractères du texte nettoyé
         logger.info(f"[OCR1] Texte nettoyé (300 premiers chars):\n{text[:300]}\n{'='*60}")
@@ -188,57 +357,51 @@ class OCRLevel1:
         doc_type = "unknown"  # Valeur temporaire, sera écrasée
         logger.info(f"[OCR1] Type document sera assigné par l'engine (type_detector)")
         
-        # 2. Extraction dates
-        date_field = self._extract_date(text, text_lower)
-        if date_field:
-            fields['date_emission'] = date_field
-        
-        # [MIROIR] 2b. Extraction date échéance
-        date_echeance = self._extract_date_echeance(text, text_lower)
-        if date_echeance:
-            fields['date_echeance'] = date_echeance
-        
-        # 3. Extraction montants
-        montants = self._extract_amounts(text, text_lower)
-        fields.update(montants)
-        
-        # 4. Extraction TVA
-        tva = self._extract_tva(text, text_lower)
-        if tva:
-            fields['tva_rate'] = tva
-        
-        # [MIROIR] 5. Extraction COMPLÈTE entreprise émettrice (PRIORITAIRE)
-        # IMPORTANT : utiliser text_original (avec espaces PyPDF2) pour détecter les lignes
-        emetteur_full = self._extract_emetteur_complet(text_original, text_lower, context)
-        fields.update(emetteur_full)
-        
-        # [MIROIR] 6. Extraction COMPLÈTE client/destinataire
-        client_full = self._extract_client_complet(text, text_lower)
-        fields.update(client_full)
-        
-        # 7. Extraction référence document
-        reference = self._extract_reference(text, doc_type)
-        if reference:
-            fields['numero_facture'] = reference  # Renommer pour clarté
-        
-        # [MIROIR] 8. Extraction SIRET
-        siret = self._extract_siret(text)
-        if siret:
-            fields['siret'] = siret
-        
-        # [MIROIR] 9. Extraction TVA intracommunautaire
-        num_tva = self._extract_numero_tva(text)
-        if num_tva:
-            fields['numero_tva_intracommunautaire'] = num_tva
-        
-        # [MIROIR] 10. Extraction adresses
-        adresses = self._extract_adresses(text)
-        fields.update(adresses)
-        
-        # [MIROIR] 11. Extraction devise
-        devise = self._extract_devise(text)
-        if devise:
-            fields['devise'] = devise
+        # Un seul passage sur le texte nettoyé : positions candidates de tous les patterns
+        scan = self.scanner.scan(text, text_lower)
+        
+        # Étapes d'extraction : (nom du champ, extracteur), None = dict de champs
+        steps = [
+            # 2. Extraction dates
+            ('date_emission', lambda: self._extract_date(text, text_lower, scan)),
+            # [MIROIR] 2b. Extraction date échéance
+            ('date_echeance', lambda: self._extract_date_echeance(text, text_lower, scan)),
+            # 3. Extraction montants
+            (None, lambda: self._extract_amounts(text, text_lower, scan)),
+            # 4. Extraction TVA
+            ('tva_rate', lambda: self._extract_tva(text, text_lower, scan)),
+            # [MIROIR] 5. Extraction COMPLÈTE entreprise émettrice (PRIORITAIRE)
+            # IMPORTANT : utiliser le texte original (avec espaces PyPDF2) pour détecter les lignes
+            (None, lambda: self._extract_emetteur_complet(raw, text_lower, context)),
+            # [MIROIR] 6. Extraction COMPLÈTE client/destinataire
+            (None, lambda: self._extract_client_complet(text, text_lower, scan)),
+            # 7. Extraction référence document (renommée pour clarté)
+            ('numero_facture', lambda: self._extract_reference(text, doc_type)),
+            # [MIROIR] 8. Extraction SIRET
+            ('siret', lambda: self._extract_siret(text, scan)),
+            # [MIROIR] 9. Extraction TVA intracommunautaire
+            ('numero_tva_intracommunautaire', lambda: self._extract_numero_tva(text, scan)),
+            # [MIROIR] 10. Extraction adresses
+            (None, lambda: self._extract_adresses(text, scan)),
+            # [MIROIR] 11. Extraction devise
+            ('devise', lambda: self._extract_devise(text)),
+        ]
+        
+        # Budget Level 1 (context.deadline) : vérifié entre deux extractions
+        deadline = getattr(context, 'deadline', None)
+        truncated = False
+        
+        for field_name, extract in steps:
+            if deadline is not None and deadline.expired():
+                truncated = True
+                logger.warning(f"[OCR1] Time budget exhausted, {len(fields)} fields kept, remaining extractions skipped")
+                break
+            
+            extracted = extract()
+            if field_name is None:
+                fields.update(extracted)
+            elif extracted:
+                fields[field_name] = extracted
         
         # 12. Calcul confiance globale
         global_confidence = self._calculate_global_confidence(fields)
@@ -254,7 +417,8 @@ class OCRLevel1:
             entreprise_source=context.source_entreprise,
             fields=fields,
             processing_date=datetime.now(),
-            needs_next_level=needs_level2
+            needs_next_level=needs_level2,
+            truncated=truncated
         )
         
         logger.info(f"OCR Level 1 completed: {len(fields)} fields, confidence: {global_confidence:.2f}")
@@ -266,10 +430,10 @@ class OCRLevel1:
         text_upper = text.upper()
         
         scores = {}
-        for doc_type, patterns in self.TYPE_PATTERNS.items():
+        for doc_type, patterns in self.re_type.items():
             score = 0
-            for pattern in patterns:
-                matches = re.findall(pattern, text_upper, re.IGNORECASE)
+            for compiled in patterns:
+                matches = compiled.findall(text_upper)
                 score += len(matches) * 10  # 10 points par match
             scores[doc_type] = score
         
@@ -281,19 +445,14 @@ class OCRLevel1:
         
         return best_type, confidence
     
-    def _extract_date(self, text: str, text_lower: str) -> Optional['FieldValue']:
+    def _extract_date(self, text: str, text_lower: str, scan: Optional[ScanResult] = None) -> Optional['FieldValue']:
         """Extrait la date d'émission - MÉTHODE ROBUSTE AVEC CONTEXTE"""
         from ocr_engine import FieldValue
+        scan = scan if scan is not None else self.scanner.scan(text)
         
         # PATTERNS AVEC CONTEXTE (prioritaires)
-        date_context_patterns = [
-            r"(?:Date\s*d[''']?émission|Date\s*de\s*facture|Invoice\s*date|Date)\s*:?\s*(\d{1,2})\s*[/-]\s*(\d{1,2})\s*[/-]\s*(\d{4})",
-            r"(?:Date\s*d[''']?émission|Date\s*de\s*facture|Invoice\s*date|Date)\s*:?\s*(\d{1,2})\s+(janvier|février|f[ée]vrier|mars|avril|mai|juin|juillet|ao[ûu]t|septembre|octobre|novembre|d[ée]cembre)\s+(\d{4})",
-            r"(?:Date\s*d[''']?émission|Date\s*de\s*facture|Invoice\s*date|Date)\s*:?\s*(\d{4})\s*[/-]\s*(\d{1,2})\s*[/-]\s*(\d{1,2})",
-        ]
-        
-        for pattern in date_context_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
+        for compiled in self.re_date_context:
+            match = scan.search(compiled)
             if match:
                 groups = match.groups()
                 # Parser selon format
@@ -323,8 +482,8 @@ class OCRLevel1:
                     )
         
         # FALLBACK: patterns génériques (confiance plus faible)
-        for pattern in self.DATE_PATTERNS:
-            matches = re.findall(pattern, text, re.IGNORECASE)
+        for compiled in self.re_date:
+            matches = scan.findall(compiled)
             if matches:
                 # Prendre la première date trouvée
                 match = matches[0]
@@ -352,33 +511,25 @@ class OCRLevel1:
                         value=date_str,
                         confidence=0.75,
                         extraction_method='regex',
-                        pattern=pattern
+                        pattern=compiled.pattern
                     )
         
         return None
     
-    def _extract_amounts(self, text: str, text_lower: str) -> Dict[str, 'FieldValue']:
+    def _extract_amounts(self, text: str, text_lower: str, scan: Optional[ScanResult] = None) -> Dict[str, 'FieldValue']:
         """Extrait les montants HT, TVA, TTC - MÉTHODE ROBUSTE AVEC REGEX"""
         from ocr_engine import FieldValue
+        scan = scan if scan is not None else self.scanner.scan(text)
         
         amounts = {}
         
         # ========================================================================
-        # PATTERNS REGEX POUR MONTANTS (TOUS FORMATS)
+        # PATTERNS REGEX POUR MONTANTS (TOUS FORMATS) : TTC / HT / MONTANT_TVA_PATTERNS
         # ========================================================================
         
-        # Pattern montant : 140.23 ou 140,23 ou 24.99 ou 24,99 (avec espaces possibles)
-        amount_pattern = r'([\d\s]+)[,.]([\d]{2})'
-        
         # PATTERN 1: Total TTC / Total / Montant dû / Amount due
-        ttc_patterns = [
-            r'(?:Total\s*TTC|TOTAL\s*TTC|Total|TOTAL|Montant\s*d[ûu]|Amount\s*due|Net\s*[àa]\s*payer)\s*:?\s*' + amount_pattern,
-            r'(?:TTC|TOTAL)\s*:?\s*' + amount_pattern,
-            r'MONTANT\s*=?\s*' + amount_pattern,  # Pour Carrefour
-        ]
-        
-        for pattern in ttc_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
+        for compiled in self.re_ttc:
+            match = scan.search(compiled)
             if match and 'total_ttc' not in amounts:
                 montant_str = match.group(1).replace(' ', '') + '.' + match.group(2)
                 try:
@@ -393,13 +544,8 @@ class OCRLevel1:
                     pass
         
         # PATTERN 2: Total HT / Subtotal / Hors taxe
-        ht_patterns = [
-            r'(?:Total\s*HT|TOTAL\s*HT|Total\s*hors\s*taxe[s]?|Subtotal|Sous-total)\s*:?\s*' + amount_pattern,
-            r'(?:HT|Hors\s*taxe)\s*:?\s*' + amount_pattern,
-        ]
-        
-        for pattern in ht_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
+        for compiled in self.re_ht:
+            match = scan.search(compiled)
             if match and 'total_ht' not in amounts:
                 montant_str = match.group(1).replace(' ', '') + '.' + match.group(2)
                 try:
@@ -414,13 +560,8 @@ class OCRLevel1:
                     pass
         
         # PATTERN 3: TVA / Montant TVA / VAT Amount
-        tva_patterns = [
-            r'(?:Montant\s*TVA|TVA|VAT\s*Amount)\s*:?\s*' + amount_pattern,
-            r'(?:TVA|VAT)\s*:?\s*' + amount_pattern,
-        ]
-        
-        for pattern in tva_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
+        for compiled in self.re_montant_tva:
+            match = scan.search(compiled)
             if match and 'montant_tva' not in amounts:
                 montant_str = match.group(1).replace(' ', '') + '.' + match.group(2)
                 try:
@@ -448,8 +589,8 @@ class OCRLevel1:
     
     def _extract_amount_from_line(self, line: str) -> Optional[float]:
         """Extrait un montant d'une ligne"""
-        for pattern in self.AMOUNT_PATTERNS:
-            matches = re.findall(pattern, line)
+        for compiled in self.re_line_amount:
+            matches = compiled.findall(line)
             if matches:
                 # Prendre le dernier montant de la ligne (souvent le total)
                 match = matches[-1]
@@ -467,14 +608,15 @@ class OCRLevel1:
         
         return None
     
-    def _extract_tva(self, text: str, text_lower: str) -> Optional['FieldValue']:
+    def _extract_tva(self, text: str, text_lower: str, scan: Optional[ScanResult] = None) -> Optional['FieldValue']:
         """Extrait le taux de TVA si unique et évident"""
         from ocr_engine import FieldValue
+        scan = scan if scan is not None else self.scanner.scan(text)
         
         tva_rates = []
         
-        for pattern in self.TVA_PATTERNS:
-            matches = re.findall(pattern, text, re.IGNORECASE)
+        for compiled in self.re_tva_rate:
+            matches = scan.findall(compiled)
             for match in matches:
                 if isinstance(match, tuple):
                     rate_str = f"{match[0]}.{match[1]}" if match[1] else match[0]
@@ -590,45 +732,24 @@ class OCRLevel1:
         
         # [FIX] Nettoyer le texte : retirer espaces entre lettres/chiffres
         # "N u m é r o  d e  f a c t u r e N 8 W Y" -> "Numéro de facture N8WY"
-        text_clean = re.sub(r'(?<=[A-Za-z0-9])\s+(?=[A-Za-z0-9])', '', text)
+        text_clean = self.re_reference_gap.sub('', text)
+        scan = self.reference_scanner.scan(text_clean)
         
-        # PATTERNS GÉNÉRIQUES + SPÉCIFIQUES PAR TYPE
-        # IMPORTANT : patterns doivent contenir AU MOINS un chiffre pour éviter les faux positifs
+        # PATTERNS GÉNÉRIQUES + SPÉCIFIQUES PAR TYPE (REFERENCE_PATTERNS)
         # FRONTIÈRE DE MOT \b à la fin pour éviter de capturer des mots suivants (ex: "N8WY0KFA0003Dated")
-        patterns_all = [
-            # Patterns avec label explicite (haute confiance)
-            # Match : "Numéro de facture : N8WY0KFA-0003" ou "Invoice Number: 12345"
-            (r'N[°oúu]m[eé]ro\s*(?:de\s*)?facture\s*:?\s*([A-Z0-9\-_]{3,25})(?:\b|$|\s)', 0.95, 'facture_label_fr'),
-            (r'Invoice\s+Number\s*:?\s*([A-Z0-9\-_]{3,25})(?:\b|$|\s)', 0.95, 'invoice_number'),
-            (r'N[°oú]\s*(?:de\s*)?facture\s*:?\s*([A-Z0-9\-_]{3,25})(?:\b|$|\s)', 0.95, 'facture_label'),
-            (r'FACTURE\s*N[°oú]?\s*:?\s*([A-Z0-9\-_]{3,25})(?:\b|$|\s)', 0.90, 'facture_prefix'),
-            (r'N[°oú]\s*FACTURE\s*:?\s*([A-Z0-9\-_]{3,25})(?:\b|$|\s)', 0.90, 'facture_prefix'),
-            
-            # Patterns pour tickets
-            (r'N[°oú]\s*(?:de\s*)?ticket\s*:?\s*([A-Z0-9\-_]{3,25})(?:\b|$|\s)', 0.90, 'ticket_label'),
-            (r'TICKET\s*N[°oú]?\s*:?\s*([A-Z0-9\-_]{3,25})(?:\b|$|\s)', 0.85, 'ticket_prefix'),
-            
-            # Patterns pour devis
-            (r'N[°oú]\s*(?:de\s*)?devis\s*:?\s*([A-Z0-9\-_]{3,25})(?:\b|$|\s)', 0.90, 'devis_label'),
-            (r'DEVIS\s*N[°oú]?\s*:?\s*([A-Z0-9\-_]{3,25})(?:\b|$|\s)', 0.85, 'devis_prefix'),
-            
-            # Pattern générique: N° suivi de code alphanumérique (>= 5 caractères)
-            (r'N[°oú]\s*:?\s*([A-Z0-9\-_]{5,25})(?:\b|$|\s)', 0.70, 'generic_number'),
-        ]
-        
         # Essayer tous les patterns sur le texte nettoyé
-        for pattern, confidence, pattern_name in patterns_all:
-            match = re.search(pattern, text_clean, re.IGNORECASE)
+        for compiled, confidence, pattern_name in self.re_reference:
+            match = scan.search(compiled)
             if match:
                 numero = match.group(1).strip()
                 # Nettoyer le numéro extrait
-                numero = re.sub(r'[\s\-_]+', '', numero)  # Retirer espaces, tirets, underscores
+                numero = self.re_reference_separators.sub('', numero)  # Retirer espaces, tirets, underscores
                 
                 # VALIDATION STRICTE : 
                 # 1. Doit contenir AU MOINS un chiffre (sinon c'est un mot français)
                 # 2. Longueur : 3-25 caractères
                 # 3. Ne doit pas être QUE des lettres (ex: "nesbsabonrerhbiorryn")
-                has_digit = bool(re.search(r'\d', numero))
+                has_digit = bool(self.re_digit.search(numero))
                 valid_length = 3 <= len(numero) <= 25
                 not_only_letters = not numero.isalpha()
                 
@@ -671,16 +792,14 @@ class OCRLevel1:
     
     # ===== NOUVELLES MÉTHODES D'EXTRACTION COMPLÈTE (MIROIR) =====
     
-    def _extract_date_echeance(self, text: str, text_lower: str) -> Optional['FieldValue']:
+    def _extract_date_echeance(self, text: str, text_lower: str, scan: Optional[ScanResult] = None) -> Optional['FieldValue']:
         """Extrait la date d'échéance"""
         from ocr_engine import FieldValue
+        scan = scan if scan is not None else self.scanner.scan(text)
         
-        patterns = [
-            r'(?:échéance|due\s+date|payment\s+due)[\s:]+' + p for p in self.DATE_PATTERNS
-        ]
-        
-        for pattern in patterns:
-            matches = re.findall(pattern, text, re.IGNORECASE)
+        # DATE_ECHEANCE_PREFIX + DATE_PATTERNS (combinaisons compilées une fois)
+        for compiled in self.re_date_echeance:
+            matches = scan.findall(compiled)
             if matches:
                 match = matches[0]
                 if len(match) == 3:
@@ -704,17 +823,18 @@ class OCRLevel1:
                         value=date_str,
                         confidence=0.85,
                         extraction_method='regex',
-                        pattern=pattern
+                        pattern=compiled.pattern
                     )
         
         return None
     
-    def _extract_emetteur_complet(self, text: str, text_lower: str, context) -> Dict[str, 'FieldValue']:
+    def _extract_emetteur_complet(self, text, text_lower: str, context) -> Dict[str, 'FieldValue']:
         """Extrait TOUTES les infos de l'émetteur (nom, adresse, SIRET, etc.) - MÉTHODE ROBUSTE"""
         from ocr_engine import FieldValue
         
         result = {}
-        lines = text.split('\n')
+        view = as_text_view(text)
+        lines = view.lines
         
         # ========================================================================
         # PATTERNS D'ÉMETTEURS CONNUS (COIN HAUT GAUCHE - 5-10 premières lignes)
@@ -736,14 +856,14 @@ class OCRLevel1:
         }
         
         # ÉTAPE 1: Recherche par patterns connus dans les 10 premières lignes (prioritaire)
-        text_haut = ' '.join(lines[:10]).lower()
+        text_haut = view.header_lower
         
         for nom_normalise, patterns in EMETTEURS_CONNUS.items():
             for pattern in patterns:
                 if pattern.lower() in text_haut:
                     # Trouver la ligne exacte pour confiance accrue
-                    for i, line in enumerate(lines[:10]):
-                        if pattern.lower() in line.lower():
+                    for i, line_lower in enumerate(view.lines_lower[:10]):
+                        if pattern.lower() in line_lower:
                             result['emetteur_nom'] = FieldValue(
                                 value=nom_normalise,
                                 confidence=0.95,
@@ -758,13 +878,13 @@ class OCRLevel1:
         for i, line in enumerate(lines[:20]):
             line_clean = line.strip()
             # Retirer caractères nulls
-            line_clean = re.sub(r'[\x00-\x1F]', '', line_clean)
-            line_clean = re.sub(r'\s+', ' ', line_clean)  # Normaliser espaces multiples
+            line_clean = self.re_control_chars.sub('', line_clean)
+            line_clean = self.re_whitespace.sub(' ', line_clean)  # Normaliser espaces multiples
             # [FIX PyPDF2] Retirer espaces ENTRE lettres ("M a i n F u n c" → "MainFunc")
-            line_clean = re.sub(r'(?<=[a-zA-Z])\s(?=[a-zA-Z])', '', line_clean)
+            line_clean = self.re_emetteur_letter_gap.sub('', line_clean)
             
             # Pattern: ligne contenant des suffixes d'entreprise ET moins de 100 caractères (pour éviter les paragraphes)
-            if (re.search(r'\b(PTE\.?|LTD\.?|SARL|SAS|SA|Inc\.?|LLC|Corp\.?|Company|GmbH)\b', line_clean, re.IGNORECASE) 
+            if (self.re_company_suffix.search(line_clean)
                 and len(line_clean) < 100  # Ligne courte = nom d'entreprise
                 and len(line_clean) > 5):  # Au moins 5 caractères
                 
@@ -792,53 +912,48 @@ class OCRLevel1:
         
         return result
     
-    def _extract_client_complet(self, text: str, text_lower: str) -> Dict[str, 'FieldValue']:
+    def _extract_client_complet(self, text: str, text_lower: str, scan: Optional[ScanResult] = None) -> Dict[str, 'FieldValue']:
         """Extrait TOUTES les infos du client"""
         from ocr_engine import FieldValue
+        scan = scan if scan is not None else self.scanner.scan(text)
         
         result = {}
         
-        # Patterns client
-        client_patterns = [
-            r'(?:Client|À|To|Bill\s+to|Facturé\s+à)[\s:]+([A-Z][A-Za-z\s-]+)',
-            r'(?:Destinataire)[\s:]+([A-Z][A-Za-z\s-]+)',
-        ]
-        
-        for pattern in client_patterns:
-            match = re.search(pattern, text, re.MULTILINE | re.IGNORECASE)
+        # Patterns client (CLIENT_PATTERNS)
+        for compiled in self.re_client:
+            match = scan.search(compiled)
             if match:
                 nom_client = match.group(1).strip()
                 result['client_nom'] = FieldValue(
                     value=nom_client,
                     confidence=0.85,
                     extraction_method='regex_pattern',
-                    pattern=pattern
+                    pattern=compiled.pattern
                 )
                 break
         
         return result
     
-    def _extract_siret(self, text: str) -> Optional['FieldValue']:
+    def _extract_siret(self, text: str, scan: Optional[ScanResult] = None) -> Optional['FieldValue']:
         """Extrait le SIRET (14 chiffres) - MÉTHODE ROBUSTE"""
         from ocr_engine import FieldValue
+        scan = scan if scan is not None else self.scanner.scan(text)
         
         # PATTERN 1: SIRET avec label (SIRET: xxxxx)
-        pattern_label = r'(?:SIRET|Siret)[\s:]+([\ d\s]{14,})'
-        match = re.search(pattern_label, text, re.IGNORECASE)
+        match = scan.search(self.re_siret_label)
         
         if match:
-            siret = re.sub(r'\s', '', match.group(1))[:14]  # Retirer espaces, garder 14 chiffres
+            siret = self.re_whitespace.sub('', match.group(1))[:14]  # Retirer espaces, garder 14 chiffres
             if len(siret) == 14 and siret.isdigit():
                 return FieldValue(
                     value=siret,
                     confidence=0.95,
                     extraction_method='regex_with_label',
-                    pattern=pattern_label
+                    pattern=self.re_siret_label.pattern
                 )
         
         # PATTERN 2: 14 chiffres consécutifs (sans label) - confiance plus faible
-        pattern_brut = r'\b(\d{14})\b'
-        match = re.search(pattern_brut, text)
+        match = scan.search(self.re_siret_raw)
         
         if match:
             siret = match.group(1)
@@ -851,37 +966,32 @@ class OCRLevel1:
         
         return None
     
-    def _extract_numero_tva(self, text: str) -> Optional['FieldValue']:
+    def _extract_numero_tva(self, text: str, scan: Optional[ScanResult] = None) -> Optional['FieldValue']:
         """Extrait le numéro de TVA intracommunautaire"""
         from ocr_engine import FieldValue
+        scan = scan if scan is not None else self.scanner.scan(text)
         
-        patterns = [
-            r'(?:TVA|VAT|N°\s*TVA)[\s:]+([A-Z]{2}\d+)',
-            r'(?:EU\s*OSS\s*VAT|EU\s*VAT)[\s:]+([A-Z]{2}\d+)',
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
+        for compiled in self.re_numero_tva:
+            match = scan.search(compiled)
             if match:
                 return FieldValue(
                     value=match.group(1),
                     confidence=0.90,
                     extraction_method='regex',
-                    pattern=pattern
+                    pattern=compiled.pattern
                 )
         
         return None
     
-    def _extract_adresses(self, text: str) -> Dict[str, 'FieldValue']:
+    def _extract_adresses(self, text: str, scan: Optional[ScanResult] = None) -> Dict[str, 'FieldValue']:
         """Extrait les adresses (émetteur et client)"""
         from ocr_engine import FieldValue
+        scan = scan if scan is not None else self.scanner.scan(text)
         
         result = {}
         
         # Pattern adresse générique : numéro + rue/road/avenue
-        adresse_pattern = r'(\d+[,\s]+[A-Z][A-Za-z\s]+(?:Street|Road|Avenue|Rue|Boulevard|Rd|Ave)[^,\n]*(?:,\s*[A-Z\s]+)?(?:,\s*[A-Z]{2}\s*\d+)?)'
-        
-        matches = re.findall(adresse_pattern, text, re.IGNORECASE)
+        matches = scan.findall(self.re_adresse)
         
         if matches:
             # Première adresse = émetteur
@@ -889,7 +999,7 @@ class OCRLevel1:
                 value=matches[0].strip(),
                 confidence=0.75,
                 extraction_method='regex',
-                pattern=adresse_pattern
+                pattern=self.re_adresse.pattern
             )
             
             # Deuxième adresse = client (si présente)
@@ -898,7 +1008,7 @@ class OCRLevel1:
                     value=matches[1].strip(),
                     confidence=0.70,
                     extraction_method='regex',
-                    pattern=adresse_pattern
+                    pattern=self.re_adresse.pattern
                 )
         
         return result
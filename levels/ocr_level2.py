@@ -3,11 +3,13 @@ OCR LEVEL 2 - ANALYSE APPROFONDIE
 Objectif : Améliorer les résultats OCR1 sans les dégrader
 """
 
-import re
 import logging
 from datetime import datetime
 from typing import Dict, Optional, List
-from copy import deepcopy
+
+from utils.field_overlay import FieldOverlay
+from utils.patterns import PatternRegistry
+from utils.text_view import as_text_view
 
 logger = logging.getLogger("OCREngine.Level2")
 
@@ -29,17 +31,49 @@ class OCRLevel2:
     - Calculs et vérifications de cohérence
     """
     
-    def __init__(self, config: dict):
+    # Patterns de cartographie du contexte
+    SIRET_PATTERN = r'\b\d{3}\s?\d{3}\s?\d{3}\s?\d{5}\b'
+    AMOUNT_MAP_PATTERN = r'(\d+[,\s]\d{3}|\d+)[.,](\d{2})\s*€?'
+    DATE_MAP_PATTERNS = [
+        r'\b(\d{2})[/-](\d{2})[/-](\d{4})\b',
+        r'\b(\d{4})[/-](\d{2})[/-](\d{2})\b'
+    ]
+    
+    # Patterns ticket CB
+    TICKET_SIRET_PATTERN = r'\b(\d{3}\s?\d{3}\s?\d{3}\s?\d{5})\b'
+    # Patterns: **** 1234, XXXX 1234, ...1234
+    CARTE_PATTERNS = [
+        r'[\*X]{4}\s?[\*X]{4}\s?[\*X]{4}\s?(\d{4})',  # **** **** **** 1234
+        r'[\*X]{4}\s?(\d{4})',                          # **** 1234
+        r'\.\.\.(\d{4})',                               # ...1234
+        r'CARTE\s+(\d{4})',                             # CARTE 1234
+    ]
+    
+    def __init__(self, config: dict, patterns: Optional[PatternRegistry] = None):
         """
         Initialise OCR Level 2
         
         Args:
             config: Configuration globale du système
+            patterns: Registre de patterns partagé (créé par l'engine)
         """
         self.config = config
         self.confidence_threshold = config.get('ocr_level2', {}).get('confidence_threshold', 0.6)
+        self.patterns = patterns if patterns is not None else PatternRegistry()
+        self._compile_patterns(self.patterns)
         logger.info("OCR Level 2 initialized")
     
+    def _compile_patterns(self, registry: PatternRegistry):
+        """Compile une seule fois tous les patterns du niveau 2"""
+        self.re_table_split = registry.compile('level2.table_split', r'\s{2,}|\t')
+        self.re_siret = registry.compile('level2.siret', self.SIRET_PATTERN)
+        self.re_amount_map = registry.compile('level2.amount_map', self.AMOUNT_MAP_PATTERN)
+        self.re_date_map = registry.compile_many('level2.date_map', self.DATE_MAP_PATTERNS)
+        self.re_ticket_siret = registry.compile('level2.ticket.siret', self.TICKET_SIRET_PATTERN)
+        self.re_carte = registry.compile_many('level2.ticket.carte', self.CARTE_PATTERNS)
+        self.re_montant_cb = registry.compile('level2.ticket.montant', r'(\d+[,\.]\d{2})')
+        self.re_ticket_post = _compile_ticket_postprocess(registry)
+    
     def process(self, document, ocr1_result: 'OCRResult', context) -> 'OCRResult':
         """
         Améliore les résultats OCR1
@@ -54,18 +88,33 @@ class OCRLevel2:
         """
         from ocr_engine import OCRResult, FieldValue
         
-        # 1. PRÉSERVATION des résultats OCR1
-        fields = deepcopy(ocr1_result.fields)
+        # 1. PRÉSERVATION des résultats OCR1 (couche : seuls les champs modifiés sont écrits)
+        fields = FieldOverlay.over(ocr1_result.fields)
         improved_fields = []
         
-        text = document.get_text()
-        text_lower = text.lower()
+        # Formes dérivées partagées avec le niveau 1 (vue du document)
+        view = as_text_view(document)
+        text = view.text
+        text_lower = view.lower
+        
+        # Budget Level 2 (context.deadline) : vérifié entre deux étapes
+        deadline = getattr(context, 'deadline', None)
+        truncated = False
+        
+        def budget_left() -> bool:
+            nonlocal truncated
+            if not truncated and deadline is not None and deadline.expired():
+                truncated = True
+                logger.warning("[OCR2] Time budget exhausted, returning partial result")
+            return not truncated
         
         # 2. Extraction contexte avancé
-        context_data = self._extract_advanced_context(text, text_lower)
+        context_data = self._extract_advanced_context(view, text_lower)
         
         # 3. Amélioration ciblée des champs faibles
         for field_name, field_value in fields.items():
+            if not budget_left():
+                break
             if field_value.confidence < 0.7 or field_value.value is None:
                 logger.debug(f"Attempting to improve field: {field_name} (current confidence: {field_value.confidence:.2f})")
                 
@@ -84,6 +133,8 @@ class OCRLevel2:
         # 4. Recherche champs manquants critiques
         missing_fields = self._find_missing_critical_fields(fields, ocr1_result.document_type)
         for field_name in missing_fields:
+            if not budget_left():
+                break
             logger.debug(f"Attempting to extract missing field: {field_name}")
             
             extracted = self._extract_missing_field(
@@ -99,8 +150,8 @@ class OCRLevel2:
                 logger.info(f"Missing field extracted: {field_name} (confidence: {extracted.confidence:.2f})")
         
         # 4.5 🎯 ENRICHISSEMENT SPÉCIAL TICKET CB (SNIPER MODE)
-        if ocr1_result.document_type == "TICKET":
-            ticket_enriched = self._enrich_ticket_cb(text, fields, context_data)
+        if ocr1_result.document_type == "TICKET" and budget_left():
+            ticket_enriched = self._enrich_ticket_cb(view, fields, context_data)
             for field_name, field_value in ticket_enriched.items():
                 # NE PAS ÉCRASER les champs déjà renseignés
                 if field_name not in fields or not fields[field_name].value:
@@ -139,10 +190,11 @@ class OCRLevel2:
 
 
         # 5. Croisement et validation
-        fields = self._cross_validate_fields(fields, context_data)
+        if budget_left():
+            fields = self._cross_validate_fields(fields, context_data)
         
         # 6. Calculs manquants (HT ↔ TTC ↔ TVA)
-        if self._can_calculate_missing_values(fields):
+        if budget_left() and self._can_calculate_missing_values(fields):
             calculated_fields = self._calculate_missing_amounts(fields)
             for field_name, field_value in calculated_fields.items():
                 if field_name not in fields or fields[field_name].confidence < field_value.confidence:
@@ -171,21 +223,24 @@ class OCRLevel2:
             fields=fields,
             processing_date=datetime.now(),
             needs_next_level=needs_level3,
-            improved_fields=improved_fields
+            improved_fields=improved_fields,
+            truncated=truncated
         )
         
         logger.info(f"OCR Level 2 completed: improved {len(improved_fields)} fields, confidence: {global_confidence:.2f}")
         
         return result
     
-    def _extract_advanced_context(self, text: str, text_lower: str) -> dict:
+    def _extract_advanced_context(self, text, text_lower: str) -> dict:
         """
         Extrait le contexte avancé du document
         
         Returns:
             dict avec structure, zones, patterns détectés
         """
-        lines = text.split('\n')
+        view = as_text_view(text)
+        text = view.text
+        lines = view.lines
         
         context = {
             'lines': lines,
@@ -227,7 +282,7 @@ class OCRLevel2:
         
         for i, line in enumerate(lines):
             # Détection tableau : plusieurs espaces/tabs ou alignement
-            has_multiple_columns = len(re.split(r'\s{2,}|\t', line.strip())) >= 3
+            has_multiple_columns = len(self.re_table_split.split(line.strip())) >= 3
             
             if has_multiple_columns:
                 if not in_table:
@@ -249,10 +304,9 @@ class OCRLevel2:
     
     def _find_siret_locations(self, text: str) -> List[dict]:
         """Localise tous les SIRET dans le document"""
-        siret_pattern = r'\b\d{3}\s?\d{3}\s?\d{3}\s?\d{5}\b'
         locations = []
         
-        for match in re.finditer(siret_pattern, text):
+        for match in self.re_siret.finditer(text):
             siret = match.group().replace(' ', '')
             locations.append({
                 'siret': siret,
@@ -266,10 +320,8 @@ class OCRLevel2:
         """Cartographie tous les montants avec leur contexte"""
         amounts_map = []
         
-        amount_pattern = r'(\d+[,\s]\d{3}|\d+)[.,](\d{2})\s*€?'
-        
         for i, line in enumerate(lines):
-            for match in re.finditer(amount_pattern, line):
+            for match in self.re_amount_map.finditer(line):
                 amount_str = match.group()
                 try:
                     # Parse amount
@@ -291,14 +343,9 @@ class OCRLevel2:
         """Cartographie toutes les dates avec leur contexte"""
         dates_map = []
         
-        date_patterns = [
-            r'\b(\d{2})[/-](\d{2})[/-](\d{4})\b',
-            r'\b(\d{4})[/-](\d{2})[/-](\d{2})\b'
-        ]
-        
         for i, line in enumerate(lines):
-            for pattern in date_patterns:
-                for match in re.finditer(pattern, line):
+            for compiled in self.re_date_map:
+                for match in compiled.finditer(line):
                     dates_map.append({
                         'raw': match.group(),
                         'line_index': i,
@@ -549,7 +596,7 @@ class OCRLevel2:
         
         return sum(confidences) / len(confidences)
     
-    def _enrich_ticket_cb(self, text: str, fields: Dict, context_data: dict) -> Dict:
+    def _enrich_ticket_cb(self, text, fields: Dict, context_data: dict) -> Dict:
         """
         🎯 ENRICHISSEMENT SPÉCIAL TICKET CB (SNIPER MODE)
         
@@ -571,15 +618,16 @@ class OCRLevel2:
         from ocr_engine import FieldValue
         
         enriched = {}
-        text_upper = text.upper()
-        text_lines = text.split('\n')
+        view = as_text_view(text)
+        text = view.text
+        text_upper = view.upper
+        text_lines = view.lines
         
         logger.debug("🎯 TICKET CB enrichment: starting analysis...")
         
         # 1. Détection SIRET fournisseur (14 chiffres)
         # Pattern: \d{3}\s?\d{3}\s?\d{3}\s?\d{5}
-        siret_pattern = r'\b(\d{3}\s?\d{3}\s?\d{3}\s?\d{5})\b'
-        siret_matches = re.findall(siret_pattern, text)
+        siret_matches = self.re_ticket_siret.findall(text)
         if siret_matches:
             # Prendre le premier SIRET (souvent en header)
             siret_clean = siret_matches[0].replace(' ', '')
@@ -589,7 +637,7 @@ class OCRLevel2:
                     confidence=0.85,
                     extraction_method='pattern_siret_14digits',
                     position=None,
-                    pattern=siret_pattern
+                    pattern=self.re_ticket_siret.pattern
                 )
                 logger.info(f"✓ SIRET fournisseur détecté: {siret_clean}")
         
@@ -622,17 +670,10 @@ class OCRLevel2:
             logger.info(f"✓ Statut paiement: PAYE (dérivé de CB)")
         
         # 3. Détection 4 derniers chiffres carte
-        # Patterns: **** 1234, XXXX 1234, ...1234
-        carte_patterns = [
-            r'[\*X]{4}\s?[\*X]{4}\s?[\*X]{4}\s?(\d{4})',  # **** **** **** 1234
-            r'[\*X]{4}\s?(\d{4})',                          # **** 1234
-            r'\.\.\.(\d{4})',                               # ...1234
-            r'CARTE\s+(\d{4})',                             # CARTE 1234
-        ]
-        
+        # CARTE_PATTERNS : **** 1234, XXXX 1234, ...1234
         carte_last4 = None
-        for pattern in carte_patterns:
-            matches = re.findall(pattern, text_upper)
+        for compiled in self.re_carte:
+            matches = compiled.findall(text_upper)
             if matches:
                 carte_last4 = matches[0]
                 break
@@ -653,7 +694,7 @@ class OCRLevel2:
             line_upper = line.upper()
             if ('MONTANT' in line_upper or 'TOTAL' in line_upper) and any(k in line_upper for k in ['CB', 'CARTE', 'EUR', '€']):
                 # Extraire montant : pattern \d+[,.]\d{2}
-                amount_matches = re.findall(r'(\d+[,\.]\d{2})', line)
+                amount_matches = self.re_montant_cb.findall(line)
                 if amount_matches:
                     try:
                         montant_str = amount_matches[0].replace(',', '.')
@@ -700,21 +741,36 @@ class OCRLevel2:
         
         return False
 
-def _postprocess_ticket_fields(data: dict, entreprise_source: str, full_text: str) -> None:
+# Registre utilisé quand _postprocess_ticket_fields est appelée hors engine
+_DEFAULT_PATTERNS = PatternRegistry(collect_stats=False)
+
+
+def _compile_ticket_postprocess(registry: PatternRegistry) -> dict:
+    """Patterns de _postprocess_ticket_fields"""
+    return {
+        'siren_like': registry.compile('level2.ticket_post.siren_like', r"\b\d{3}\s?\d{3}\s?\d{3}\b"),
+        'siren_groups': registry.compile('level2.ticket_post.siren_groups', r"(\d{3})\s?(\d{3})\s?(\d{3})"),
+        'letter': registry.compile('level2.ticket_post.letter', r"[A-Za-zÀ-ÿ]"),
+    }
+
+
+def _postprocess_ticket_fields(data: dict, entreprise_source: str, full_text: str,
+                               patterns: Optional[PatternRegistry] = None) -> None:
     """Ticket-specific normalization:
     - If OCR put a SIREN/SIRET into client, move it to fournisseur_siret.
     - Ensure client = entreprise_source.
     - Best-effort detect fournisseur name from top lines.
     """
     try:
+        regexes = _compile_ticket_postprocess(patterns if patterns is not None else _DEFAULT_PATTERNS)
         ent = (entreprise_source or "").strip()
         if ent:
             data.setdefault("client", ent)
 
         client_val = str(data.get("client") or "")
         # Move siren/siret from client -> fournisseur_siret
-        if ("siren" in client_val.lower()) or re.search(r"\b\d{3}\s?\d{3}\s?\d{3}\b", client_val):
-            m = re.search(r"(\d{3})\s?(\d{3})\s?(\d{3})", client_val)
+        if ("siren" in client_val.lower()) or regexes['siren_like'].search(client_val):
+            m = regexes['siren_groups'].search(client_val)
             if m and not data.get("fournisseur_siret"):
                 data["fournisseur_siret"] = "".join(m.groups())
             if ent:
@@ -729,7 +785,7 @@ def _postprocess_ticket_fields(data: dict, entreprise_source: str, full_text: st
             best = ""
             for ln in head:
                 # pick a line with letters and not just numbers
-                if len(re.findall(r"[A-Za-zÀ-ÿ]", ln)) >= 4 and len(ln) <= 60:
+                if len(regexes['letter'].findall(ln)) >= 4 and len(ln) <= 60:
                     best = ln
                     break
             if best:
@@ -10,7 +10,12 @@ import re
 import logging
 from datetime import datetime
 from typing import Dict, Optional, List
-from copy import deepcopy
+
+from memory.extractors import learn_extractor
+from utils.field_overlay import FieldOverlay
+from utils.patterns import PatternRegistry
+from utils.signature import document_signature, edge_lines
+from utils.text_view import as_text_view
 
 logger = logging.getLogger("OCREngine.Level3")
 
@@ -28,17 +33,32 @@ class OCRLevel3:
     Objectif : Éliminer l'apprentissage répétitif
     """
     
-    def __init__(self, config: dict):
+    # Champs jamais repris dans les actions d'une règle
+    NON_RULE_FIELDS = ('texte_ocr_brut',)
+    
+    def __init__(self, config: dict, patterns: Optional[PatternRegistry] = None):
         """
         Initialise OCR Level 3
         
         Args:
             config: Configuration globale du système
+            patterns: Registre de patterns partagé (créé par l'engine)
         """
         self.config = config
+        self.patterns = patterns if patterns is not None else PatternRegistry()
+        self._compile_patterns(self.patterns)
         logger.info("OCR Level 3 initialized")
         logger.warning("Level 3 is RARE and creates memory rules")
     
+    def _compile_patterns(self, registry: PatternRegistry):
+        """Compile une seule fois tous les patterns du niveau 3"""
+        self.re_siret = registry.compile('level3.siret', r'\b\d{3}\s?\d{3}\s?\d{3}\s?\d{5}\b')
+        self.re_table_split = registry.compile('level3.table_split', r'\s{2,}|\t')
+        self.re_caps_word = registry.compile('level3.caps_word', r'\b[A-Z]{4,}\b')
+        self.re_reference = registry.compile(
+            'level3.reference', r'(?:N[°o]|REF|REFERENCE|FACTURE|DEVIS)[:\s]+([A-Z0-9-]+)', re.IGNORECASE
+        )
+    
     def process(self, document, ocr2_result: 'OCRResult', context) -> 'OCRResult':
         """
         Traitement Level 3 : Validation + Création règle
@@ -59,8 +79,8 @@ class OCRLevel3:
         pattern = self._analyze_document_pattern(document, context)
         logger.info(f"Document pattern analyzed: {pattern.get('signature', 'unknown')}")
         
-        # 2. PRÉSERVATION résultats OCR2
-        fields = deepcopy(ocr2_result.fields)
+        # 2. PRÉSERVATION résultats OCR2 (couche : seuls les champs modifiés sont écrits)
+        fields = FieldOverlay.over(ocr2_result.fields)
         corrections = []
         
         # 3. VÉRIFICATION COHÉRENCE GLOBALE
@@ -112,9 +132,13 @@ class OCRLevel3:
         logger.info(f"Memory rule created: {rule['id']}")
         logger.info(f"Rule conditions: {len(rule['conditions'])} conditions")
         logger.info(f"Rule actions: {len(rule['actions'])} extraction actions")
+        # Règle sans aucun champ ré-extractible : rien à mémoriser
+        if not rule['actions']:
+            logger.info("No re-executable action, rule not kept")
+            rule = None
         
         # 7. ENREGISTREMENT RÈGLE
-        # Sera fait par le memory store via l'engine
+        # Fait par l'engine (AIMemory.save_rule) si ocr_level3.create_rules
         
         # 8. CONSTRUCTION RÉSULTAT
         result = OCRResult(
@@ -131,8 +155,9 @@ class OCRLevel3:
         )
         
         result.logs.append(f"OCR Level 3 completed")
-        result.logs.append(f"Rule created: {rule['id']}")
-        result.logs.append(f"Future similar documents will bypass OCR1/OCR2")
+        if rule:
+            result.logs.append(f"Rule created: {rule['id']}")
+            result.logs.append(f"Future similar documents will bypass OCR1/OCR2")
         
         logger.info(f"OCR Level 3 completed: {len(corrections)} corrections, rule created")
         
@@ -145,8 +170,9 @@ class OCRLevel3:
         Returns:
             dict avec signature, caractéristiques, identifiants
         """
-        text = document.get_text()
-        lines = text.split('\n')
+        view = as_text_view(document)
+        text = view.text
+        lines = view.lines
         
         # Extraction caractéristiques uniques
         pattern = {
@@ -160,17 +186,13 @@ class OCRLevel3:
             'layout_features': {}
         }
         
-        # Header (5 premières lignes non vides)
-        header_lines = [l.strip() for l in lines[:10] if l.strip()][:5]
+        # Header / footer (5 premières / dernières lignes non vides)
+        header_lines, footer_lines = edge_lines(view)
         pattern['header_lines'] = header_lines
-        
-        # Footer (5 dernières lignes non vides)
-        footer_lines = [l.strip() for l in lines[-10:] if l.strip()][-5:]
         pattern['footer_lines'] = footer_lines
         
         # Recherche SIRET
-        siret_pattern = r'\b\d{3}\s?\d{3}\s?\d{3}\s?\d{5}\b'
-        sirets = re.findall(siret_pattern, text)
+        sirets = self.re_siret.findall(text)
         pattern['siret_found'] = [s.replace(' ', '') for s in sirets]
         
         # Logo/identité visuelle (mots-clés répétés en header)
@@ -183,21 +205,20 @@ class OCRLevel3:
         pattern['logo_keywords'] = [w for w, freq in word_freq.items() if freq >= 2]
         
         # Type de structure (tableau, liste, etc.)
-        has_tables = any(len(re.split(r'\s{2,}|\t', l)) >= 3 for l in lines)
+        has_tables = any(len(self.re_table_split.split(l)) >= 3 for l in lines)
         pattern['structure_type'] = 'table' if has_tables else 'linear'
         
         # Mots-clés uniques (capitalisés, répétés)
         unique_keywords = set()
         for line in lines:
             # Mots en majuscules de plus de 4 lettres
-            caps_words = re.findall(r'\b[A-Z]{4,}\b', line)
+            caps_words = self.re_caps_word.findall(line)
             unique_keywords.update(caps_words)
         
         pattern['unique_keywords'] = list(unique_keywords)[:10]  # Top 10
         
-        # Signature unique (hash du header + footer)
-        signature_text = ' '.join(header_lines[:3] + footer_lines[-2:])
-        pattern['signature'] = hash(signature_text) % 1000000  # Hash simplifié
+        # Signature stable (digest du header + footer normalisés)
+        pattern['signature'] = document_signature(view)
         
         return pattern
     
@@ -322,14 +343,14 @@ class OCRLevel3:
         """
         from ocr_engine import FieldValue
         
-        text = document.get_text()
+        view = as_text_view(document)
         
         # Stratégie par champ
         if field_name == 'reference':
             # Recherche dans header
             for line in pattern['header_lines']:
                 # Pattern général : suite de chiffres/lettres après N°, Ref, etc.
-                ref_match = re.search(r'(?:N[°o]|REF|REFERENCE|FACTURE|DEVIS)[:\s]+([A-Z0-9-]+)', line, re.IGNORECASE)
+                ref_match = self.re_reference.search(line)
                 if ref_match:
                     return FieldValue(
                         value=ref_match.group(1),
@@ -339,7 +360,7 @@ class OCRLevel3:
         
         elif field_name == 'client':
             # Recherche dans zone entre header et milieu
-            lines = text.split('\n')
+            lines = view.lines
             # Zone entre ligne 5 et 15 généralement
             for i in range(5, min(15, len(lines))):
                 line = lines[i].strip()
@@ -384,10 +405,15 @@ class OCRLevel3:
         if pattern['logo_keywords']:
             conditions['logo_keywords'] = pattern['logo_keywords'][:3]
         
-        # ACTIONS d'extraction
+        # ACTIONS d'extraction : localisateur appris sur ce document
+        # (ré-exécuté sur les documents suivants, pas de valeur rejouée)
+        view = as_text_view(document)
         actions = {}
         
         for field_name, field_value in fields.items():
+            # Texte brut propre au document : jamais mémorisé dans une règle
+            if field_name in self.NON_RULE_FIELDS:
+                continue
             if field_value.confidence >= 0.75:  # Seulement les champs fiables
                 action = {
                     'method': field_value.extraction_method or 'unknown',
@@ -402,6 +428,15 @@ class OCRLevel3:
                 if field_value.position:
                     action['position'] = field_value.position
                 
+                extractor = learn_extractor(
+                    field_name, field_value.value, view,
+                    position=field_value.position, pattern=action.get('pattern')
+                )
+                if extractor is None:
+                    logger.debug(f"No re-executable extractor for {field_name}, not kept in rule")
+                    continue
+                action['extractor'] = extractor
+                
                 actions[field_name] = action
         
         # MÉTADONNÉES
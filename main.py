@@ -7,20 +7,29 @@ This is the main entry point for the Cloud Run service.
 
 import os
 import sys
+import asyncio
+import contextlib
+import functools
+import io
+import json
 import logging
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Tuple
 
 from fastapi import FastAPI, File, UploadFile, Form, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 import uvicorn
 
 # Add current directory to path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from ocr_engine import OCREngine, OCRResult
+from jobs import JobQueue, QueueFullError
 from utils.runtime_check import check_runtime_dependencies
+from utils.admission import AdmissionController, AdmissionRejected
 from utils.logger import setup_logger
 
 # Setup logger
@@ -39,15 +48,58 @@ ocr_engine: Optional[OCREngine] = None
 # Runtime diagnostics flag (can be disabled in production)
 ENABLE_RUNTIME_DIAGNOSTICS = os.getenv("ENABLE_RUNTIME_DIAGNOSTICS", "true").lower() == "true"
 
+# Bounded executor running the synchronous OCR pipeline off the event loop.
+# Size = OCR_MAX_CONCURRENCY env var, else processing.max_concurrent_documents.
+ocr_executor: Optional[ThreadPoolExecutor] = None
+ocr_semaphore: Optional[asyncio.Semaphore] = None
 
-@app.on_event("startup")
-async def startup_event():
-    """Initialize the OCR engine and run runtime checks on startup"""
+# Event loop owning the semaphore and admission controller (job workers
+# submit their documents to it from their threads)
+event_loop: Optional[asyncio.AbstractEventLoop] = None
+
+# Admission control: cost budget + bounded wait queue (429/503 + Retry-After)
+admission: Optional[AdmissionController] = None
+
+# Asynchronous job queue (POST /jobs), workers started per process
+job_queue: Optional[JobQueue] = None
+
+# /ocr/batch limits (zip archives are expanded before counting)
+BATCH_MAX_FILES = int(os.getenv("OCR_BATCH_MAX_FILES", "50"))
+BATCH_MAX_UNZIPPED_BYTES = int(os.getenv("OCR_BATCH_MAX_UNZIPPED_BYTES", str(200 * 1024 * 1024)))
+
+
+def _max_concurrency(engine: OCREngine) -> int:
+    """Number of documents processed at the same time by this instance"""
+    env_value = os.getenv("OCR_MAX_CONCURRENCY")
+    if env_value:
+        return max(1, int(env_value))
+    processing = engine.config.get('processing', {}) or {}
+    return max(1, int(processing.get('max_concurrent_documents', 2)))
+
+
+async def run_ocr(func, *args, **kwargs):
+    """
+    Run a blocking OCR engine call in the bounded executor
+    
+    The event loop stays free for /health and other requests; callers
+    beyond the concurrency limit wait on the semaphore.
+    """
+    async with ocr_semaphore:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(ocr_executor, functools.partial(func, *args, **kwargs))
+
+
+def preload_engine() -> OCREngine:
+    """
+    Run runtime checks and build the OCR engine (idempotent)
+    
+    Called by startup_event, or once in the parent process by serve.py
+    so that forked workers share the engine copy-on-write.
+    """
     global ocr_engine
     
-    logger.info("=" * 80)
-    logger.info("BOX MAGIC OCR INTELLIGENT - Cloud Run Service Starting")
-    logger.info("=" * 80)
+    if ocr_engine is not None:
+        return ocr_engine
     
     # Run runtime dependency checks
     if ENABLE_RUNTIME_DIAGNOSTICS:
@@ -70,11 +122,183 @@ async def startup_event():
         logger.error(f"❌ Failed to initialize OCR Engine: {e}")
         raise
     
+    return ocr_engine
+
+
+@app.on_event("startup")
+async def startup_event():
+    """Initialize the OCR engine and run runtime checks on startup"""
+    global ocr_executor, ocr_semaphore, job_queue, admission, event_loop
+    
+    logger.info("=" * 80)
+    logger.info("BOX MAGIC OCR INTELLIGENT - Cloud Run Service Starting")
+    logger.info("=" * 80)
+    
+    if ocr_engine is not None:
+        logger.info(f"OCR Engine preloaded by parent process (worker pid={os.getpid()})")
+    else:
+        preload_engine()
+    
+    # OCR executor: documents run in threads (PDF text, Levels 1-3),
+    # Tesseract page OCR runs in the engine's process pool
+    max_concurrency = _max_concurrency(ocr_engine)
+    ocr_executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="ocr")
+    ocr_semaphore = asyncio.Semaphore(max_concurrency)
+    event_loop = asyncio.get_running_loop()
+    logger.info(f"OCR executor ready (max concurrent documents: {max_concurrency})")
+    
+    admission = AdmissionController.from_config(ocr_engine.config.get('admission'))
+    if admission is not None:
+        logger.info(f"Admission control enabled (max cost: {admission.max_cost}, max waiting: {admission.max_waiting})")
+    
+    # Job queue workers (threads created here, i.e. after fork in prefork mode)
+    job_queue = JobQueue.from_config(ocr_engine.config.get('jobs'), handler=_run_job)
+    if job_queue is not None:
+        job_queue.start()
+    
     logger.info("=" * 80)
     logger.info("Service ready to process documents")
     logger.info("=" * 80)
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop the OCR executor and the engine worker pools"""
+    if job_queue is not None:
+        # Off the loop: a running job still needs it to finish its document
+        await asyncio.get_running_loop().run_in_executor(None, job_queue.stop)
+    if ocr_executor is not None:
+        ocr_executor.shutdown(wait=True, cancel_futures=True)
+    if ocr_engine is not None:
+        ocr_engine.close()
+    logger.info("OCR service stopped")
+
+
+def result_to_dict(result: OCRResult) -> Dict[str, Any]:
+    """Convert an OCRResult to the JSON response payload"""
+    # [MIRROR MODE] Ajouter texte OCR brut complet
+    return {
+        "document_id": result.document_id,
+        "document_type": result.document_type,
+        "level": result.level,
+        "confidence": result.confidence,
+        "entreprise_source": result.entreprise_source,
+        
+        # [NEW] TEXTE OCR BRUT COMPLET
+        "ocr_text_raw": getattr(result, 'ocr_text_raw', ''),
+        
+        "fields": {
+            name: {
+                "value": field.value,
+                "confidence": field.confidence,
+                "extraction_method": field.extraction_method,
+                "position": field.position,
+                "pattern": field.pattern
+            }
+            for name, field in result.fields.items()
+        },
+        "processing_date": result.processing_date.isoformat() if isinstance(result.processing_date, datetime) else result.processing_date,
+        "needs_next_level": result.needs_next_level,
+        "improved_fields": result.improved_fields or [],
+        "corrections": result.corrections or [],
+        "rule_created": result.rule_created,
+        "truncated": result.truncated,
+        "logs": result.logs
+    }
+
+
+def rejected(e: AdmissionRejected) -> HTTPException:
+    """HTTP error for a request refused by admission control"""
+    return HTTPException(status_code=e.status_code, detail=e.detail, headers={"Retry-After": str(e.retry_after)})
+
+
+def admission_slot(data: bytes, filename: str):
+    """Admission context for one document (no-op when disabled)"""
+    if admission is None:
+        return contextlib.nullcontext()
+    return admission.admit(admission.estimate_cost(data, filename))
+
+
+def batch_admission_slot(documents: List[Tuple[str, bytes]]):
+    """
+    One admission context for a whole batch (no-op when disabled)
+    
+    Cost = sum of the documents' costs, capped at max_cost by the
+    controller: the batch waits once in the FIFO instead of queueing each
+    of its documents against the others.
+    """
+    if admission is None:
+        return contextlib.nullcontext()
+    return admission.admit(sum(admission.estimate_cost(data, filename) for filename, data in documents))
+
+
+def expand_uploads(uploads: List[Tuple[str, bytes]]) -> List[Tuple[str, bytes]]:
+    """
+    Expand zip archives into their documents
+    
+    Raises:
+        HTTPException 413: too many documents or archive too large once expanded
+    """
+    documents = []
+    unzipped_bytes = 0
+    
+    for filename, data in uploads:
+        if not (filename.lower().endswith('.zip') and zipfile.is_zipfile(io.BytesIO(data))):
+            documents.append((filename, data))
+            continue
+        
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            for info in archive.infolist():
+                name = os.path.basename(info.filename)
+                if info.is_dir() or not name or name.startswith('.') or info.filename.startswith('__MACOSX/'):
+                    continue
+                
+                unzipped_bytes += info.file_size
+                if unzipped_bytes > BATCH_MAX_UNZIPPED_BYTES:
+                    raise HTTPException(status_code=413, detail="Archive too large once expanded")
+                
+                documents.append((name, archive.read(info)))
+    
+    if len(documents) > BATCH_MAX_FILES:
+        raise HTTPException(status_code=413, detail=f"Too many documents in batch (max {BATCH_MAX_FILES})")
+    
+    return documents
+
+
+async def _process_admitted(filename: str, data: bytes, params: Dict[str, Any]) -> OCRResult:
+    """Run one queued document under admission control and the OCR limiter"""
+    async with admission_slot(data, filename):
+        return await run_ocr(
+            ocr_engine.process_bytes,
+            data=data,
+            filename=filename,
+            source_entreprise=params.get("source_entreprise", "auto-detect"),
+            options=params.get("options") or {}
+        )
+
+
+def _run_job(filename: str, data: bytes, params: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Job queue handler: run the OCR pipeline on a queued document
+    
+    Called from a job worker thread. The document goes through the same
+    admission budget and executor as /ocr, so queued jobs count against
+    max_concurrency and admission.max_cost. A job refused by admission
+    waits Retry-After and asks again (no attempt used) until half its
+    lease has elapsed, then fails and is retried by the queue.
+    """
+    give_up_at = time.monotonic() + job_queue.lease_seconds / 2
+    while True:
+        future = asyncio.run_coroutine_threadsafe(_process_admitted(filename, data, params), event_loop)
+        try:
+            return result_to_dict(future.result())
+        except AdmissionRejected as e:
+            if time.monotonic() + e.retry_after > give_up_at:
+                raise
+            logger.info(f"Job {filename} deferred by admission control ({e.detail}), retry in {e.retry_after}s")
+            time.sleep(e.retry_after)
+
+
 @app.get("/")
 async def root():
     """Root endpoint"""
@@ -87,7 +311,9 @@ async def root():
             "PDF text extraction",
             "PDF image OCR (Tesseract)",
             "Document type detection",
-            "Multi-company support"
+            "Multi-company support",
+            "Batch OCR (/ocr/batch, NDJSON stream)",
+            "Asynchronous jobs (/jobs)"
         ]
     }
 
@@ -101,7 +327,8 @@ async def health_check():
     return {
         "status": "healthy",
         "timestamp": datetime.now().isoformat(),
-        "ocr_engine": "initialized"
+        "ocr_engine": "initialized",
+        "admission": admission.stats() if admission is not None else None
     }
 
 
@@ -109,7 +336,8 @@ async def health_check():
 async def process_ocr(
     file: UploadFile = File(...),
     source_entreprise: str = Form(default="auto-detect"),
-    force_full_ocr: bool = Form(default=False)
+    force_full_ocr: bool = Form(default=False),
+    deadline_seconds: Optional[float] = Form(default=None)
 ):
     """
     Process a document with OCR
@@ -118,6 +346,8 @@ async def process_ocr(
         file: Document file (PDF, image)
         source_entreprise: Source company name or "auto-detect"
         force_full_ocr: Force full OCR even if rules exist
+        deadline_seconds: Overall time budget; past it a partial result
+            flagged `truncated` is returned
     
     Returns:
         OCR result with extracted fields and document type
@@ -128,74 +358,183 @@ async def process_ocr(
     # Log request
     logger.info(f"OCR request received: file={file.filename}, source={source_entreprise}")
     
-    # Save uploaded file temporarily
-    temp_dir = Path("/tmp/ocr_uploads")
-    temp_dir.mkdir(exist_ok=True)
-    
-    temp_file_path = temp_dir / f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{file.filename}"
+    # Fast refusal before reading the body when the wait queue is full
+    if admission is not None:
+        try:
+            admission.check_capacity()
+        except AdmissionRejected as e:
+            raise rejected(e)
     
     try:
-        # Save file
+        # Read upload into memory (no /tmp round-trip)
         contents = await file.read()
-        with open(temp_file_path, "wb") as f:
-            f.write(contents)
-        
-        logger.info(f"File saved to: {temp_file_path}")
+        logger.info(f"File received in memory: {len(contents)} bytes")
         
         # Process with OCR engine
         options = {
             "force_full_ocr": force_full_ocr
         }
+        if deadline_seconds:
+            options["deadline_seconds"] = deadline_seconds
         
-        result: OCRResult = ocr_engine.process_document(
-            file_path=str(temp_file_path),
-            source_entreprise=source_entreprise,
-            options=options
-        )
+        filename = file.filename or "upload"
+        async with admission_slot(contents, filename):
+            result: OCRResult = await run_ocr(
+                ocr_engine.process_bytes,
+                data=contents,
+                filename=filename,
+                source_entreprise=source_entreprise,
+                options=options
+            )
         
-        # Convert result to dict
-        # [MIRROR MODE] Ajouter texte OCR brut complet
-        response = {
-            "document_id": result.document_id,
-            "document_type": result.document_type,
-            "level": result.level,
-            "confidence": result.confidence,
-            "entreprise_source": result.entreprise_source,
-            
-            # [NEW] TEXTE OCR BRUT COMPLET
-            "ocr_text_raw": getattr(result, 'ocr_text_raw', ''),
-            
-            "fields": {
-                name: {
-                    "value": field.value,
-                    "confidence": field.confidence,
-                    "extraction_method": field.extraction_method,
-                    "position": field.position,
-                    "pattern": field.pattern
-                }
-                for name, field in result.fields.items()
-            },
-            "processing_date": result.processing_date.isoformat() if isinstance(result.processing_date, datetime) else result.processing_date,
-            "needs_next_level": result.needs_next_level,
-            "improved_fields": result.improved_fields or [],
-            "corrections": result.corrections or [],
-            "rule_created": result.rule_created,
-            "logs": result.logs
-        }
+        response = result_to_dict(result)
         
         logger.info(f"OCR completed: type={result.document_type}, level={result.level}, confidence={result.confidence:.2f}%")
         
         return JSONResponse(content=response)
     
+    except AdmissionRejected as e:
+        logger.warning(f"OCR request rejected ({e.status_code}): {e.detail}")
+        raise rejected(e)
+    
     except Exception as e:
         logger.error(f"OCR processing failed: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"OCR processing failed: {str(e)}")
+
+
+@app.post("/ocr/batch")
+async def process_ocr_batch(
+    files: List[UploadFile] = File(...),
+    source_entreprise: str = Form(default="auto-detect"),
+    force_full_ocr: bool = Form(default=False),
+    deadline_seconds: Optional[float] = Form(default=None)
+):
+    """
+    Process several documents (or zip archives) in one request
+    
+    Documents run concurrently through the OCR executor, under a single
+    admission for the batch. One JSON line is streamed back per document as
+    soon as it finishes (NDJSON), in completion order; `index` refers to the
+    position in the expanded batch.
+    """
+    if ocr_engine is None:
+        raise HTTPException(status_code=503, detail="OCR Engine not initialized")
+    
+    if admission is not None:
+        try:
+            admission.check_capacity()
+        except AdmissionRejected as e:
+            raise rejected(e)
+    
+    # Uploads are read before streaming starts (files are closed afterwards)
+    uploads = [(file.filename or f"upload_{i}", await file.read()) for i, file in enumerate(files)]
+    documents = expand_uploads(uploads)
+    
+    logger.info(f"OCR batch received: {len(documents)} documents, source={source_entreprise}")
+    
+    options = {
+        "force_full_ocr": force_full_ocr
+    }
+    if deadline_seconds:
+        options["deadline_seconds"] = deadline_seconds
+    
+    async def process_one(index: int, filename: str, data: bytes) -> Dict[str, Any]:
+        try:
+            result: OCRResult = await run_ocr(
+                ocr_engine.process_bytes,
+                data=data,
+                filename=filename,
+                source_entreprise=source_entreprise,
+                options=dict(options)
+            )
+            return {"index": index, "filename": filename, "status": "ok", **result_to_dict(result)}
+        except Exception as e:
+            logger.error(f"OCR batch item failed: {filename}: {e}", exc_info=True)
+            return {"index": index, "filename": filename, "status": "error", "error": str(e)}
+    
+    async def stream_results():
+        try:
+            # Items share the batch admission; the OCR semaphore bounds them
+            async with batch_admission_slot(documents):
+                tasks = [
+                    asyncio.create_task(process_one(index, filename, data))
+                    for index, (filename, data) in enumerate(documents)
+                ]
+                try:
+                    for next_done in asyncio.as_completed(tasks):
+                        item = await next_done
+                        yield json.dumps(item, ensure_ascii=False, default=str) + "\n"
+                finally:
+                    # Client disconnected: documents not yet started are dropped
+                    for task in tasks:
+                        task.cancel()
+        except AdmissionRejected as e:
+            # Raised before the first line: the whole batch is refused
+            for index, (filename, _) in enumerate(documents):
+                item = {"index": index, "filename": filename, "status": "rejected",
+                        "error": e.detail, "retry_after": e.retry_after}
+                yield json.dumps(item, ensure_ascii=False) + "\n"
+            return
+        logger.info(f"OCR batch completed: {len(documents)} documents")
+    
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+
+@app.post("/jobs", status_code=202)
+async def submit_job(
+    file: UploadFile = File(...),
+    source_entreprise: str = Form(default="auto-detect"),
+    force_full_ocr: bool = Form(default=False),
+    deadline_seconds: Optional[float] = Form(default=None)
+):
+    """
+    Queue a document for asynchronous OCR
+    
+    Returns immediately with a job id; poll GET /jobs/{job_id} for the result.
+    """
+    if ocr_engine is None or job_queue is None:
+        raise HTTPException(status_code=503, detail="Job queue not available")
+    
+    contents = await file.read()
+    params = {
+        "source_entreprise": source_entreprise,
+        "options": {"force_full_ocr": force_full_ocr}
+    }
+    if deadline_seconds:
+        params["options"]["deadline_seconds"] = deadline_seconds
+    
+    try:
+        job_id = job_queue.submit(file.filename or "upload", contents, params)
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "30"})
+    
+    return {
+        "job_id": job_id,
+        "status": "queued",
+        "status_url": f"/jobs/{job_id}"
+    }
+
+
+@app.get("/jobs/metrics")
+async def job_metrics():
+    """Queue depth and job counters"""
+    if job_queue is None:
+        raise HTTPException(status_code=503, detail="Job queue not available")
+    
+    return job_queue.metrics()
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Job status, with the OCR result once done"""
+    if job_queue is None:
+        raise HTTPException(status_code=503, detail="Job queue not available")
+    
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
     
-    finally:
-        # Cleanup temp file
-        if temp_file_path.exists():
-            temp_file_path.unlink()
-            logger.info(f"Temp file removed: {temp_file_path}")
+    return job.to_dict()
 
 
 @app.get("/config")
@@ -1,5 +1,15 @@
 """Memory system - Rule storage and retrieval"""
 
 from .ai_memory import AIMemory, Rule
+from .lifecycle import RetentionPolicy
+from .store import JSONRuleStore, RuleStore, SQLiteRuleStore, create_store
 
-__all__ = ['AIMemory', 'Rule']
+__all__ = [
+    'AIMemory',
+    'Rule',
+    'RetentionPolicy',
+    'RuleStore',
+    'SQLiteRuleStore',
+    'JSONRuleStore',
+    'create_store'
+]
@@ -5,13 +5,25 @@ Stocke les règles créées par OCR Level 3 pour réutilisation
 Objectif : Éliminer l'apprentissage répétitif
 """
 
+import atexit
 import json
 import logging
 import os
-from typing import Optional, List, Dict
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from typing import Optional, List, Dict, Tuple
 from datetime import datetime
 from pathlib import Path
 
+from utils.signature import document_signature
+from utils.text_view import as_text_view
+from .extractors import CompiledRule
+from .lifecycle import RetentionPolicy, near_duplicates, retention_score, success_rate
+from .rule_index import MATCH_THRESHOLD, RuleIndex
+from .store import create_store
+
 logger = logging.getLogger("OCREngine.Memory")
 
 
@@ -34,6 +46,11 @@ class Rule:
         self.conditions = rule_dict['conditions']
         self.actions = rule_dict['actions']
         self.metadata = rule_dict['metadata']
+        self.compile()
+    
+    def compile(self):
+        """Compile les actions en extracteurs (chargement, fusion d'actions)"""
+        self.compiled = CompiledRule(self.actions)
     
     def matches(self, document, context) -> float:
         """
@@ -42,8 +59,10 @@ class Rule:
         Returns:
             Score de correspondance (0.0 à 1.0)
         """
-        text = document.get_text()
-        text_lower = text.lower()
+        # Vue partagée : minuscules, en-tête et pied calculés une fois pour toutes les règles
+        view = as_text_view(document)
+        text = view.text
+        text_lower = view.lower
         
         score = 0.0
         max_score = 0.0
@@ -54,17 +73,16 @@ class Rule:
             # Le type sera vérifié par OCR1, on assume match pour l'instant
             score += 20
         
-        # Vérification signature
+        # Vérification signature (digest stable de l'en-tête / pied normalisés)
         if 'signature' in self.conditions:
             max_score += 30
-            # Signature difficile à recalculer, on skip pour simplifier
-            # Dans une vraie implem, recalculer et comparer
+            if str(self.conditions['signature']) == document_signature(view):
+                score += 30
         
         # Vérification header
         if 'header_contains' in self.conditions:
             max_score += 20
-            header_lines = text.split('\n')[:10]
-            header_text = ' '.join(header_lines).lower()
+            header_text = view.header_lower
             
             matches = sum(1 for pattern in self.conditions['header_contains'] 
                          if pattern.lower() in header_text)
@@ -74,8 +92,7 @@ class Rule:
         # Vérification footer
         if 'footer_contains' in self.conditions:
             max_score += 20
-            footer_lines = text.split('\n')[-10:]
-            footer_text = ' '.join(footer_lines).lower()
+            footer_text = view.footer_lower
             
             matches = sum(1 for pattern in self.conditions['footer_contains'] 
                          if pattern.lower() in footer_text)
@@ -103,55 +120,43 @@ class Rule:
         else:
             return 0.0
     
-    def apply(self, document) -> Dict:
+    def extract(self, document) -> Tuple[Dict, List[str]]:
         """
-        Applique la règle sur le document
+        Ré-extrait les champs de la règle sur le document
+        
+        Un passage ciblé par champ (libellé, regex ou fenêtre de lignes) :
+        les valeurs viennent du nouveau document, pas du document source.
         
         Returns:
-            Dict de FieldValue extraits selon les actions de la règle
+            (Dict de FieldValue, champs introuvables dans ce document)
         """
         from ocr_engine import FieldValue
         
-        fields = {}
-        text = document.get_text()
-        
-        for field_name, action in self.actions.items():
-            # Réappliquer la méthode d'extraction
-            method = action.get('method')
-            
-            if method == 'fixed_value':
-                # Valeur fixe (pour champs constants dans ce type de doc)
-                fields[field_name] = FieldValue(
-                    value=action['value'],
-                    confidence=action.get('confidence', 0.95),
-                    extraction_method='memory_rule',
-                    pattern=self.id
-                )
-            
-            elif method in ['regex', 'context_keyword']:
-                # Ré-extraction avec le pattern enregistré
-                pattern = action.get('pattern')
-                # Simplification : réutiliser la valeur mémorisée
-                # Dans une vraie implem, ré-exécuter le pattern
-                fields[field_name] = FieldValue(
-                    value=action['value'],
-                    confidence=action.get('confidence', 0.90),
-                    extraction_method='memory_rule',
-                    pattern=self.id
-                )
-            
-            else:
-                # Méthode inconnue, utiliser valeur par défaut
-                fields[field_name] = FieldValue(
-                    value=action['value'],
-                    confidence=action.get('confidence', 0.85),
-                    extraction_method='memory_rule_fallback',
-                    pattern=self.id
-                )
+        view = as_text_view(document)
+        values, missing = self.compiled.extract(view)
+        
+        fields = {
+            field_name: FieldValue(
+                value=value,
+                confidence=self.actions[field_name].get('confidence', 0.90),
+                extraction_method='memory_rule',
+                pattern=self.id
+            )
+            for field_name, value in values.items()
+        }
         
-        logger.info(f"Rule {self.id} applied: {len(fields)} fields extracted")
+        logger.info(f"Rule {self.id} applied: {len(fields)} fields extracted, {len(missing)} missing")
         
-        return fields
+        return fields, missing
+    
+    def apply(self, document) -> Dict:
+        """
+        Applique la règle sur le document
+        
+        Returns:
+            Dict de FieldValue extraits selon les actions de la règle
+        """
+        return self.extract(document)[0]
     
     def to_dict(self) -> dict:
         """Convertit la règle en dictionnaire"""
@@ -164,6 +169,24 @@ class Rule:
         }
 
 
+def _flush_from_timer(memory_ref):
+    memory = memory_ref()
+    if memory is not None:
+        memory.flush()
+
+
+def _compact_from_timer(memory_ref):
+    memory = memory_ref()
+    if memory is not None:
+        memory.compact()
+
+
+def _flush_at_exit(memory_ref):
+    memory = memory_ref()
+    if memory is not None and memory.pending_usage:
+        memory.flush()
+
+
 class AIMemory:
     """
     Système de mémoire pour les règles OCR
@@ -171,105 +194,326 @@ class AIMemory:
     Stocke et recherche les règles créées par Level 3
     """
     
-    def __init__(self, storage_path: str = "memory/rules.json"):
+    def __init__(self, storage_path: str = "memory/rules.db",
+                 flush_interval: float = 5.0, flush_max_pending: int = 50,
+                 retention: Optional[RetentionPolicy] = None):
         """
         Initialise le système de mémoire
         
         Args:
-            storage_path: Chemin vers le fichier de stockage des règles
+            storage_path: Base SQLite des règles (`.json` : fichier JSON)
+            flush_interval: Délai max (s) avant écriture des compteurs d'usage
+            flush_max_pending: Nombre d'usages en attente déclenchant l'écriture
+            retention: Capacités et compaction (défaut : RetentionPolicy())
         """
         self.storage_path = storage_path
+        self.flush_interval = flush_interval
+        self.flush_max_pending = max(1, int(flush_max_pending))
         self.rules: List[Rule] = []
+        # Index entreprise / SIRET / signature / mots (recherche sans parcours linéaire)
+        self._index = RuleIndex()
+        # Accès concurrents (plusieurs documents traités en parallèle)
+        self._lock = threading.RLock()
+        
+        # Publication inter-processus (mode prefork) : compteur de génération
+        # partagé, incrémenté à chaque modification des règles
+        self._generation = None
+        self._local_generation = 0
+        
+        # Écriture différée des compteurs : {rule_id: [usages, last_used, échecs]}
+        # non encore écrits dans le stockage
+        self._pending_usage: Dict[str, list] = {}
+        self._pending_count = 0
+        self._flush_timer = None
+        self._flush_timer_pid = None
+        
+        # Cycle de vie : capacités, éviction, fusion des quasi-doublons
+        self.retention = retention or RetentionPolicy()
+        self._evicted = 0
+        self._merged = 0
+        self._last_compaction = None
+        self._compact_timer = None
+        self._compact_timer_pid = None
         
         # Créer le répertoire si nécessaire
         os.makedirs(os.path.dirname(storage_path), exist_ok=True)
+        self._store = create_store(storage_path)
         
         # Charger les règles existantes
-        self._load_rules()
+        self._load_rules(initial=True)
+        
+        # Compteurs en attente écrits à l'arrêt de l'interpréteur
+        atexit.register(_flush_at_exit, weakref.ref(self))
         
         logger.info(f"AI Memory initialized with {len(self.rules)} rules")
     
-    def _load_rules(self):
-        """Charge les règles depuis le fichier JSON"""
-        if not os.path.exists(self.storage_path):
-            logger.info(f"No existing rules file at {self.storage_path}")
-            self.rules = []
-            return
+    def _load_rules(self, initial: bool = False) -> bool:
+        """
+        Charge les règles depuis le stockage
+        
+        Un rechargement en échec (ex: base verrouillée par l'écriture d'un
+        autre worker) conserve les règles déjà chargées : seul le
+        chargement initial retombe sur une mémoire vide.
         
+        Returns:
+            True si les règles ont été (re)chargées
+        """
         try:
-            with open(self.storage_path, 'r', encoding='utf-8') as f:
-                rules_data = json.load(f)
-            
-            self.rules = [Rule(rule_dict) for rule_dict in rules_data]
-            logger.info(f"Loaded {len(self.rules)} rules from storage")
-            
+            rules = [Rule(rule_dict) for rule_dict in self._store.load()]
         except Exception as e:
-            logger.error(f"Failed to load rules: {e}")
-            self.rules = []
+            if initial:
+                logger.error(f"Failed to load rules: {e}")
+                self._set_rules([])
+            else:
+                logger.error(f"Failed to reload rules, keeping {len(self.rules)} loaded rules: {e}")
+            return False
+        
+        self._set_rules(rules)
+        self._reapply_pending_usage()
+        for rule in self.rules:
+            rule.metadata['success_rate'] = success_rate(rule.metadata)
+        logger.info(f"Loaded {len(self.rules)} rules from storage")
+        return True
+    
+    def _set_rules(self, rules: List[Rule]):
+        """Remplace les règles chargées et reconstruit l'index"""
+        self.rules = rules
+        self._index.rebuild(rules)
     
-    def _save_rules(self):
-        """Sauvegarde les règles dans le fichier JSON"""
+    def _store_write(self, operation, *args) -> bool:
+        """Écriture dans le stockage (erreur journalisée, règles en mémoire conservées)"""
         try:
-            rules_data = [rule.to_dict() for rule in self.rules]
-            
-            with open(self.storage_path, 'w', encoding='utf-8') as f:
-                json.dump(rules_data, f, indent=2, ensure_ascii=False)
-            
-            logger.info(f"Saved {len(self.rules)} rules to storage")
-            
+            operation(*args)
+            return True
         except Exception as e:
             logger.error(f"Failed to save rules: {e}")
+            return False
     
-    def find_matching_rule(self, document, context) -> Optional[Rule]:
+    def _reapply_pending_usage(self):
+        """Réapplique aux règles rechargées les usages pas encore écrits"""
+        for rule_id, (count, last_used, failures) in self._pending_usage.items():
+            rule = self._rule_by_id(rule_id)
+            if rule is not None:
+                rule.metadata['usage_count'] = rule.metadata.get('usage_count', 0) + count
+                rule.metadata['failure_count'] = rule.metadata.get('failure_count', 0) + failures
+                if last_used is not None:
+                    rule.metadata['last_used'] = last_used
+    
+    def record_result(self, rule: Rule, ok: bool):
         """
-        Recherche une règle applicable au document
+        Compte l'application d'une règle trouvée par find_matching_rule
+        (écriture différée)
+        
+        Réussie : usage (usage_count, last_used). Échouée (champ introuvable,
+        retour à l'OCR progressif) : échec, qui fait baisser success_rate.
+        Les compteurs sont écrits après `flush_max_pending` résultats, sinon
+        au plus tard `flush_interval` secondes après le premier en attente,
+        ou à l'arrêt (close / atexit).
         
         Args:
-            document: Document à traiter
-            context: ProcessingContext
+            rule: Règle appliquée
+            ok: True si la règle a produit le résultat
+        """
+        with self._lock:
+            # Règle rechargée entre-temps : compter sur l'instance courante
+            rule = self._rule_by_id(rule.id)
+            if rule is None:
+                return
+            
+            pending = self._pending_usage.setdefault(rule.id, [0, None, 0])
+            if ok:
+                last_used = datetime.now().isoformat()
+                rule.metadata['usage_count'] = rule.metadata.get('usage_count', 0) + 1
+                rule.metadata['last_used'] = last_used
+                pending[0] += 1
+                pending[1] = last_used
+            else:
+                rule.metadata['failure_count'] = rule.metadata.get('failure_count', 0) + 1
+                pending[2] += 1
+            rule.metadata['success_rate'] = success_rate(rule.metadata)
+            self._pending_count += 1
+            
+            if self._pending_count >= self.flush_max_pending:
+                self.flush()
+            else:
+                self._schedule_flush()
+    
+    def _schedule_flush(self):
+        """Arme le timer d'écriture (créé à la demande : après le fork en mode prefork)"""
+        if self._flush_timer is not None and self._flush_timer_pid == os.getpid():
+            return
+        timer = threading.Timer(self.flush_interval, _flush_from_timer, args=(weakref.ref(self),))
+        timer.daemon = True
+        self._flush_timer = timer
+        self._flush_timer_pid = os.getpid()
+        timer.start()
+    
+    def _cancel_flush_timer(self):
+        timer = self._flush_timer
+        self._flush_timer = None
+        if timer is not None and self._flush_timer_pid == os.getpid() and timer is not threading.current_thread():
+            timer.cancel()
+    
+    def flush(self) -> bool:
+        """
+        Écrit les compteurs d'usage en attente
         
         Returns:
-            Rule si trouvée, None sinon
+            True si rien n'était en attente ou si l'écriture a réussi
         """
-        if not self.rules:
-            logger.debug("No rules in memory")
-            return None
-        
-        # Filtrer par entreprise
-        entreprise_rules = [
-            rule for rule in self.rules 
-            if rule.metadata.get('entreprise') == context.source_entreprise
-        ]
-        
-        if not entreprise_rules:
-            logger.debug(f"No rules for entreprise: {context.source_entreprise}")
-            return None
+        with self._lock:
+            self._cancel_flush_timer()
+            if not self._pending_usage:
+                return True
+            # Sans publication : les autres workers n'ont pas à recharger pour
+            # des compteurs (repris à leur prochain rechargement structurel)
+            with self._shared_write(publish=False):
+                saved = self._write_pending_usage()
+            if not saved:
+                self._schedule_flush()
+            return saved
+    
+    def _write_pending_usage(self) -> bool:
+        """Écrit les compteurs en attente (section d'écriture déjà ouverte)"""
+        if not self._pending_usage:
+            return True
+        usage = {rule_id: tuple(pending) for rule_id, pending in self._pending_usage.items()}
+        saved = self._store_write(self._store.add_usage, usage)
+        if saved:
+            self._pending_usage.clear()
+            self._pending_count = 0
+            logger.info(f"Usage counters saved for {len(usage)} rules")
+        return saved
+    
+    def close(self):
+        """Écrit les compteurs en attente (arrêt du service)"""
+        with self._lock:
+            self._cancel_compact_timer()
+        self.flush()
+        self._store.close()
+    
+    def before_fork(self):
+        """
+        Ferme la connexion au stockage avant un fork (mode prefork)
         
-        # Calculer score de correspondance pour chaque règle
-        candidates = []
-        for rule in entreprise_rules:
-            score = rule.matches(document, context)
-            if score > 0.7:  # Seuil de correspondance
-                candidates.append((rule, score))
-                logger.debug(f"Rule {rule.id} matches with score: {score:.2f}")
+        Une connexion SQLite ne doit pas traverser un fork : chaque worker
+        ouvre la sienne à son premier accès.
+        """
+        with self._lock:
+            self._store.close()
+    
+    @property
+    def pending_usage(self) -> int:
+        """Nombre d'usages pas encore écrits"""
+        return self._pending_count
+    
+    def attach_generation(self, counter):
+        """
+        Partage les règles entre processus workers (mode prefork)
         
-        if not candidates:
-            logger.debug("No matching rule found")
-            return None
+        Args:
+            counter: multiprocessing.Value créé avant le fork. Son verrou
+                sérialise les écritures des règles ; sa valeur
+                signale aux autres workers qu'ils doivent recharger.
+        """
+        with self._lock:
+            self._generation = counter
+            self._local_generation = counter.value
+    
+    def _refresh_if_stale(self):
+        """Recharge les règles si un autre worker (ou instance) les a modifiées"""
+        if self._generation is not None:
+            current = self._generation.value
+            if current != self._local_generation:
+                # Échec : génération locale inchangée, nouvel essai au prochain accès
+                if self._load_rules():
+                    self._local_generation = current
+                    logger.info(f"Rules reloaded (generation {current})")
+                return
+        
+        # Écritures hors prefork (autre instance sur le même volume)
+        if self._store.changed() and self._load_rules():
+            logger.info("Rules reloaded (storage changed)")
+    
+    @contextmanager
+    def _shared_write(self, publish: bool = True):
+        """
+        Section d'écriture des règles
         
-        # Sélectionner la meilleure règle
-        best_rule, best_score = max(candidates, key=lambda x: x[1])
+        En mode prefork : verrou inter-processus, rechargement si les règles
+        locales sont périmées (usages en attente réappliqués), puis
+        publication d'une nouvelle génération.
         
-        logger.info(f"Selected rule: {best_rule.id} (score: {best_score:.2f})")
+        Args:
+            publish: False pour les compteurs d'usage seuls : écriture
+                sérialisée mais sans publication, les autres workers ne
+                rechargent que pour un changement de l'ensemble des règles
+                (création, fusion, suppression, compaction, import)
+        """
+        if self._generation is None:
+            self._refresh_if_stale()
+            yield
+            return
         
-        # Incrémenter compteur usage
-        best_rule.metadata['usage_count'] = best_rule.metadata.get('usage_count', 0) + 1
-        best_rule.metadata['last_used'] = datetime.now().isoformat()
+        with self._generation.get_lock():
+            self._refresh_if_stale()
+            yield
+            if publish:
+                self._generation.value += 1
+                self._local_generation = self._generation.value
+    
+    def _rule_by_id(self, rule_id: str) -> Optional[Rule]:
+        """Retourne la règle chargée portant cet ID"""
+        return self._index.get(rule_id)
+    
+    def find_matching_rule(self, document, context) -> Optional[Rule]:
+        """
+        Recherche une règle applicable au document
         
-        # Sauvegarder les métadonnées mises à jour
-        self._save_rules()
+        Args:
+            document: Document à traiter
+            context: ProcessingContext
         
-        return best_rule
+        Returns:
+            Rule si trouvée, None sinon
+        """
+        with self._lock:
+            self._refresh_if_stale()
+            
+            if not self.rules:
+                logger.debug("No rules in memory")
+                return None
+            
+            # Filtrer par entreprise
+            if not self._index.has_entreprise(context.source_entreprise):
+                logger.debug(f"No rules for entreprise: {context.source_entreprise}")
+                return None
+            
+            # Règles plausibles seulement (SIRET, signature, mots d'en-tête/pied)
+            started = time.perf_counter()
+            view = as_text_view(document)
+            plausible = self._index.candidates(view, context.source_entreprise, document_signature(view))
+            
+            # Calculer score de correspondance pour chaque règle
+            candidates = []
+            for rule in plausible:
+                score = rule.matches(document, context)
+                if score > MATCH_THRESHOLD:  # Seuil de correspondance
+                    candidates.append((rule, score))
+                    logger.debug(f"Rule {rule.id} matches with score: {score:.2f}")
+            self._index.record(len(plausible), time.perf_counter() - started)
+            
+            if not candidates:
+                logger.debug("No matching rule found")
+                return None
+            
+            # Sélectionner la meilleure règle
+            best_rule, best_score = max(candidates, key=lambda x: x[1])
+            
+            logger.info(f"Selected rule: {best_rule.id} (score: {best_score:.2f})")
+            
+            # Usage compté par record_result, une fois la règle appliquée
+            return best_rule
     
     def save_rule(self, rule_dict: dict) -> str:
         """
@@ -281,23 +525,29 @@ class AIMemory:
         Returns:
             ID de la règle créée
         """
-        # Vérifier si règle similaire existe déjà
-        existing = self._find_similar_rule(rule_dict)
-        
-        if existing:
-            logger.info(f"Similar rule exists: {existing.id}, merging...")
-            return self._merge_with_existing(existing, rule_dict)
-        
-        # Créer nouvelle règle
-        rule = Rule(rule_dict)
-        self.rules.append(rule)
-        
-        # Sauvegarder
-        self._save_rules()
-        
-        logger.info(f"New rule saved: {rule.id} - {rule.name}")
-        
-        return rule.id
+        with self._lock, self._shared_write():
+            # Vérifier si règle similaire existe déjà
+            existing = self._find_similar_rule(rule_dict)
+            
+            if existing:
+                logger.info(f"Similar rule exists: {existing.id}, merging...")
+                return self._merge_with_existing(existing, rule_dict)
+            
+            # Créer nouvelle règle
+            rule = Rule(rule_dict)
+            self.rules.append(rule)
+            self._index.add(rule)
+            
+            # Sauvegarder (une ligne)
+            self._store_write(self._store.upsert, [rule.to_dict()])
+            
+            logger.info(f"New rule saved: {rule.id} - {rule.name}")
+            
+            # Capacités : la nouvelle règle n'est pas candidate à l'éviction
+            self._enforce_capacity(protect=rule.id)
+            self._schedule_compaction()
+            
+            return rule.id
     
     def _find_similar_rule(self, rule_dict: dict) -> Optional[Rule]:
         """Recherche une règle similaire existante"""
@@ -317,8 +567,23 @@ class AIMemory:
     
     def _merge_with_existing(self, existing_rule: Rule, new_rule_dict: dict) -> str:
         """Fusionne une nouvelle règle avec une existante"""
+        self._merge_actions(existing_rule, new_rule_dict['actions'])
+        
+        # Incrémenter usage count
+        existing_rule.metadata['usage_count'] = existing_rule.metadata.get('usage_count', 0) + 1
+        
+        # Sauvegarder : définition de la règle, puis incrément du compteur
+        if self._store_write(self._store.upsert, [existing_rule.to_dict()]):
+            self._store_write(self._store.add_usage, {existing_rule.id: (1, None, 0)})
+        
+        logger.info(f"Merged with existing rule: {existing_rule.id}")
+        
+        return existing_rule.id
+    
+    def _merge_actions(self, existing_rule: Rule, actions: Dict[str, dict]):
+        """Ajoute les actions manquantes, garde la plus confiante des deux sinon"""
         # Mettre à jour les actions avec les nouvelles si meilleures
-        for field_name, action in new_rule_dict['actions'].items():
+        for field_name, action in actions.items():
             if field_name not in existing_rule.actions:
                 existing_rule.actions[field_name] = action
                 logger.debug(f"Added new field to rule: {field_name}")
@@ -330,16 +595,157 @@ class AIMemory:
                 if new_conf > existing_conf:
                     existing_rule.actions[field_name] = action
                     logger.debug(f"Updated field in rule: {field_name}")
+        existing_rule.compile()
+    
+    def _drop_rules(self, rule_ids: List[str]):
+        """Retire des règles (mémoire, index, stockage)"""
+        dropped = set(rule_ids)
+        if not dropped:
+            return
+        self.rules = [rule for rule in self.rules if rule.id not in dropped]
+        for rule_id in dropped:
+            self._index.remove(rule_id)
+            pending = self._pending_usage.pop(rule_id, None)
+            if pending:
+                self._pending_count -= pending[0] + pending[2]
+        self._store_write(self._store.delete_many, sorted(dropped))
+    
+    def _enforce_capacity(self, protect: Optional[str] = None) -> int:
+        """
+        Évince les règles de plus faible valeur au-delà des capacités
+        (par entreprise, puis globale)
         
-        # Incrémenter usage count
-        existing_rule.metadata['usage_count'] = existing_rule.metadata.get('usage_count', 0) + 1
+        Returns:
+            Nombre de règles évincées
+        """
+        max_per_entreprise = self.retention.max_rules_per_entreprise
+        max_rules = self.retention.max_rules
+        if max_per_entreprise is None and max_rules is None:
+            return 0
         
-        # Sauvegarder
-        self._save_rules()
+        now = datetime.now()
+        # Ordre d'éviction : valeur croissante, puis la plus ancienne
+        order = {rule.id: position for position, rule in enumerate(self.rules)}
+        ranked = sorted(
+            (rule for rule in self.rules if rule.id != protect),
+            key=lambda r: (retention_score(r, now, self.retention.half_life_days), order[r.id])
+        )
         
-        logger.info(f"Merged with existing rule: {existing_rule.id}")
+        victims = []
+        if max_per_entreprise is not None:
+            counts: Dict[Optional[str], int] = {}
+            for rule in self.rules:
+                entreprise = rule.metadata.get('entreprise')
+                counts[entreprise] = counts.get(entreprise, 0) + 1
+            for rule in ranked:
+                entreprise = rule.metadata.get('entreprise')
+                if counts[entreprise] > max_per_entreprise:
+                    victims.append(rule.id)
+                    counts[entreprise] -= 1
+        
+        if max_rules is not None:
+            excess = len(self.rules) - len(victims) - max_rules
+            chosen = set(victims)
+            for rule in ranked:
+                if excess <= 0:
+                    break
+                if rule.id not in chosen:
+                    victims.append(rule.id)
+                    excess -= 1
+        
+        if victims:
+            self._drop_rules(victims)
+            self._evicted += len(victims)
+            logger.info(f"Evicted {len(victims)} rules over capacity")
+        return len(victims)
+    
+    def _absorb(self, kept: Rule, absorbed: Rule):
+        """Fusionne une règle quasi identique dans `kept` (actions, usages, succès)"""
+        self._merge_actions(kept, absorbed.actions)
+        
+        kept_usage = kept.metadata.get('usage_count', 0) or 0
+        absorbed_usage = absorbed.metadata.get('usage_count', 0) or 0
+        total = kept_usage + absorbed_usage
+        if total:
+            kept.metadata['success_rate'] = round(
+                (success_rate(kept.metadata) * kept_usage
+                 + success_rate(absorbed.metadata) * absorbed_usage) / total, 4
+            )
+        kept.metadata['usage_count'] = total
+        failures = (kept.metadata.get('failure_count', 0) or 0) + (absorbed.metadata.get('failure_count', 0) or 0)
+        kept.metadata['failure_count'] = failures
+        if failures:
+            kept.metadata['success_rate'] = success_rate(kept.metadata)
+        last_used = max(kept.metadata.get('last_used') or '', absorbed.metadata.get('last_used') or '')
+        kept.metadata['last_used'] = last_used or None
+        kept.metadata['merged_from'] = kept.metadata.get('merged_from', []) + [absorbed.id]
+    
+    def compact(self) -> dict:
+        """
+        Compacte la mémoire : fusion des quasi-doublons, éviction au-delà
+        des capacités, puis réécriture du stockage
         
-        return existing_rule.id
+        Appelée en arrière-plan après création de règles si
+        `retention.compact_interval_seconds` > 0.
+        
+        Returns:
+            dict avec règles fusionnées, évincées et restantes
+        """
+        with self._lock, self._shared_write():
+            self._cancel_compact_timer()
+            # Compteurs écrits d'abord : la fusion part des compteurs stockés
+            self._write_pending_usage()
+            
+            # La règle de plus forte valeur d'un groupe de doublons est conservée
+            now = datetime.now()
+            ordered = sorted(
+                self.rules,
+                key=lambda r: retention_score(r, now, self.retention.half_life_days),
+                reverse=True
+            )
+            pairs = near_duplicates(ordered, self.retention.merge_similarity)
+            
+            usage: Dict[str, list] = {}
+            for kept, absorbed in pairs:
+                self._absorb(kept, absorbed)
+                transferred = usage.setdefault(kept.id, [0, None, 0])
+                transferred[0] += absorbed.metadata.get('usage_count', 0) or 0
+                transferred[1] = max(transferred[1] or '', absorbed.metadata.get('last_used') or '') or None
+                transferred[2] += absorbed.metadata.get('failure_count', 0) or 0
+            
+            if pairs:
+                kept_rules = {kept.id: kept for kept, _ in pairs}
+                # Définitions puis compteurs transférés, puis suppression des absorbées
+                if self._store_write(self._store.upsert, [rule.to_dict() for rule in kept_rules.values()]):
+                    self._store_write(self._store.add_usage, {k: tuple(v) for k, v in usage.items()})
+                self._drop_rules([absorbed.id for _, absorbed in pairs])
+                self._merged += len(pairs)
+                logger.info(f"Merged {len(pairs)} near-duplicate rules")
+            
+            evicted = self._enforce_capacity()
+            self._store_write(self._store.compact)
+            self._last_compaction = datetime.now().isoformat()
+            
+            return {'merged': len(pairs), 'evicted': evicted, 'rules': len(self.rules)}
+    
+    def _schedule_compaction(self):
+        """Arme la compaction en arrière-plan (une seule pour plusieurs créations)"""
+        interval = self.retention.compact_interval_seconds
+        if interval <= 0:
+            return
+        if self._compact_timer is not None and self._compact_timer_pid == os.getpid():
+            return
+        timer = threading.Timer(interval, _compact_from_timer, args=(weakref.ref(self),))
+        timer.daemon = True
+        self._compact_timer = timer
+        self._compact_timer_pid = os.getpid()
+        timer.start()
+    
+    def _cancel_compact_timer(self):
+        timer = self._compact_timer
+        self._compact_timer = None
+        if timer is not None and self._compact_timer_pid == os.getpid() and timer is not threading.current_thread():
+            timer.cancel()
     
     def get_rule_stats(self) -> dict:
         """
@@ -348,47 +754,63 @@ class AIMemory:
         Returns:
             dict avec statistiques globales
         """
-        if not self.rules:
+        with self._lock:
+            self._refresh_if_stale()
+            
+            if not self.rules:
+                return {
+                    'total_rules': 0,
+                    'most_used': [],
+                    'by_entreprise': {},
+                    'by_doc_type': {},
+                    'index': self._index.stats(),
+                    'lifecycle': self._lifecycle_stats()
+                }
+            
+            # Most used rules
+            sorted_rules = sorted(
+                self.rules,
+                key=lambda r: r.metadata.get('usage_count', 0),
+                reverse=True
+            )
+            most_used = [
+                {
+                    'id': r.id,
+                    'name': r.name,
+                    'usage_count': r.metadata.get('usage_count', 0),
+                    'success_rate': r.metadata.get('success_rate', 1.0)
+                }
+                for r in sorted_rules[:10]
+            ]
+            
+            # Group by entreprise
+            by_entreprise = {}
+            for rule in self.rules:
+                entreprise = rule.metadata.get('entreprise', 'Unknown')
+                by_entreprise[entreprise] = by_entreprise.get(entreprise, 0) + 1
+            
+            # Group by doc type
+            by_doc_type = {}
+            for rule in self.rules:
+                doc_type = rule.metadata.get('document_type', 'unknown')
+                by_doc_type[doc_type] = by_doc_type.get(doc_type, 0) + 1
+            
             return {
-                'total_rules': 0,
-                'most_used': [],
-                'by_entreprise': {},
-                'by_doc_type': {}
+                'total_rules': len(self.rules),
+                'most_used': most_used,
+                'by_entreprise': by_entreprise,
+                'by_doc_type': by_doc_type,
+                'index': self._index.stats(),
+                'lifecycle': self._lifecycle_stats()
             }
-        
-        # Most used rules
-        sorted_rules = sorted(
-            self.rules,
-            key=lambda r: r.metadata.get('usage_count', 0),
-            reverse=True
-        )
-        most_used = [
-            {
-                'id': r.id,
-                'name': r.name,
-                'usage_count': r.metadata.get('usage_count', 0),
-                'success_rate': r.metadata.get('success_rate', 1.0)
-            }
-            for r in sorted_rules[:10]
-        ]
-        
-        # Group by entreprise
-        by_entreprise = {}
-        for rule in self.rules:
-            entreprise = rule.metadata.get('entreprise', 'Unknown')
-            by_entreprise[entreprise] = by_entreprise.get(entreprise, 0) + 1
-        
-        # Group by doc type
-        by_doc_type = {}
-        for rule in self.rules:
-            doc_type = rule.metadata.get('document_type', 'unknown')
-            by_doc_type[doc_type] = by_doc_type.get(doc_type, 0) + 1
-        
+    
+    def _lifecycle_stats(self) -> dict:
         return {
-            'total_rules': len(self.rules),
-            'most_used': most_used,
-            'by_entreprise': by_entreprise,
-            'by_doc_type': by_doc_type
+            'max_rules': self.retention.max_rules,
+            'max_rules_per_entreprise': self.retention.max_rules_per_entreprise,
+            'evicted': self._evicted,
+            'merged': self._merged,
+            'last_compaction': self._last_compaction
         }
     
     def delete_rule(self, rule_id: str) -> bool:
@@ -401,16 +823,18 @@ class AIMemory:
         Returns:
             True si supprimée, False si non trouvée
         """
-        initial_count = len(self.rules)
-        self.rules = [r for r in self.rules if r.id != rule_id]
-        
-        if len(self.rules) < initial_count:
-            self._save_rules()
-            logger.info(f"Rule deleted: {rule_id}")
-            return True
-        else:
-            logger.warning(f"Rule not found: {rule_id}")
-            return False
+        with self._lock, self._shared_write():
+            initial_count = len(self.rules)
+            remaining = [r for r in self.rules if r.id != rule_id]
+            
+            if len(remaining) < initial_count:
+                self._set_rules(remaining)
+                self._store_write(self._store.delete, rule_id)
+                logger.info(f"Rule deleted: {rule_id}")
+                return True
+            else:
+                logger.warning(f"Rule not found: {rule_id}")
+                return False
     
     def export_rules(self, export_path: str) -> bool:
         """
@@ -446,26 +870,30 @@ class AIMemory:
         Returns:
             Nombre de règles importées
         """
-        try:
-            with open(import_path, 'r', encoding='utf-8') as f:
-                imported_data = json.load(f)
-            
-            imported_rules = [Rule(rule_dict) for rule_dict in imported_data]
-            
-            if merge:
-                # Fusionner avec existantes
-                for rule in imported_rules:
-                    if not any(r.id == rule.id for r in self.rules):
-                        self.rules.append(rule)
-            else:
-                # Remplacer
-                self.rules = imported_rules
-            
-            self._save_rules()
-            
-            logger.info(f"Imported {len(imported_rules)} rules from {import_path}")
-            return len(imported_rules)
-            
-        except Exception as e:
-            logger.error(f"Failed to import rules: {e}")
-            return 0
+        with self._lock, self._shared_write():
+            try:
+                with open(import_path, 'r', encoding='utf-8') as f:
+                    imported_data = json.load(f)
+                
+                imported_rules = [Rule(rule_dict) for rule_dict in imported_data]
+                
+                if merge:
+                    # Fusionner avec existantes
+                    added = []
+                    for rule in imported_rules:
+                        if rule.id not in self._index:
+                            self.rules.append(rule)
+                            self._index.add(rule)
+                            added.append(rule.to_dict())
+                    self._store_write(self._store.upsert, added)
+                else:
+                    # Remplacer
+                    self._set_rules(imported_rules)
+                    self._store_write(self._store.replace_all, [rule.to_dict() for rule in imported_rules])
+                
+                logger.info(f"Imported {len(imported_rules)} rules from {import_path}")
+                return len(imported_rules)
+                
+            except Exception as e:
+                logger.error(f"Failed to import rules: {e}")
+                return 0
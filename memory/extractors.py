@@ -0,0 +1,320 @@
+"""
+Extracteurs compilés des règles mémoire
+
+Une action de règle n'est plus une valeur rejouée : elle décrit comment
+retrouver le champ dans un nouveau document du même gabarit.
+
+- constant : champ d'identité du fournisseur (nom, SIRET, adresse...)
+- anchor   : libellé (nombres généralisés) + décalage de lignes
+- regex    : pattern enregistré par le niveau d'origine
+- window   : fenêtre de lignes autour de la position d'origine
+- derived  : montant déduit des deux autres (HT + TVA = TTC)
+
+Le localisateur est appris par le Level 3 sur le document source et
+retenu seulement s'il y retrouve la valeur extraite (`learn_extractor`).
+"""
+
+import logging
+import re
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils.text_view import TextView
+
+logger = logging.getLogger("OCREngine.Memory")
+
+# Champs d'identité du fournisseur : identiques pour tous les documents d'une règle
+CONSTANT_FIELDS = (
+    'emetteur', 'emetteur_nom', 'emetteur_siret', 'fournisseur', 'fournisseur_nom',
+    'fournisseur_siret', 'siret', 'numero_tva_intracommunautaire', 'adresse_emetteur', 'devise',
+)
+
+# Montants liés : champ → (opérande, opérande, signe)
+DERIVABLE_AMOUNTS = {
+    'total_ttc': ('total_ht', 'montant_tva', 1),
+    'total_ht': ('total_ttc', 'montant_tva', -1),
+    'montant_tva': ('total_ttc', 'total_ht', -1),
+}
+
+# Lignes explorées autour de la position d'origine / au-dessus de la valeur
+WINDOW_RADIUS = 2
+ANCHOR_MAX_OFFSET = 2
+ANCHOR_MAX_LENGTH = 40
+
+_MONTHS = {
+    'janvier': '01', 'février': '02', 'fevrier': '02', 'mars': '03', 'avril': '04', 'mai': '05',
+    'juin': '06', 'juillet': '07', 'août': '08', 'aout': '08', 'septembre': '09', 'octobre': '10',
+    'novembre': '11', 'décembre': '12', 'decembre': '12',
+}
+
+# Valeur attendue selon sa nature
+_KIND_PATTERNS = {
+    'amount': r'(\d{1,3}(?:[ \u00a0.]\d{3})+|\d+)[,.](\d{2})(?!\d)',
+    'rate': r'(\d{1,2}(?:[.,]\d{1,2})?)\s*%',
+    'date': r'(\d{4})-(\d{1,2})-(\d{1,2})|(\d{1,2})\s*[/.-]\s*(\d{1,2})\s*[/.-]\s*(\d{4})'
+            r'|(\d{1,2})\s+(' + '|'.join(_MONTHS) + r')\s+(\d{4})',
+    'token': r'[A-Za-z0-9][A-Za-z0-9/_.-]*[A-Za-z0-9]|[A-Za-z0-9]',
+    'text': r'\S.*\S|\S',
+}
+
+_ISO_DATE_RE = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+_DIGITS_RE = re.compile(r'\d+')
+_LABEL_TRIM = ' \t:=-#°.'
+
+
+@lru_cache(maxsize=4096)
+def _compile(pattern: str, flags: int = 0) -> 're.Pattern':
+    """Patterns partagés entre règles (mêmes libellés d'un fournisseur à l'autre)"""
+    return re.compile(pattern, flags)
+
+
+def value_kind(field_name: str, value: Any) -> str:
+    """Nature de la valeur : amount, rate, date, token ou text"""
+    if isinstance(value, bool):
+        return 'text'
+    if isinstance(value, (int, float)):
+        return 'rate' if 'rate' in field_name or 'taux' in field_name else 'amount'
+    value = str(value)
+    if _ISO_DATE_RE.match(value):
+        return 'date'
+    return 'token' if value and not any(char.isspace() for char in value) else 'text'
+
+
+def _normalize(kind: str, match: 're.Match') -> Any:
+    """Valeur normalisée comme par les niveaux OCR"""
+    if kind == 'amount':
+        integer = re.sub(r'[ \u00a0.]', '', match.group(1))
+        return float(f"{integer}.{match.group(2)}")
+    if kind == 'rate':
+        return float(match.group(1).replace(',', '.'))
+    if kind == 'date':
+        groups = match.groups()
+        if groups[0]:
+            year, month, day = groups[0:3]
+        elif groups[3]:
+            day, month, year = groups[3:6]
+        else:
+            day, month, year = groups[6], _MONTHS[groups[7].lower()], groups[8]
+        return f"{year}-{month.zfill(2)}-{day.zfill(2)}"
+    return match.group(0)
+
+
+def _find_value(kind: str, segment: str) -> Optional[Any]:
+    """Première valeur de la nature dans le segment"""
+    flags = re.IGNORECASE if kind == 'date' else 0
+    match = _compile(_KIND_PATTERNS[kind], flags).search(segment)
+    if not match:
+        return None
+    try:
+        return _normalize(kind, match)
+    except (ValueError, KeyError):
+        return None
+
+
+def _same_value(found: Any, expected: Any) -> bool:
+    if isinstance(expected, (int, float)) and not isinstance(expected, bool):
+        return isinstance(found, float) and abs(found - expected) < 0.005
+    return found == expected
+
+
+def anchor_pattern(label: str) -> str:
+    """Libellé → regex (nombres généralisés, blancs souples)"""
+    parts = []
+    for index, chunk in enumerate(_DIGITS_RE.split(label)):
+        if index:
+            parts.append(r'\d+')
+        parts.append(r'[^\S\n]+'.join(re.escape(word) for word in chunk.split(' ')))
+    return ''.join(parts)
+
+
+class FieldExtractor:
+    """
+    Extracteur compilé d'une action de règle
+
+    `spec` = action['extractor'] (type + paramètres). Les actions des
+    règles créées avant les extracteurs sont interprétées au mieux
+    (pattern regex, position) ; sinon le champ est non ré-extractible.
+    """
+
+    def __init__(self, field_name: str, action: dict):
+        self.field_name = field_name
+        self.action = action
+        spec = action.get('extractor') or self._legacy_spec(field_name, action)
+        self.type = spec.get('type')
+        self.kind = spec.get('kind') or value_kind(field_name, action.get('value'))
+        self.offset = int(spec.get('offset', 0))
+        self.line = spec.get('line')
+        self.radius = int(spec.get('radius', WINDOW_RADIUS))
+        self.regex = None
+
+        if self.type == 'anchor':
+            self.regex = _compile(anchor_pattern(spec['anchor']), re.IGNORECASE)
+        elif self.type == 'regex':
+            try:
+                self.regex = _compile(spec['pattern'], re.IGNORECASE)
+            except re.error:
+                self.type = None
+
+    @staticmethod
+    def _legacy_spec(field_name: str, action: dict) -> dict:
+        if field_name in CONSTANT_FIELDS or action.get('method') == 'fixed_value':
+            return {'type': 'constant'}
+        if action.get('method') == 'regex' and action.get('pattern'):
+            return {'type': 'regex', 'pattern': action['pattern']}
+        position = action.get('position') or {}
+        if isinstance(position, dict) and isinstance(position.get('line'), int):
+            # Positions des niveaux OCR : lignes numérotées à partir de 1
+            return {'type': 'window', 'line': position['line'] - 1}
+        return {}
+
+    @property
+    def executable(self) -> bool:
+        return self.type in ('constant', 'anchor', 'regex', 'window', 'derived')
+
+    def extract(self, view: TextView) -> Optional[Any]:
+        """Valeur du champ dans le document (None si introuvable)"""
+        if self.type == 'constant':
+            return self.action.get('value')
+        if self.type == 'anchor':
+            return self._extract_anchor(view)
+        if self.type == 'regex':
+            match = self.regex.search(view.text)
+            return _find_value(self.kind, match.group(0)) if match else None
+        if self.type == 'window':
+            return self._extract_window(view)
+        return None
+
+    def _extract_anchor(self, view: TextView) -> Optional[Any]:
+        lines = view.lines
+        for match in self.regex.finditer(view.text):
+            index = view.line_index(match.start())
+            if self.offset == 0:
+                segment = view.text[match.end():view.line_offsets[index] + len(lines[index])]
+            elif index + self.offset < len(lines):
+                segment = lines[index + self.offset]
+            else:
+                continue
+            value = _find_value(self.kind, segment.strip(_LABEL_TRIM))
+            if value is not None:
+                return value
+        return None
+
+    def _extract_window(self, view: TextView) -> Optional[Any]:
+        lines = view.lines
+        if not isinstance(self.line, int):
+            return None
+        # Ligne d'origine d'abord, puis de plus en plus loin
+        for distance in range(self.radius + 1):
+            for index in sorted({self.line - distance, self.line + distance}):
+                if 0 <= index < len(lines):
+                    value = _find_value(self.kind, lines[index].strip())
+                    if value is not None:
+                        return value
+        return None
+
+
+class CompiledRule:
+    """Extracteurs de toutes les actions d'une règle"""
+
+    def __init__(self, actions: Dict[str, dict]):
+        self.extractors = [FieldExtractor(name, action) for name, action in actions.items()]
+
+    def extract(self, view: TextView) -> Tuple[Dict[str, Any], List[str]]:
+        """
+        Applique les extracteurs sur le document
+
+        Returns:
+            ({champ: valeur}, champs introuvables)
+        """
+        values: Dict[str, Any] = {}
+        derived = []
+        for extractor in self.extractors:
+            if extractor.type == 'derived':
+                derived.append(extractor)
+                continue
+            value = extractor.extract(view) if extractor.executable else None
+            if value is not None:
+                values[extractor.field_name] = value
+
+        for extractor in derived:
+            left, right, sign = DERIVABLE_AMOUNTS.get(extractor.field_name, (None, None, 0))
+            if left in values and right in values:
+                values[extractor.field_name] = round(values[left] + sign * values[right], 2)
+
+        missing = [e.field_name for e in self.extractors if e.field_name not in values]
+        return values, missing
+
+
+def learn_extractor(field_name: str, value: Any, view: TextView,
+                    position: Optional[dict] = None, pattern: Optional[str] = None) -> Optional[dict]:
+    """
+    Apprend sur le document source comment retrouver la valeur
+
+    Candidats essayés dans l'ordre : constante, libellé sur la même ligne,
+    libellé sur une ligne au-dessus, regex du niveau d'origine, fenêtre de
+    lignes, montant dérivé. Un candidat n'est retenu que s'il retrouve
+    exactement la valeur dans le document source.
+
+    Returns:
+        Spécification de l'extracteur (action['extractor']) ou None
+    """
+    if field_name in CONSTANT_FIELDS:
+        return {'type': 'constant'}
+    if value is None or value == '':
+        return None
+
+    kind = value_kind(field_name, value)
+    action = {'value': value}
+
+    def verified(spec: dict) -> bool:
+        try:
+            extractor = FieldExtractor(field_name, {**action, 'extractor': spec})
+        except (re.error, KeyError):
+            return False
+        return _same_value(extractor.extract(view), value)
+
+    for spec in _anchor_candidates(kind, value, view):
+        if verified(spec):
+            return spec
+
+    if pattern and verified({'type': 'regex', 'kind': kind, 'pattern': pattern}):
+        return {'type': 'regex', 'kind': kind, 'pattern': pattern}
+
+    lines = [index for index, line in enumerate(view.lines) if _same_value(_find_value(kind, line.strip()), value)]
+    if isinstance(position, dict) and isinstance(position.get('line'), int):
+        lines.insert(0, position['line'] - 1)
+    for line in lines:
+        spec = {'type': 'window', 'kind': kind, 'line': line, 'radius': WINDOW_RADIUS}
+        if verified(spec):
+            return spec
+
+    if field_name in DERIVABLE_AMOUNTS:
+        return {'type': 'derived', 'kind': kind}
+    return None
+
+
+def _anchor_candidates(kind: str, value: Any, view: TextView):
+    """Libellés précédant la valeur (même ligne, puis lignes au-dessus)"""
+    regex = _compile(_KIND_PATTERNS[kind], re.IGNORECASE if kind == 'date' else 0)
+    lines = view.lines
+    for index, line in enumerate(lines):
+        for match in regex.finditer(line):
+            try:
+                if not _same_value(_normalize(kind, match), value):
+                    continue
+            except (ValueError, KeyError):
+                continue
+            label = _label(line[:match.start()])
+            if label:
+                yield {'type': 'anchor', 'kind': kind, 'anchor': label, 'offset': 0}
+            above = [j for j in range(index - 1, max(-1, index - 1 - ANCHOR_MAX_OFFSET), -1) if lines[j].strip()]
+            for j in above:
+                label = _label(lines[j])
+                if label:
+                    yield {'type': 'anchor', 'kind': kind, 'anchor': label, 'offset': index - j}
+
+
+def _label(text: str) -> Optional[str]:
+    """Libellé normalisé (fin du texte, minuscules), None sans lettre"""
+    label = ' '.join(text.lower().split()).strip(_LABEL_TRIM)[-ANCHOR_MAX_LENGTH:].strip()
+    return label if any(char.isalpha() for char in label) else None
@@ -0,0 +1,135 @@
+"""
+Cycle de vie des règles mémoire
+
+Chaque passage en Level 3 peut créer une règle : sans limite, le nombre
+de règles (et le temps de chargement) croît avec le trafic.
+
+- RetentionPolicy : capacités (globale, par entreprise), demi-vie des usages
+- retention_score : valeur d'une règle (usages décroissants avec l'âge × taux de succès)
+- near_duplicates : règles quasi identiques à fusionner
+"""
+
+import math
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from .rule_index import _PATTERN_CONDITIONS, _tokens
+
+
+@dataclass
+class RetentionPolicy:
+    """Limites de la mémoire (section `memory_retention` de la configuration)"""
+    max_rules: Optional[int] = 5000
+    max_rules_per_entreprise: Optional[int] = 500
+    # Un usage vieux de `half_life_days` compte pour moitié
+    half_life_days: float = 30.0
+    # Similarité (Jaccard des mots d'en-tête/pied/logo) à partir de laquelle fusionner
+    merge_similarity: float = 0.8
+    # Compaction en arrière-plan après création de règles (0 = désactivée)
+    compact_interval_seconds: float = 0.0
+
+    @classmethod
+    def from_config(cls, config: Optional[dict]) -> 'RetentionPolicy':
+        config = config or {}
+        defaults = cls()
+        return cls(
+            max_rules=config.get('max_rules', defaults.max_rules),
+            max_rules_per_entreprise=config.get('max_rules_per_entreprise', defaults.max_rules_per_entreprise),
+            half_life_days=float(config.get('half_life_days', defaults.half_life_days)),
+            merge_similarity=float(config.get('merge_similarity', defaults.merge_similarity)),
+            compact_interval_seconds=float(config.get('compact_interval_seconds', defaults.compact_interval_seconds))
+        )
+
+
+def _parse_date(value) -> Optional[datetime]:
+    try:
+        return datetime.fromisoformat(value) if value else None
+    except (TypeError, ValueError):
+        return None
+
+
+def success_rate(metadata: dict) -> float:
+    """
+    Taux de succès des applications de la règle
+
+    Applications réussies (usage_count) / applications comptées (réussies
+    + échecs) ; sans échec compté, le taux enregistré (1.0 par défaut).
+    """
+    usage = max(0, int(metadata.get('usage_count') or 0))
+    failures = max(0, int(metadata.get('failure_count') or 0))
+    if failures:
+        return usage / (usage + failures)
+    rate = metadata.get('success_rate', 1.0)
+    return 1.0 if rate is None else max(0.0, float(rate))
+
+
+def retention_score(rule, now: datetime, half_life_days: float) -> float:
+    """
+    Valeur de conservation d'une règle (la plus faible est évincée)
+
+    (1 + usages) × taux de succès × 0.5^(âge / demi-vie), l'âge étant
+    compté depuis le dernier usage (ou la création). Le taux de succès
+    tient compte des échecs comptés : une règle souvent appliquée mais
+    qui échoue perd sa valeur.
+    """
+    metadata = rule.metadata
+    usage = max(0, int(metadata.get('usage_count') or 0))
+    rate = success_rate(metadata)
+
+    last_seen = _parse_date(metadata.get('last_used')) or _parse_date(metadata.get('created_at'))
+    age_days = max(0.0, (now - last_seen).total_seconds() / 86400) if last_seen else 0.0
+    decay = math.pow(0.5, age_days / half_life_days) if half_life_days > 0 else 1.0
+
+    return (1 + usage) * rate * decay
+
+
+def _duplicate_key(rule) -> Tuple:
+    """Règles comparables : même entreprise, type de document et SIRET"""
+    conditions = rule.conditions
+    return (
+        rule.metadata.get('entreprise'),
+        conditions.get('document_type') or rule.metadata.get('document_type'),
+        str(conditions.get('siret_matches') or '')
+    )
+
+
+def _similarity(left: set, right: set) -> float:
+    if not left and not right:
+        return 1.0
+    return len(left & right) / len(left | right)
+
+
+def near_duplicates(rules: List, threshold: float) -> List[Tuple[object, object]]:
+    """
+    Paires (règle conservée, règle absorbée) quasi identiques
+
+    Comparaison limitée aux règles de même entreprise / type / SIRET ;
+    une règle absorbée ne sert plus de référence.
+
+    Args:
+        rules: Règles, par ordre de préférence décroissant (la première
+            d'un groupe de doublons est conservée)
+    """
+    groups: Dict[Tuple, List] = {}
+    for rule in rules:
+        groups.setdefault(_duplicate_key(rule), []).append(rule)
+
+    pairs = []
+    for group in groups.values():
+        kept: List[Tuple[object, set]] = []
+        for rule in group:
+            tokens = set().union(*(
+                _tokens(str(pattern))
+                for condition in _PATTERN_CONDITIONS
+                for pattern in rule.conditions.get(condition) or []
+            ))
+            if not tokens:
+                # Sans motif, rien ne distingue deux règles : jamais fusionnées
+                continue
+            target = next((k for k, k_tokens in kept if _similarity(tokens, k_tokens) >= threshold), None)
+            if target is None:
+                kept.append((rule, tokens))
+            else:
+                pairs.append((target, rule))
+    return pairs
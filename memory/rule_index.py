@@ -0,0 +1,297 @@
+"""
+Index en mémoire des règles
+
+Pré-filtre de find_matching_rule : seules les règles plausibles pour le
+document (même entreprise + SIRET, signature ou mot d'en-tête/pied
+commun) sont évaluées par Rule.matches. Le score final est inchangé.
+
+Rule.matches teste les motifs par sous-chaîne : seuls les mots entourés
+de séparateurs dans le motif ("rue" dans "12 rue paix") sont des mots
+entiers du document ; ceux du bord ("12" peut venir de "112") ne sont pas
+indexés. Les mots d'en-tête/pied sont cherchés parmi les mots de
+l'en-tête/pied du document, les mots de logo parmi ceux de tout le texte.
+"""
+
+import re
+import threading
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from utils.text_view import TextView
+
+# Seuil de correspondance de find_matching_rule
+MATCH_THRESHOLD = 0.7
+
+# Points max de chaque condition dans Rule.matches
+_CONDITION_POINTS = {
+    'document_type': 20,
+    'signature': 30,
+    'header_contains': 20,
+    'footer_contains': 20,
+    'siret_matches': 30,
+    'logo_keywords': 10,
+}
+
+# Conditions indexées, de la plus sélective à la moins sélective
+_INDEXED = ('siret_matches', 'signature', 'footer_contains', 'header_contains', 'logo_keywords')
+
+_TOKEN_RE = re.compile(r'\w+')
+_DIGIT_RUN_RE = re.compile(r'\d+')
+
+
+def _tokens(text: str) -> Set[str]:
+    return set(_TOKEN_RE.findall(text.lower()))
+
+
+_PATTERN_CONDITIONS = ('header_contains', 'footer_contains', 'logo_keywords')
+
+
+def _whole_tokens(pattern: str) -> Set[str]:
+    """Mots du motif bordés de séparateurs des deux côtés dans le motif"""
+    pattern = pattern.lower()
+    return {
+        match.group() for match in _TOKEN_RE.finditer(pattern)
+        if match.start() > 0 and match.end() < len(pattern)
+    }
+
+
+def _pattern_tokens(rule, conditions: Iterable[str] = _PATTERN_CONDITIONS) -> List[Tuple[str, Set[str]]]:
+    """(condition, mots entiers) de chaque motif d'en-tête, de pied et de logo"""
+    return [
+        (condition, _whole_tokens(str(pattern)))
+        for condition in conditions if condition in _PATTERN_CONDITIONS
+        for pattern in rule.conditions.get(condition) or []
+    ]
+
+
+def _index_plan(rule) -> Optional[Tuple[str, ...]]:
+    """
+    Conditions sous lesquelles indexer la règle
+
+    Une condition est nécessaire si, sans elle, la règle ne peut pas
+    dépasser le seuil : la règle n'est alors indexée que sous la plus
+    sélective des conditions nécessaires (le SIRET pour les règles du
+    Level 3). Sinon sous toutes ses conditions indexées.
+
+    Returns:
+        None si la règle peut dépasser le seuil sans indice (toujours évaluée)
+    """
+    conditions = rule.conditions
+    max_score = sum(points for name, points in _CONDITION_POINTS.items() if name in conditions)
+    if max_score == 0:
+        return ()
+    # Points acquis sans indice (type de document, SIRET vide)
+    base = _CONDITION_POINTS['document_type'] if 'document_type' in conditions else 0
+    evidence = {}
+    for name in _INDEXED:
+        if name not in conditions:
+            continue
+        if name == 'siret_matches':
+            if str(conditions[name]) == '':
+                base += _CONDITION_POINTS[name]
+            else:
+                evidence[name] = _CONDITION_POINTS[name]
+        elif conditions[name] not in (None, '', []):
+            evidence[name] = _CONDITION_POINTS[name]
+
+    if base / max_score > MATCH_THRESHOLD:
+        return None
+    total = base + sum(evidence.values())
+    necessary = [name for name in evidence if (total - evidence[name]) / max_score <= MATCH_THRESHOLD]
+    return tuple(necessary[:1] or evidence)
+
+
+class _Bucket:
+    """Règles d'une entreprise"""
+
+    __slots__ = ('always', 'by_siret', 'by_signature', 'by_token', 'by_logo_token', 'token_counts',
+                 'siret_lengths', 'odd_sirets')
+
+    def __init__(self):
+        self.always: Set[str] = set()
+        self.by_siret: Dict[str, Set[str]] = {}
+        self.by_signature: Dict[str, Set[str]] = {}
+        # Mots d'en-tête/pied, mots de logo (cherchés dans tout le texte)
+        self.by_token: Dict[str, Set[str]] = {}
+        self.by_logo_token: Dict[str, Set[str]] = {}
+        # Nombre de motifs contenant chaque mot (choix du mot le plus rare)
+        self.token_counts: Dict[str, int] = {}
+        self.siret_lengths: Set[int] = set()
+        # SIRET non numériques : vérifiés par sous-chaîne
+        self.odd_sirets: Dict[str, Set[str]] = {}
+
+
+class RuleIndex:
+    """
+    Buckets par entreprise, table SIRET, table signature et index inversé
+    mots d'en-tête/pied/logo → IDs de règles
+
+    Un motif ne peut correspondre que si tous ses mots entiers sont
+    présents : il est indexé sous le plus rare d'entre eux dans le bucket
+    ("sarl", commun à toutes les règles, ne rend pas toutes les règles
+    candidates).
+
+    Non thread-safe : utilisé sous le verrou d'AIMemory.
+    """
+
+    def __init__(self, rules: Iterable = ()):
+        self._stats_lock = threading.Lock()
+        self.lookups = 0
+        self.scored = 0
+        self.seconds = 0.0
+        self.rebuild(rules)
+
+    def rebuild(self, rules: Iterable):
+        """Reconstruit l'index (chargement, suppression, import)"""
+        self._rules: Dict[str, object] = {}
+        self._order: Dict[str, int] = {}
+        self._buckets: Dict[Optional[str], _Bucket] = {}
+        self._next = 0
+        rules = list(rules)
+        # Fréquences connues avant de choisir les mots indexés
+        for rule in rules:
+            self._count_tokens(rule)
+        for rule in rules:
+            self._index_rule(rule)
+
+    def _count_tokens(self, rule):
+        bucket = self._buckets.setdefault(rule.metadata.get('entreprise'), _Bucket())
+        for _, tokens in _pattern_tokens(rule):
+            for token in tokens:
+                bucket.token_counts[token] = bucket.token_counts.get(token, 0) + 1
+
+    def add(self, rule):
+        """Indexe une règle (une règle de même ID est remplacée)"""
+        if rule.id in self._rules:
+            self.rebuild([rule if r.id == rule.id else r for r in self.rules()])
+            return
+        self._count_tokens(rule)
+        self._index_rule(rule)
+
+    def _index_rule(self, rule):
+        self._rules[rule.id] = rule
+        self._order[rule.id] = self._next
+        self._next += 1
+
+        bucket = self._buckets.setdefault(rule.metadata.get('entreprise'), _Bucket())
+        conditions = rule.conditions
+        plan = _index_plan(rule)
+        # Motif sans mot entier (ex: "-----", "dupont") : non indexable, toujours évalué
+        if plan is None or any(not tokens for _, tokens in _pattern_tokens(rule, plan)):
+            bucket.always.add(rule.id)
+            return
+
+        if 'siret_matches' in plan:
+            siret = str(conditions['siret_matches'])
+            if siret.isdecimal():
+                bucket.by_siret.setdefault(siret, set()).add(rule.id)
+                bucket.siret_lengths.add(len(siret))
+            else:
+                bucket.odd_sirets.setdefault(siret, set()).add(rule.id)
+
+        if 'signature' in plan:
+            bucket.by_signature.setdefault(str(conditions['signature']), set()).add(rule.id)
+
+        for condition, tokens in _pattern_tokens(rule, plan):
+            rarest = min(sorted(tokens), key=bucket.token_counts.__getitem__)
+            table = bucket.by_logo_token if condition == 'logo_keywords' else bucket.by_token
+            table.setdefault(rarest, set()).add(rule.id)
+
+    def remove(self, rule_id: str):
+        """Désindexe une règle (éviction, fusion) sans reconstruire l'index"""
+        rule = self._rules.pop(rule_id, None)
+        if rule is None:
+            return
+        del self._order[rule_id]
+
+        bucket = self._buckets[rule.metadata.get('entreprise')]
+        bucket.always.discard(rule_id)
+        for table in (bucket.by_siret, bucket.by_signature, bucket.by_token, bucket.by_logo_token,
+                      bucket.odd_sirets):
+            for key in [key for key, rule_ids in table.items() if rule_id in rule_ids]:
+                table[key].discard(rule_id)
+                if not table[key]:
+                    del table[key]
+        for _, tokens in _pattern_tokens(rule):
+            for token in tokens:
+                bucket.token_counts[token] -= 1
+                if not bucket.token_counts[token]:
+                    del bucket.token_counts[token]
+
+    def get(self, rule_id: str):
+        return self._rules.get(rule_id)
+
+    def rules(self) -> List:
+        """Règles dans l'ordre d'insertion"""
+        return sorted(self._rules.values(), key=lambda rule: self._order[rule.id])
+
+    def has_entreprise(self, entreprise: Optional[str]) -> bool:
+        return entreprise in self._buckets
+
+    def candidates(self, view: TextView, entreprise: Optional[str],
+                   signature: Optional[str] = None) -> List:
+        """
+        Règles plausibles pour le document, dans l'ordre d'insertion
+
+        Args:
+            view: Vue du document (jetons et suites de chiffres mémorisés)
+            entreprise: Entreprise du contexte
+            signature: Signature calculée du document (si disponible)
+        """
+        bucket = self._buckets.get(entreprise)
+        if bucket is None:
+            return []
+
+        ids = set(bucket.always)
+        if signature is not None:
+            ids.update(bucket.by_signature.get(str(signature), ()))
+
+        if bucket.by_siret:
+            runs = view.memo('digit_runs', lambda: tuple(_DIGIT_RUN_RE.findall(view.text)))
+            for length in bucket.siret_lengths:
+                for run in runs:
+                    for start in range(len(run) - length + 1):
+                        ids.update(bucket.by_siret.get(run[start:start + length], ()))
+        for siret, rule_ids in bucket.odd_sirets.items():
+            if siret in view.text:
+                ids.update(rule_ids)
+
+        if bucket.by_token:
+            tokens = view.memo('edge_tokens', lambda: _tokens(view.header_lower) | _tokens(view.footer_lower))
+            _collect(bucket.by_token, tokens, ids)
+        if bucket.by_logo_token:
+            _collect(bucket.by_logo_token, view.memo('tokens', lambda: set(_TOKEN_RE.findall(view.lower))), ids)
+
+        return [self._rules[rule_id] for rule_id in sorted(ids, key=self._order.__getitem__)]
+
+    def record(self, scored: int, seconds: float):
+        """Comptabilise une recherche (candidats évalués, durée)"""
+        with self._stats_lock:
+            self.lookups += 1
+            self.scored += scored
+            self.seconds += seconds
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            lookups = self.lookups
+            return {
+                'rules': len(self._rules),
+                'entreprises': len(self._buckets),
+                'tokens': sum(len(bucket.by_token) + len(bucket.by_logo_token) for bucket in self._buckets.values()),
+                'lookups': lookups,
+                'avg_candidates': round(self.scored / lookups, 2) if lookups else 0.0,
+                'avg_lookup_ms': round(self.seconds * 1000 / lookups, 3) if lookups else 0.0,
+            }
+
+    def __len__(self) -> int:
+        return len(self._rules)
+
+    def __contains__(self, rule_id: str) -> bool:
+        return rule_id in self._rules
+
+
+def _collect(by_token: Dict[str, Set[str]], tokens: Set[str], ids: Set[str]):
+    """Ajoute à ids les règles indexées sous les mots du document"""
+    for token in tokens:
+        rule_ids = by_token.get(token)
+        if rule_ids:
+            ids.update(rule_ids)
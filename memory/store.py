@@ -0,0 +1,385 @@
+"""
+Stockage des règles mémoire
+
+- RuleStore : interface (chargement, upsert ligne à ligne, compteurs)
+- SQLiteRuleStore : stockage par défaut (mode WAL), partageable entre
+  workers et instances montant le même volume
+- JSONRuleStore : fichier JSON réécrit en entier (format d'export/import,
+  anciens déploiements)
+
+Les compteurs d'usage (usage_count, last_used, failure_count) ne sont
+modifiés que par `add_usage` : un upsert de la définition d'une règle n'écrase jamais les
+usages comptés par un autre processus. `changed` ne signale que les
+modifications de l'ensemble des règles, pas les compteurs.
+"""
+
+import json
+import logging
+from abc import ABC, abstractmethod
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger("OCREngine.Memory")
+
+# Usages à ajouter : {rule_id: (applications réussies, last_used ou None, échecs)}
+Usage = Dict[str, Tuple[int, Optional[str], int]]
+
+# Compteurs conservés par un upsert (écrits par add_usage seulement)
+_COUNTERS = ('usage_count', 'last_used', 'failure_count')
+
+
+class RuleStore(ABC):
+    """
+    Interface d'un stockage de règles
+
+    Les règles sont des dicts (Rule.to_dict()). `changed` signale une
+    modification des règles (hors compteurs d'usage) par un autre
+    processus depuis le dernier chargement.
+    """
+
+    @abstractmethod
+    def load(self) -> List[dict]:
+        """Toutes les règles, dans l'ordre d'insertion"""
+
+    @abstractmethod
+    def upsert(self, rules: Iterable[dict]):
+        """Insère ou met à jour des règles (compteurs d'usage conservés)"""
+
+    def delete(self, rule_id: str) -> bool:
+        return self.delete_many([rule_id]) > 0
+
+    @abstractmethod
+    def delete_many(self, rule_ids: Iterable[str]) -> int:
+        """Supprime des règles, retourne le nombre supprimé"""
+
+    @abstractmethod
+    def replace_all(self, rules: Iterable[dict]):
+        """Remplace toutes les règles (import sans fusion)"""
+
+    @abstractmethod
+    def add_usage(self, usage: Usage):
+        """Incrémente les compteurs d'usage et d'échec (last_used : le plus récent)"""
+
+    def changed(self) -> bool:
+        return False
+
+    def compact(self):
+        """Récupère la place des règles supprimées"""
+
+    def close(self):
+        pass
+
+
+class JSONRuleStore(RuleStore):
+    """
+    Fichier JSON (liste de règles), réécrit en entier à chaque écriture
+
+    Un seul écrivain à la fois : en mode prefork, les écritures sont
+    sérialisées par le compteur de génération d'AIMemory. Chaque écriture
+    relit le fichier : les compteurs écrits par un autre worker ne sont
+    pas écrasés par une copie périmée.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._rules: Dict[str, dict] = {}
+
+    def load(self) -> List[dict]:
+        if not os.path.exists(self.path):
+            logger.info(f"No existing rules file at {self.path}")
+        self._read()
+        return json.loads(json.dumps(list(self._rules.values())))
+
+    def _read(self):
+        if not os.path.exists(self.path):
+            self._rules = {}
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            content = f.read()
+        # Fichier vide (créé d'avance) : aucune règle
+        self._rules = {rule['id']: rule for rule in json.loads(content)} if content.strip() else {}
+
+    def _write(self):
+        # tmp + rename : un autre worker ne lit jamais un fichier partiel
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(list(self._rules.values()), f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def upsert(self, rules: Iterable[dict]):
+        self._read()
+        for rule in rules:
+            # Copie : les dicts de la règle chargée évoluent sans être écrits
+            rule = json.loads(json.dumps(rule, ensure_ascii=False))
+            stored = self._rules.get(rule['id'])
+            if stored is not None:
+                for key in _COUNTERS:
+                    rule['metadata'][key] = stored['metadata'].get(key)
+            self._rules[rule['id']] = rule
+        self._write()
+
+    def delete_many(self, rule_ids: Iterable[str]) -> int:
+        self._read()
+        deleted = sum(self._rules.pop(rule_id, None) is not None for rule_id in rule_ids)
+        if deleted:
+            self._write()
+        return deleted
+
+    def replace_all(self, rules: Iterable[dict]):
+        self._rules = {rule['id']: json.loads(json.dumps(rule, ensure_ascii=False)) for rule in rules}
+        self._write()
+
+    def add_usage(self, usage: Usage):
+        self._read()
+        for rule_id, (count, last_used, failures) in usage.items():
+            rule = self._rules.get(rule_id)
+            if rule is None:
+                continue
+            metadata = rule['metadata']
+            metadata['usage_count'] = metadata.get('usage_count', 0) + count
+            metadata['failure_count'] = metadata.get('failure_count', 0) + failures
+            if last_used is not None and last_used > (metadata.get('last_used') or ''):
+                metadata['last_used'] = last_used
+        self._write()
+
+    def compact(self):
+        if os.path.exists(self.path):
+            self._read()
+            self._write()
+
+
+class SQLiteRuleStore(RuleStore):
+    """
+    Stockage SQLite (mode WAL)
+
+    Une ligne par règle, colonnes indexées entreprise / SIRET / signature /
+    type de document. Écritures ligne à ligne (upsert, incrément atomique
+    des compteurs) : plusieurs processus partagent le fichier sans
+    s'écraser. `PRAGMA data_version` détecte leurs écritures ; la version
+    des règles (table meta, incrémentée par toute écriture hors compteurs)
+    distingue un changement des règles d'un simple flush de compteurs.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS rules (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            id TEXT NOT NULL UNIQUE,
+            name TEXT,
+            entreprise TEXT,
+            siret TEXT,
+            signature TEXT,
+            document_type TEXT,
+            conditions TEXT NOT NULL,
+            actions TEXT NOT NULL,
+            metadata TEXT NOT NULL,
+            usage_count INTEGER NOT NULL DEFAULT 0,
+            last_used TEXT,
+            failure_count INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE INDEX IF NOT EXISTS idx_rules_entreprise ON rules (entreprise);
+        CREATE INDEX IF NOT EXISTS idx_rules_siret ON rules (siret);
+        CREATE INDEX IF NOT EXISTS idx_rules_signature ON rules (signature);
+        CREATE INDEX IF NOT EXISTS idx_rules_document_type ON rules (document_type);
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        );
+        INSERT OR IGNORE INTO meta (key, value) VALUES ('rules_version', 0);
+    """
+
+    _BUMP_VERSION = ("UPDATE meta SET value = value + 1 WHERE key = 'rules_version'", ())
+
+    _UPSERT = (
+        "INSERT INTO rules (id, name, entreprise, siret, signature, document_type,"
+        " conditions, actions, metadata, usage_count, last_used, failure_count)"
+        " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+        " ON CONFLICT (id) DO UPDATE SET name = excluded.name, entreprise = excluded.entreprise,"
+        " siret = excluded.siret, signature = excluded.signature,"
+        " document_type = excluded.document_type, conditions = excluded.conditions,"
+        " actions = excluded.actions, metadata = excluded.metadata"
+    )
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: Fichier SQLite (créé si absent)
+        """
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # Une connexion par processus, ouverte à la demande (le parent
+        # prefork la ferme avant de forker, voir AIMemory.before_fork) ;
+        # les appels d'AIMemory sont déjà sérialisés par son verrou
+        self._lock = threading.Lock()
+        self._conn_pid = None
+        self._connection = None
+        self._data_version = None
+        self._rules_version = None
+
+        conn = self._conn()
+        conn.executescript(self.SCHEMA)
+        # Bases créées avant le comptage des échecs
+        columns = {row['name'] for row in conn.execute("PRAGMA table_info(rules)")}
+        if 'failure_count' not in columns:
+            conn.execute("ALTER TABLE rules ADD COLUMN failure_count INTEGER NOT NULL DEFAULT 0")
+        logger.info(f"SQLite rule store ready: {path}")
+
+    def _conn(self) -> sqlite3.Connection:
+        if self._connection is None or self._conn_pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._connection = conn
+            self._conn_pid = os.getpid()
+            self._data_version = None
+        return self._connection
+
+    def _version(self, conn: sqlite3.Connection) -> int:
+        return conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _rules_version_of(self, conn: sqlite3.Connection) -> int:
+        return conn.execute("SELECT value FROM meta WHERE key = 'rules_version'").fetchone()[0]
+
+    @staticmethod
+    def _row(rule: dict) -> tuple:
+        conditions = rule.get('conditions') or {}
+        metadata = rule.get('metadata') or {}
+        siret = conditions.get('siret_matches')
+        signature = conditions.get('signature') or metadata.get('pattern_signature')
+        return (
+            rule['id'], rule.get('name'), metadata.get('entreprise'),
+            str(siret) if siret is not None else None,
+            str(signature) if signature is not None else None,
+            conditions.get('document_type') or metadata.get('document_type'),
+            json.dumps(conditions, ensure_ascii=False),
+            json.dumps(rule.get('actions') or {}, ensure_ascii=False),
+            json.dumps(metadata, ensure_ascii=False),
+            int(metadata.get('usage_count') or 0), metadata.get('last_used'),
+            int(metadata.get('failure_count') or 0)
+        )
+
+    def _transaction(self, statements):
+        """Exécute (sql, params) dans une transaction IMMEDIATE"""
+        with self._lock:
+            conn = self._conn()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                cursors = [conn.execute(sql, params) for sql, params in statements]
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            return cursors
+
+    def load(self) -> List[dict]:
+        with self._lock:
+            conn = self._conn()
+            conn.execute("BEGIN")
+            try:
+                version = self._version(conn)
+                rules_version = self._rules_version_of(conn)
+                rows = conn.execute("SELECT * FROM rules ORDER BY seq").fetchall()
+            finally:
+                conn.execute("COMMIT")
+            # Après lecture seulement : un chargement en échec sera retenté
+            self._data_version = version
+            self._rules_version = rules_version
+
+        rules = []
+        for row in rows:
+            metadata = json.loads(row['metadata'])
+            metadata['usage_count'] = row['usage_count']
+            metadata['last_used'] = row['last_used']
+            metadata['failure_count'] = row['failure_count']
+            rules.append({
+                'id': row['id'],
+                'name': row['name'],
+                'conditions': json.loads(row['conditions']),
+                'actions': json.loads(row['actions']),
+                'metadata': metadata
+            })
+        return rules
+
+    def upsert(self, rules: Iterable[dict]):
+        self._transaction([(self._UPSERT, self._row(rule)) for rule in rules] + [self._BUMP_VERSION])
+
+    def delete_many(self, rule_ids: Iterable[str]) -> int:
+        cursors = self._transaction(
+            [("DELETE FROM rules WHERE id = ?", (rule_id,)) for rule_id in rule_ids] + [self._BUMP_VERSION]
+        )
+        return sum(cursor.rowcount for cursor in cursors[:-1])
+
+    def replace_all(self, rules: Iterable[dict]):
+        self._transaction(
+            [("DELETE FROM rules", ())] + [(self._UPSERT, self._row(rule)) for rule in rules] + [self._BUMP_VERSION]
+        )
+
+    def add_usage(self, usage: Usage):
+        self._transaction([
+            ("UPDATE rules SET usage_count = usage_count + ?, failure_count = failure_count + ?,"
+             " last_used = NULLIF(MAX(COALESCE(last_used, ''), COALESCE(?, '')), '')"
+             " WHERE id = ?", (count, failures, last_used, rule_id))
+            for rule_id, (count, last_used, failures) in usage.items()
+        ])
+
+    def compact(self):
+        with self._lock:
+            conn = self._conn()
+            conn.execute("VACUUM")
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn().execute("SELECT COUNT(*) FROM rules").fetchone()[0]
+
+    def changed(self) -> bool:
+        """Règles modifiées par une autre connexion depuis le dernier chargement"""
+        with self._lock:
+            if self._rules_version is None:
+                return False
+            if self._connection is not None and self._conn_pid == os.getpid():
+                # data_version inchangé : aucune écriture, pas de lecture de meta
+                data_version = self._version(self._connection)
+                if data_version == self._data_version:
+                    return False
+            conn = self._conn()
+            if self._rules_version_of(conn) != self._rules_version:
+                # Rechargement attendu (retenté tant que load n'a pas abouti)
+                self._data_version = None
+                return True
+            # Flush de compteurs seul, ou connexion rouverte après un fork
+            # (data_version propre à chaque connexion)
+            self._data_version = self._version(conn)
+            return False
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None and self._conn_pid == os.getpid():
+                self._connection.close()
+            self._connection = None
+
+
+def create_store(path: str) -> RuleStore:
+    """
+    Stockage selon l'extension du chemin (`.json` : fichier JSON, sinon SQLite)
+
+    Une base SQLite vide reprend les règles du fichier JSON voisin
+    (`rules.db` ← `rules.json`) : migration au premier démarrage.
+    """
+    if path.endswith('.json'):
+        logger.warning(f"JSON rule store ({path}): single writer, prefer a .db path")
+        return JSONRuleStore(path)
+
+    store = SQLiteRuleStore(path)
+    legacy_path = os.path.splitext(path)[0] + '.json'
+    if os.path.exists(legacy_path) and store.count() == 0:
+        rules = JSONRuleStore(legacy_path).load()
+        # Insertion : compteurs d'usage repris des métadonnées
+        store.upsert(rules)
+        logger.info(f"Migrated {len(rules)} rules from {legacy_path}")
+    return store
@@ -5,10 +5,12 @@ Architecture 3 niveaux : Rapide → Approfondi → Mémoire
 """
 
 import os
+import json
+import hashlib
 import logging
 from datetime import datetime
 from typing import Dict, Optional, List
-from dataclasses import dataclass, field, asdict
+from dataclasses import dataclass, field, asdict, replace
 from pathlib import Path
 import yaml
 
@@ -16,11 +18,20 @@ from levels.ocr_level1 import OCRLevel1
 from levels.ocr_level2 import OCRLevel2
 from levels.ocr_level3 import OCRLevel3
 from memory.ai_memory import AIMemory
+from memory.lifecycle import RetentionPolicy
 from connectors.document_loader import DocumentLoader
 from utils.logger import setup_logger, log_ocr_decision
 from utils.validators import validate_ocr_result
 from utils.document_types import DocumentType
-from utils.type_detector import detect_document_type, get_document_type_confidence
+from utils.type_detector import detect_document_type, get_document_type_confidence, scan_document_type
+from utils.cache import ResultCache, sha256_file
+from utils.deadline import Deadline
+from utils.field_overlay import flatten_fields
+from utils.patterns import PatternRegistry
+from utils.keyword_automaton import KeywordAutomaton
+
+# Version du moteur (intégrée à la clé du cache de résultats)
+ENGINE_VERSION = "1.0.1"
 
 # =============================
 # BOX MAGIC — GOVERNANCE GUARD
@@ -60,10 +71,13 @@ class OCRResult:
     
     # [NEW] MIRROR MODE - Texte OCR brut complet
     ocr_text_raw: str = ""
+    
+    # Budget temps épuisé : résultat partiel (pages ou niveaux non traités)
+    truncated: bool = False
 
     def to_dict(self):
         """Convertit en dictionnaire"""
-        result = asdict(self)
+        result = asdict(replace(self, fields=flatten_fields(self.fields)))
         result['processing_date'] = self.processing_date.isoformat()
         return result
 
@@ -75,6 +89,8 @@ class ProcessingContext:
     entreprise_config: dict
     options: dict = field(default_factory=dict)
     timestamp: datetime = field(default_factory=datetime.now)
+    # Budget du niveau OCR en cours (None = illimité)
+    deadline: Optional[Deadline] = None
 
 
 class OCREngine:
@@ -99,20 +115,35 @@ class OCREngine:
             self.config.get('log_level', 'INFO')
         )
         
-        # Initialisation des niveaux OCR
-        self.ocr_level1 = OCRLevel1(self.config)
-        self.ocr_level2 = OCRLevel2(self.config)
-        self.ocr_level3 = OCRLevel3(self.config)
+        # Initialisation des niveaux OCR (patterns compilés une fois, registre partagé)
+        self.patterns = PatternRegistry.from_config(self.config.get('patterns', {}))
+        self.ocr_level1 = OCRLevel1(self.config, patterns=self.patterns)
+        self.ocr_level2 = OCRLevel2(self.config, patterns=self.patterns)
+        self.ocr_level3 = OCRLevel3(self.config, patterns=self.patterns)
+        
+        # Index des patterns d'identité entreprise (détection en un passage)
+        self.entreprise_automaton = self._build_entreprise_automaton()
         
         # Initialisation de la mémoire
-        memory_path = self.config.get('memory_store_path', 'memory/rules.json')
-        self.memory = AIMemory(memory_path)
+        memory_path = self.config.get('memory_store_path', 'memory/rules.db')
+        self.memory = AIMemory(
+            memory_path,
+            flush_interval=self.config.get('memory_flush_interval_seconds', 5.0),
+            flush_max_pending=self.config.get('memory_flush_max_pending', 50),
+            retention=RetentionPolicy.from_config(self.config.get('memory_retention'))
+        )
         
         # Initialisation des connecteurs
         # [GOV] Cloud Run READ-ONLY: Sheets connector permanently removed
         self.sheets_connector = None
         self.document_loader = DocumentLoader(self.config)
         
+        # Cache des résultats (clé = SHA-256 fichier + version moteur/config)
+        self.result_cache = ResultCache.from_config(
+            self.config.get('result_cache', {}),
+            version=self._compute_cache_version()
+        )
+        
         # Log governance enforcement
         self.logger.info("=" * 80)
         self.logger.info("[GOV] READ_ONLY_ENFORCED=TRUE (no sheets/crm code present)")
@@ -136,6 +167,13 @@ class OCREngine:
         
         return config
     
+    def _compute_cache_version(self) -> str:
+        """Version moteur + empreinte de la configuration chargée"""
+        config_digest = hashlib.sha256(
+            json.dumps(self.config, sort_keys=True, default=str).encode('utf-8')
+        ).hexdigest()[:12]
+        return f"{ENGINE_VERSION}:{config_digest}"
+    
     def process_document(self, 
                         file_path: str, 
                         source_entreprise: str,
@@ -146,7 +184,8 @@ class OCREngine:
         Args:
             file_path: Chemin vers le document (PDF, image)
             source_entreprise: Nom de l'entreprise source
-            options: Options supplémentaires (priority, force_level, etc.)
+            options: Options supplémentaires (priority, force_level,
+                deadline_seconds, etc.)
         
         Returns:
             OCRResult avec tous les champs extraits
@@ -158,9 +197,93 @@ class OCREngine:
         self.logger.info(f"[{document_id}] File: {file_path}")
         self.logger.info(f"[{document_id}] Source entreprise: {source_entreprise}")
         
+        content_hash = None
+        if self.result_cache is not None and os.path.exists(file_path):
+            content_hash = sha256_file(file_path)
+        
+        return self._process(
+            lambda deadline: self.document_loader.load(file_path, deadline=deadline),
+            document_id, content_hash, source_entreprise, options
+        )
+    
+    def process_bytes(self,
+                      data: bytes,
+                      filename: str,
+                      source_entreprise: str,
+                      options: Optional[dict] = None) -> OCRResult:
+        """
+        Traite un document reçu en mémoire (upload), sans fichier temporaire
+        
+        Args:
+            data: Contenu du fichier (bytes ou memoryview)
+            filename: Nom d'origine (extension utilisée pour le format)
+            source_entreprise: Nom de l'entreprise source
+            options: Options supplémentaires (priority, force_level,
+                deadline_seconds, etc.)
+        
+        Returns:
+            OCRResult avec tous les champs extraits
+        """
+        options = options or {}
+        document_id = self._generate_document_id(filename)
+        
+        self.logger.info(f"[{document_id}] Starting OCR processing")
+        self.logger.info(f"[{document_id}] Upload: {filename} ({len(data)} bytes, in memory)")
+        self.logger.info(f"[{document_id}] Source entreprise: {source_entreprise}")
+        
+        content_hash = None
+        if self.result_cache is not None:
+            content_hash = hashlib.sha256(data).hexdigest()
+        
+        return self._process(
+            lambda deadline: self.document_loader.load_bytes(data, filename, deadline=deadline),
+            document_id, content_hash, source_entreprise, options
+        )
+    
+    def _process(self,
+                 load_document,
+                 document_id: str,
+                 content_hash: Optional[str],
+                 source_entreprise: str,
+                 options: dict) -> OCRResult:
+        """
+        Pipeline commun : cache → chargement → type → mémoire / OCR progressif
+        
+        Échéance globale = options['deadline_seconds'], sinon
+        processing.deadline_seconds (absent = illimitée). Dépassée, le
+        meilleur résultat partiel est retourné avec `truncated=True`.
+        
+        Args:
+            load_document: Callable(deadline) retournant le Document chargé
+            document_id: ID du document
+            content_hash: SHA-256 du contenu (None = pas de cache)
+            source_entreprise: Nom de l'entreprise source
+            options: Options de traitement
+        """
+        deadline = Deadline(
+            options.get('deadline_seconds')
+            or (self.config.get('processing', {}) or {}).get('deadline_seconds')
+        )
+        
+        # 0. Cache des résultats (soumissions répétées du même fichier)
+        cache_key = None
+        if self.result_cache is not None and content_hash:
+            cache_key = self.result_cache.make_key(
+                content_hash,
+                source_entreprise=source_entreprise,
+                options={k: v for k, v in options.items() if k != 'deadline_seconds'}
+            )
+            if not options.get('force_full_ocr', False):
+                cached = self.result_cache.get(cache_key)
+                if cached is not None:
+                    cached.document_id = document_id
+                    cached.logs.append("RESULT_CACHE=HIT")
+                    self.logger.info(f"[{document_id}] Result cache hit, pipeline skipped")
+                    return cached
+        
         try:
             # 1. Chargement du document
-            document = self.document_loader.load(file_path)
+            document = load_document(deadline)
             self.logger.info(f"[{document_id}] Document loaded successfully")
             
             # [MIRROR MODE] Stocker texte OCR brut complet
@@ -168,8 +291,11 @@ class OCREngine:
             self.logger.info(f"[{document_id}] OCR text length: {len(ocr_text_raw)} characters")
             
             # 1.1 Détection type de document (basée sur le texte extrait)
-            detected_doc_type = detect_document_type(document.get_text())
-            type_confidence = get_document_type_confidence(document.get_text(), detected_doc_type)
+            # La vue du document mémorise majuscules, lignes... pour toutes les étapes
+            # (une seule analyse des mots-clés : type, confiance et mots-clés trouvés)
+            detected_doc_type = detect_document_type(document.view)
+            type_confidence = get_document_type_confidence(document.view, detected_doc_type)
+            type_keywords = scan_document_type(document.view).matched.get(detected_doc_type, [])
             
             # [FIX] Logging détaillé métadonnées OCR
             ocr_mode = document.metadata.get('ocr_mode', 'UNKNOWN')
@@ -181,6 +307,7 @@ class OCREngine:
             self.logger.info(f"[{document_id}]   PDF_TEXT_DETECTED  = {pdf_text_detected}")
             self.logger.info(f"[{document_id}]   DOCUMENT_TYPE      = {detected_doc_type}")
             self.logger.info(f"[{document_id}]   TYPE_CONFIDENCE    = {type_confidence:.2%}")
+            self.logger.info(f"[{document_id}]   TYPE_KEYWORDS      = {type_keywords}")
             self.logger.info("=" * 80)
             
             # 2. Préparation du contexte
@@ -197,21 +324,37 @@ class OCREngine:
             if matching_rule and not options.get('force_full_ocr', False):
                 self.logger.info(f"[{document_id}] Applying memory rule: {matching_rule.id}")
                 result = self._apply_memory_rule(document, matching_rule, context, document_id)
+                # Usage compté seulement si la règle a produit le résultat
+                self.memory.record_result(matching_rule, result is not None)
+            else:
+                result = None
+            if result is not None:
                 # Ajouter le type détecté
                 result.document_type = detected_doc_type
             else:
                 # 5. Traitement OCR progressif
-                result = self._progressive_ocr(document, context, document_id)
+                result = self._progressive_ocr(document, context, document_id, deadline)
                 # Remplacer le document_type par celui détecté (plus fiable que OCR1)
                 result.document_type = detected_doc_type
             
+            # Champs des niveaux 2/3 en couches : aplatis une seule fois
+            result.fields = flatten_fields(result.fields)
+            
             # [MIRROR MODE] Ajouter texte OCR brut au résultat
             result.ocr_text_raw = ocr_text_raw
             
+            # Pages non OCRisées faute de temps
+            if document.metadata.get('truncated'):
+                result.truncated = True
+            
             # 5.1 Ajouter métadonnées OCR au résultat
             result.logs.append(f"OCR_MODE={ocr_mode}")
             result.logs.append(f"PDF_TEXT_DETECTED={pdf_text_detected}")
             result.logs.append(f"DOCUMENT_TYPE={detected_doc_type} (confidence: {type_confidence:.2f})")
+            if type_keywords:
+                result.logs.append(f"DOCUMENT_TYPE_KEYWORDS={', '.join(type_keywords)}")
+            if result.truncated:
+                result.logs.append("TRUNCATED=true (time budget exhausted)")
             
             # 6. Validation finale
             validation_result = validate_ocr_result(result)
@@ -225,6 +368,10 @@ class OCREngine:
             # 8. Log final
             self._log_final_result(result)
             
+            # 9. Mise en cache du résultat (jamais un résultat partiel)
+            if cache_key is not None and not result.truncated:
+                self.result_cache.put(cache_key, result)
+            
             return result
             
         except Exception as e:
@@ -233,14 +380,22 @@ class OCREngine:
             # Error logged locally only, Apps Script handles persistence
             raise
     
-    def _progressive_ocr(self, document, context: ProcessingContext, document_id: str) -> OCRResult:
+    def _progressive_ocr(self, document, context: ProcessingContext, document_id: str,
+                         deadline: Optional[Deadline] = None) -> OCRResult:
         """
         Traitement OCR progressif : Level 1 → Level 2 → Level 3
+        
+        Chaque niveau reçoit `context.deadline` = min(échéance globale,
+        ocr_levelN.timeout_seconds). Échéance globale dépassée : les
+        niveaux suivants sont sautés et le résultat courant est retourné.
         """
+        deadline = deadline or Deadline()
+        
         # LEVEL 1 - RAPIDE & STABLE
         self.logger.info(f"[{document_id}] Starting OCR Level 1")
         log_ocr_decision(self.logger, document_id, 1, "Starting fast extraction")
         
+        context.deadline = self._level_deadline(deadline, 'ocr_level1')
         result = self.ocr_level1.process(document, context)
         result.document_id = document_id
         
@@ -260,12 +415,18 @@ class OCREngine:
             self.logger.info(f"[{document_id}] OCR Level 1 sufficient, stopping here")
             return result
         
+        if deadline.expired():
+            return self._truncate(result, document_id, 2)
+        
         # LEVEL 2 - APPROFONDI
         self.logger.info(f"[{document_id}] Escalating to OCR Level 2")
         log_ocr_decision(self.logger, document_id, 2, 
                         f"Level 1 insufficient (confidence: {result.confidence:.2f}), starting deep analysis")
         
+        truncated = result.truncated
+        context.deadline = self._level_deadline(deadline, 'ocr_level2')
         result = self.ocr_level2.process(document, result, context)
+        result.truncated = result.truncated or truncated
         
         self.logger.info(f"[{document_id}] OCR Level 2 completed (confidence: {result.confidence:.2f})")
         log_ocr_decision(self.logger, document_id, 2, 
@@ -276,27 +437,58 @@ class OCREngine:
             self.logger.info(f"[{document_id}] OCR Level 2 sufficient, stopping here")
             return result
         
+        if deadline.expired():
+            return self._truncate(result, document_id, 3)
+        
         # LEVEL 3 - CONTRÔLE & MÉMOIRE (RARE)
         self.logger.warning(f"[{document_id}] Escalating to OCR Level 3 (RARE)")
         log_ocr_decision(self.logger, document_id, 3, 
                         "Level 2 insufficient or unknown pattern, activating memory creation")
         
+        truncated = result.truncated
+        context.deadline = self._level_deadline(deadline, 'ocr_level3')
         result = self.ocr_level3.process(document, result, context)
+        result.truncated = result.truncated or truncated
         
         self.logger.info(f"[{document_id}] OCR Level 3 completed (confidence: {result.confidence:.2f})")
-        if result.rule_created:
-            self.logger.info(f"[{document_id}] Memory rule created: {result.rule_created.get('id')}")
+        if result.rule_created and self.config.get('ocr_level3', {}).get('create_rules', True):
+            # Enregistrement : les documents similaires passeront par la règle (level 0)
+            rule_id = self.memory.save_rule(result.rule_created)
+            self.logger.info(f"[{document_id}] Memory rule created: {rule_id}")
             log_ocr_decision(self.logger, document_id, 3, 
-                            f"Rule created: {result.rule_created.get('id')}, future similar documents will be faster")
+                            f"Rule created: {rule_id}, future similar documents will be faster")
         
         return result
     
-    def _apply_memory_rule(self, document, rule, context: ProcessingContext, document_id: str) -> OCRResult:
-        """Applique une règle mémoire existante (bypass OCR classique)"""
+    def _level_deadline(self, deadline: Deadline, level_key: str) -> Deadline:
+        """Budget d'un niveau : min(échéance globale, <level>.timeout_seconds)"""
+        return deadline.child((self.config.get(level_key, {}) or {}).get('timeout_seconds'))
+    
+    def _truncate(self, result: OCRResult, document_id: str, skipped_level: int) -> OCRResult:
+        """Échéance globale dépassée : retourne le résultat courant, marqué partiel"""
+        self.logger.warning(f"[{document_id}] Time budget exhausted, OCR Level {skipped_level} skipped")
+        result.truncated = True
+        result.logs.append(f"DEADLINE: Level {skipped_level}+ skipped")
+        return result
+    
+    def _apply_memory_rule(self, document, rule, context: ProcessingContext, document_id: str) -> Optional[OCRResult]:
+        """
+        Applique une règle mémoire existante (bypass OCR classique)
+        
+        Returns:
+            None si un champ de la règle est introuvable dans ce document
+            (règle d'avant les extracteurs, gabarit modifié) : OCR progressif
+        """
         self.logger.info(f"[{document_id}] Applying memory rule: {rule.name}")
         
-        # Application de la règle
-        fields = rule.apply(document)
+        # Ré-extraction des champs par les extracteurs compilés de la règle
+        fields, missing = rule.extract(document)
+        if missing:
+            self.logger.info(
+                f"[{document_id}] Memory rule {rule.id} incomplete "
+                f"(missing: {', '.join(missing)}), falling back to progressive OCR"
+            )
+            return None
         
         # Construction du résultat
         result = OCRResult(
@@ -315,6 +507,34 @@ class OCREngine:
         
         return result
     
+    # Nature des patterns d'identité, par priorité décroissante
+    _ENTREPRISE_HIT_KINDS = ('logo', 'footer', 'SIRET')
+    
+    def _build_entreprise_automaton(self) -> KeywordAutomaton:
+        """
+        Automate des patterns d'identité (logo, footer, SIRET) de config/entreprises.yaml
+        
+        Payload = (rang entreprise, nature, rang pattern, nom, pattern) :
+        le plus petit payload trouvé est l'entreprise détectée.
+        """
+        automaton = KeywordAutomaton()
+        entreprises = self.config.get('entreprises', {}).get('entreprises', [])
+        
+        for rank, entreprise in enumerate(entreprises):
+            name = entreprise['name']
+            identity = entreprise.get('identity', {})
+            kinds = (identity.get('logo_patterns', []), identity.get('footer_patterns', []))
+            for kind, patterns in enumerate(kinds):
+                for index, pattern in enumerate(patterns):
+                    automaton.add(pattern.lower(), (rank, kind, index, name, pattern))
+            
+            # SIRET comparé tel quel au texte en minuscules
+            siret = entreprise.get('siret', '')
+            if siret:
+                automaton.add(str(siret), (rank, 2, 0, name, siret))
+        
+        return automaton.build()
+    
     def _detect_entreprise(self, document) -> str:
         """
         Détecte l'entreprise source via patterns
@@ -326,33 +546,13 @@ class OCREngine:
         
         [FIX] Si aucun pattern trouvé → retourne "UNKNOWN" au lieu de default
         """
-        entreprises = self.config.get('entreprises', {}).get('entreprises', [])
-        
-        document_text = document.get_text().lower()
-        
-        for entreprise in entreprises:
-            name = entreprise['name']
-            identity = entreprise.get('identity', {})
-            
-            # Vérification patterns logo
-            logo_patterns = identity.get('logo_patterns', [])
-            for pattern in logo_patterns:
-                if pattern.lower() in document_text:
-                    self.logger.info(f"[AUTO-DETECT] ✅ Entreprise détectée via logo: {pattern} → {name}")
-                    return name
-            
-            # Vérification footer patterns
-            footer_patterns = identity.get('footer_patterns', [])
-            for pattern in footer_patterns:
-                if pattern.lower() in document_text:
-                    self.logger.info(f"[AUTO-DETECT] ✅ Entreprise détectée via footer: {pattern} → {name}")
-                    return name
-            
-            # Vérification SIRET
-            siret = entreprise.get('siret', '')
-            if siret and siret in document_text:
-                self.logger.info(f"[AUTO-DETECT] ✅ Entreprise détectée via SIRET: {siret} → {name}")
-                return name
+        # Toutes les occurrences en un passage ; priorité inchangée :
+        # ordre des entreprises, puis logo < footer < SIRET, puis ordre des patterns
+        hits = self.entreprise_automaton.payloads(document.view.lower)
+        if hits:
+            _, kind, _, name, pattern = min(hits)
+            self.logger.info(f"[AUTO-DETECT] ✅ Entreprise détectée via {self._ENTREPRISE_HIT_KINDS[kind]}: {pattern} → {name}")
+            return name
         
         # [FIX] AUCUN PATTERN TROUVÉ = UNKNOWN (pas de default arbitraire)
         self.logger.warning(f"[AUTO-DETECT] ❌ Aucun pattern d'entreprise trouvé → UNKNOWN")
@@ -392,10 +592,18 @@ class OCREngine:
         filename = Path(file_path).stem
         return f"doc_{timestamp}_{filename}"
     
+    def close(self):
+        """Libère les ressources du moteur (pool de processus OCR, compteurs mémoire)"""
+        self.document_loader.close()
+        self.memory.close()
+    
     def get_statistics(self) -> dict:
         """Retourne les statistiques du moteur OCR"""
         return {
             'memory_rules': self.memory.get_rule_stats(),
+            'result_cache': self.result_cache.stats() if self.result_cache else None,
+            'page_cache': self.document_loader.page_cache.stats() if self.document_loader.page_cache else None,
+            'patterns': self.patterns.stats(top=self.config.get('patterns', {}).get('stats_top', 20)),
             'config': {
                 'entreprises_count': len(self.config.get('entreprises', {}).get('entreprises', [])),
                 'log_level': self.config.get('log_level', 'INFO'),
@@ -0,0 +1,152 @@
+"""
+BOX MAGIC OCR INTELLIGENT - Prefork server
+
+Builds the OCREngine once in the parent process (runtime checks, YAML
+config, compiled patterns, memory rules), then forks N uvicorn workers
+sharing that state copy-on-write and listening on the same socket.
+
+Usage:
+    OCR_WORKERS=4 python serve.py
+
+Environment:
+    PORT          Listening port (default 8080)
+    OCR_WORKERS   Number of worker processes (default WEB_CONCURRENCY, else 1)
+"""
+
+import gc
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import time
+
+import uvicorn
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import main
+from utils.logger import setup_logger
+
+logger = setup_logger("serve", level="INFO")
+
+# Délai accordé aux workers pour terminer leurs requêtes à l'arrêt
+SHUTDOWN_TIMEOUT = 30
+
+
+def _worker_count() -> int:
+    """Nombre de workers demandé (OCR_WORKERS, WEB_CONCURRENCY, sinon 1)"""
+    value = os.getenv("OCR_WORKERS") or os.getenv("WEB_CONCURRENCY") or "1"
+    return max(1, int(value))
+
+
+def _bind_socket(host: str, port: int) -> socket.socket:
+    """Socket d'écoute partagé par tous les workers"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _run_worker(sock: socket.socket):
+    """Boucle uvicorn d'un worker (processus enfant)"""
+    # Signaux par défaut : uvicorn installe ses propres handlers
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+
+    config = uvicorn.Config(main.app, log_level="info", timeout_graceful_shutdown=SHUTDOWN_TIMEOUT)
+    server = uvicorn.Server(config)
+    server.run(sockets=[sock])
+
+
+def _spawn(sock: socket.socket) -> int:
+    """Fork un worker et retourne son pid"""
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            _run_worker(sock)
+        except BaseException:
+            logger.exception("Worker crashed")
+            code = 1
+        finally:
+            os._exit(code)
+    logger.info(f"Worker started (pid={pid})")
+    return pid
+
+
+def serve(host: str = "0.0.0.0", port: int = 8080, workers: int = 1):
+    """
+    Lance le serveur prefork
+
+    Le moteur est construit avant le fork ; les pools (processus OCR,
+    executor, sémaphore) restent paresseux et sont créés dans chaque worker.
+    """
+    engine = main.preload_engine()
+
+    # Publication des nouvelles règles mémoire à tous les workers
+    engine.memory.attach_generation(multiprocessing.Value('Q', 0))
+
+    sock = _bind_socket(host, port)
+
+    # Aucune connexion SQLite ne doit traverser le fork : chaque worker
+    # ouvre la sienne au premier accès aux règles
+    engine.memory.before_fork()
+
+    # Objets du parent hors du GC : évite que les passes de collecte des
+    # workers ne touchent leurs en-têtes et dupliquent les pages partagées
+    gc.freeze()
+
+    logger.info(f"Prefork server listening on {host}:{port} with {workers} worker(s)")
+
+    children = {_spawn(sock) for _ in range(workers)}
+    stopping = False
+
+    def _stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+
+    deadline = None
+    while children:
+        if stopping and deadline is None:
+            deadline = time.monotonic() + SHUTDOWN_TIMEOUT + 5
+
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+
+        if pid == 0:
+            if deadline is not None and time.monotonic() > deadline:
+                logger.warning("Workers did not stop in time, killing them")
+                for child in children:
+                    try:
+                        os.kill(child, signal.SIGKILL)
+                    except ProcessLookupError:
+                        pass
+                deadline = float('inf')
+            time.sleep(0.2)
+            continue
+
+        children.discard(pid)
+        if not stopping:
+            logger.warning(f"Worker {pid} exited (status={status}), restarting")
+            children.add(_spawn(sock))
+
+    sock.close()
+    engine.close()
+    logger.info("Prefork server stopped")
+
+
+if __name__ == "__main__":
+    serve(port=int(os.getenv("PORT", 8080)), workers=_worker_count())
@@ -0,0 +1,79 @@
+"""
+Tests du contrôle d'admission
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils.admission import AdmissionController, AdmissionRejected, probe_pdf_pages
+
+
+class TestAdmission:
+    """Tests du budget de coût et de la file d'attente"""
+
+    def test_probe_pdf_pages(self):
+        pdf = b'%PDF-1.4 1 0 obj << /Type /Pages /Count 12 /Kids [...] >> endobj'
+        assert probe_pdf_pages(pdf) == 12
+        assert probe_pdf_pages(b'%PDF-1.4 /Type /Page /Type /Page /Type /Pages') == 2
+        assert probe_pdf_pages(b'%PDF-1.5 compressed') == 1
+
+    def test_cost_caps_raster_pages(self):
+        controller = AdmissionController(bytes_per_unit=1000, max_cost_pages=2)
+        data = b'%PDF-1.4 /Count 40' + b'0' * 982
+
+        assert controller.estimate_cost(data, 'scan.pdf') == 1 + 2 + 1
+
+    def test_queue_full_then_timeout(self):
+        async def scenario():
+            controller = AdmissionController(max_cost=2, max_waiting=1, max_wait_seconds=0.05)
+            release = asyncio.Event()
+
+            async def hold():
+                async with controller.admit(2):
+                    await release.wait()
+
+            holder = asyncio.create_task(hold())
+            await asyncio.sleep(0)
+            waiter = asyncio.create_task(controller.admit(1).__aenter__())
+            await asyncio.sleep(0)
+
+            # Budget occupé et file pleine : refus immédiat
+            with pytest.raises(AdmissionRejected) as full:
+                async with controller.admit(1):
+                    pass
+            assert full.value.status_code == 429
+
+            # Attente trop longue : 503
+            with pytest.raises(AdmissionRejected) as busy:
+                await waiter
+            assert busy.value.status_code == 503
+            assert busy.value.retry_after >= 1
+
+            release.set()
+            await holder
+            return controller.stats()
+
+        stats = asyncio.run(scenario())
+        assert stats['in_use'] == 0
+        assert stats['rejected_full'] == 1
+        assert stats['rejected_timeout'] == 1
+
+    def test_waiters_admitted_in_order(self):
+        async def scenario():
+            controller = AdmissionController(max_cost=1, max_waiting=4, max_wait_seconds=1)
+            order = []
+
+            async def job(name):
+                async with controller.admit(1):
+                    order.append(name)
+                    await asyncio.sleep(0.01)
+
+            await asyncio.gather(*(job(n) for n in 'abc'))
+            return order
+
+        assert asyncio.run(scenario()) == ['a', 'b', 'c']
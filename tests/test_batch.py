@@ -0,0 +1,40 @@
+"""
+Tests de l'endpoint /ocr/batch
+"""
+
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")
+
+from fastapi.testclient import TestClient
+
+import main
+from ocr_engine import OCREngine
+
+
+class TestBatch:
+    """Un lot est admis une seule fois"""
+
+    def test_batch_larger_than_max_waiting_completes(self, monkeypatch):
+        engine = OCREngine("config/config.yaml")
+        engine.config['admission'] = {'max_cost': 2, 'max_waiting': 2, 'max_wait_seconds': 1}
+        engine.config['jobs'] = {'enabled': False}
+        monkeypatch.setattr(main, 'ocr_engine', engine)
+
+        files = [
+            ('files', (f"doc{i}.txt", f"FACTURE N° {i}\nTotal TTC {i},00 €".encode(), 'text/plain'))
+            for i in range(6)
+        ]
+        with TestClient(main.app) as client:
+            response = client.post('/ocr/batch', files=files)
+
+        items = [json.loads(line) for line in response.text.splitlines()]
+        assert sorted(item['index'] for item in items) == list(range(6))
+        assert [item['status'] for item in items] == ['ok'] * 6
@@ -0,0 +1,109 @@
+"""
+Tests des caches OCR (LRU mémoire, disque, résultats)
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils.cache import LRUCache, ResultCache
+
+
+class TestLRUCache:
+    """Tests du cache LRU mémoire"""
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(max_entries=2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        assert cache.get('a') == 1  # 'a' devient récent
+        cache.put('c', 3)
+
+        assert cache.get('b') is None
+        assert cache.get('a') == 1
+        assert cache.stats()['evictions'] == 1
+
+    def test_byte_budget(self):
+        cache = LRUCache(max_entries=100, max_bytes=10)
+        cache.put('a', 'x', size=6)
+        cache.put('b', 'y', size=6)
+
+        assert cache.get('a') is None
+        assert cache.get('b') == 'y'
+        assert cache.stats()['bytes'] == 6
+
+
+class TestResultCache:
+    """Tests du cache de résultats complets"""
+
+    def test_memory_roundtrip_returns_copy(self):
+        cache = ResultCache(version='test')
+        key = cache.make_key('abc', source_entreprise='auto-detect')
+        cache.put(key, {'fields': [1, 2]})
+
+        first = cache.get(key)
+        first['fields'].append(3)
+
+        assert cache.get(key) == {'fields': [1, 2]}
+        assert cache.stats()['hits'] == 2
+
+    def test_key_depends_on_version_and_params(self):
+        v1 = ResultCache(version='1')
+        v2 = ResultCache(version='2')
+
+        assert v1.make_key('abc') != v2.make_key('abc')
+        assert v1.make_key('abc', source_entreprise='A') != v1.make_key('abc', source_entreprise='B')
+
+    def test_disk_tier_survives_memory_eviction(self, tmp_path):
+        cache = ResultCache(version='test', memory_max_entries=1, disk_path=str(tmp_path))
+        cache.put('k1', 'first')
+        cache.put('k2', 'second')  # évince k1 du tier mémoire
+
+        assert cache.get('k1') == 'first'
+        assert cache.stats()['disk']['hits'] == 1
+
+    def test_disk_tier_size_eviction(self, tmp_path):
+        cache = ResultCache(version='test', disk_path=str(tmp_path), disk_max_bytes=100)
+        cache.put('k1', 'a' * 60)
+        cache.put('k2', 'b' * 60)
+
+        assert cache.disk.stats()['bytes'] <= 100
+        assert cache.disk.stats()['evictions'] == 1
+
+
+class TestPageCache:
+    """Tests du cache texte par page du DocumentLoader"""
+
+    def test_identical_pages_reach_tesseract_once(self, monkeypatch):
+        from PIL import Image
+        import connectors.document_loader as document_loader
+
+        calls = []
+
+        def fake_ocr(image, lang, timeout=0):
+            calls.append(image.getpixel((0, 0)))
+            return f"page {image.getpixel((0, 0))}"
+
+        monkeypatch.setattr(document_loader, '_ocr_page_image', fake_ocr)
+        loader = document_loader.DocumentLoader({
+            'processing': {'parallel_enabled': False},
+            'page_cache': {'enabled': True}
+        })
+
+        cgv = Image.new('L', (8, 8), color=7)
+        cover = Image.new('L', (8, 8), color=3)
+        texts = list(loader._iter_ocr_pages([cover, cgv, cgv.copy(), cover.copy()]))
+
+        assert texts == ['page 3', 'page 7', 'page 7', 'page 3']
+        assert calls == [3, 7]
+        assert loader.page_cache.stats()['hits'] == 2
+
+    def test_dpi_is_part_of_the_key(self):
+        from PIL import Image
+        from connectors.document_loader import DocumentLoader
+
+        loader = DocumentLoader({'page_cache': {'enabled': True}})
+        image = Image.new('L', (8, 8))
+
+        assert loader._page_cache_key(image, 'fra', 200) != loader._page_cache_key(image, 'fra', 300)
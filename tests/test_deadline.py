@@ -0,0 +1,67 @@
+"""
+Tests des échéances de traitement
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils.deadline import Deadline, DeadlineExceeded
+
+
+class TestDeadline:
+    """Tests de l'échéance et des sous-budgets"""
+
+    def test_unlimited(self):
+        deadline = Deadline()
+        assert deadline.remaining() is None
+        assert not deadline.expired()
+        assert deadline.timeout(cap=5) == 5
+
+    def test_child_never_outlives_parent(self):
+        parent = Deadline(1)
+        assert parent.child(60).remaining() <= 1
+        assert parent.child(None).expires_at == parent.expires_at
+        assert Deadline().child(2).remaining() <= 2
+
+    def test_check_raises_when_expired(self):
+        with pytest.raises(DeadlineExceeded):
+            Deadline(0).check("level 1")
+
+
+class TestTruncation:
+    """Résultats partiels quand le budget est épuisé"""
+
+    def test_level1_returns_partial_result(self):
+        from levels.ocr_level1 import OCRLevel1
+        from connectors.document_loader import Document
+        from ocr_engine import ProcessingContext
+
+        document = Document('a.txt', "FACTURE N° F-1\nTotal TTC : 120,00 €\n")
+        context = ProcessingContext('UNKNOWN', {}, deadline=Deadline(0))
+
+        result = OCRLevel1({}).process(document, context)
+
+        assert result.truncated
+        assert list(result.fields) == ['texte_ocr_brut']
+
+    def test_tesseract_timeout_yields_none(self, monkeypatch):
+        from PIL import Image
+        import connectors.document_loader as document_loader
+
+        timeouts = []
+
+        def slow_ocr(image, lang, timeout=0):
+            timeouts.append(timeout)
+            raise RuntimeError('Tesseract process timeout')
+
+        monkeypatch.setattr(document_loader, '_ocr_page_image', slow_ocr)
+        loader = document_loader.DocumentLoader({'processing': {'page_timeout_seconds': 3}})
+
+        texts = list(loader._iter_ocr_pages([Image.new('L', (4, 4))], deadline=Deadline(30)))
+
+        assert texts == [None]
+        assert 0 < timeouts[0] <= 3
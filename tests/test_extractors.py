@@ -0,0 +1,83 @@
+"""
+Tests des extracteurs compilés des règles mémoire
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from memory.ai_memory import Rule
+from memory.extractors import CompiledRule, learn_extractor
+from utils.text_view import TextView
+
+INVOICE = """MARTIN PLOMBERIE
+12 rue des Lilas
+SIRET 123 456 789 00012
+Facture n° {numero}
+Date : {date}
+
+Désignation          Quantité
+Remplacement chauffe-eau    1
+
+Total HT
+{ht}
+TVA 20% : {tva}
+Total TTC : {ttc}
+Merci de votre confiance"""
+
+
+def _invoice(numero, date, ht, tva, ttc):
+    return TextView(INVOICE.format(numero=numero, date=date, ht=ht, tva=tva, ttc=ttc))
+
+
+class TestCompiledRule:
+    """Ré-extraction sur un nouveau document du même gabarit"""
+
+    def test_rule_learned_on_one_document_reads_the_next(self):
+        source = _invoice('F-2026-0012', '12/03/2026', '1 250,00', '250,00', '1 500,00')
+        values = {
+            'emetteur_nom': 'MARTIN PLOMBERIE',
+            'numero_facture': 'F-2026-0012',
+            'date_emission': '2026-03-12',
+            'total_ht': 1250.0,
+            'montant_tva': 250.0,
+            'total_ttc': 1500.0,
+        }
+        actions = {}
+        for field_name, value in values.items():
+            extractor = learn_extractor(field_name, value, source)
+            assert extractor is not None, field_name
+            actions[field_name] = {'method': 'regex', 'value': value, 'confidence': 0.9, 'extractor': extractor}
+
+        assert actions['total_ht']['extractor']['offset'] == 1
+        assert CompiledRule(actions).extract(source) == (values, [])
+
+        target = _invoice('F-2026-0047', '02/04/2026', '980,40', '196,08', '1 176,48')
+        extracted, missing = CompiledRule(actions).extract(target)
+
+        assert missing == []
+        assert extracted == {
+            'emetteur_nom': 'MARTIN PLOMBERIE',
+            'numero_facture': 'F-2026-0047',
+            'date_emission': '2026-04-02',
+            'total_ht': 980.4,
+            'montant_tva': 196.08,
+            'total_ttc': 1176.48,
+        }
+
+    def test_legacy_rule_without_locator_reports_missing_fields(self):
+        rule = Rule({
+            'id': 'legacy', 'name': 'legacy', 'conditions': {},
+            'actions': {
+                'numero_facture': {'method': 'context_keyword', 'value': 'F-2026-0012', 'confidence': 0.9},
+                'devise': {'method': 'fixed_value', 'value': 'EUR', 'confidence': 0.95},
+            },
+            'metadata': {},
+        })
+
+        fields, missing = rule.extract(_invoice('F-2026-0047', '02/04/2026', '1,00', '0,20', '1,20'))
+
+        assert missing == ['numero_facture']
+        assert fields['devise'].value == 'EUR'
+        assert fields['devise'].extraction_method == 'memory_rule'
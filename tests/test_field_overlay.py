@@ -0,0 +1,48 @@
+"""
+Tests des champs en copie sur écriture entre niveaux
+"""
+
+import sys
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from ocr_engine import FieldValue, OCRResult
+from utils.field_overlay import FieldOverlay, flatten_fields
+
+
+class TestFieldOverlay:
+    """Un niveau n'écrit que les champs qu'il modifie"""
+
+    def test_levels_record_only_changed_fields(self):
+        raw = FieldValue(value="x" * 100_000, confidence=1.0, extraction_method='document_text')
+        level1 = {'texte_ocr_brut': raw, 'total_ht': FieldValue(100.0, 0.5)}
+
+        level2 = FieldOverlay.over(level1)
+        level2['total_ht'] = FieldValue(100.0, 0.9)
+        level2['total_ttc'] = FieldValue(120.0, 0.8)
+        level3 = FieldOverlay.over(level2)
+        level3['montant_tva'] = FieldValue(20.0, 0.95)
+
+        assert level1['total_ht'].confidence == 0.5
+        assert list(level3.changed) == ['montant_tva']
+        assert len(level3.maps) == 3
+        flat = flatten_fields(level3)
+        assert type(flat) is dict
+        assert list(flat) == ['texte_ocr_brut', 'total_ht', 'total_ttc', 'montant_tva']
+        assert flat['texte_ocr_brut'] is raw
+        assert flat['total_ht'].confidence == 0.9
+
+    def test_result_with_overlay_serializes(self):
+        fields = FieldOverlay.over({'numero_facture': FieldValue('F-1', 0.9)})
+        fields['date_emission'] = FieldValue('2026-03-12', 0.95)
+        result = OCRResult(
+            document_id='doc', document_type='FACTURE', level=2, confidence=0.9,
+            entreprise_source='ACME', fields=fields, processing_date=datetime.now()
+        )
+
+        data = result.to_dict()
+
+        assert data['fields']['numero_facture']['value'] == 'F-1'
+        assert data['fields']['date_emission']['value'] == '2026-03-12'
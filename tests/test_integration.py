@@ -103,6 +103,276 @@ class TestMemorySystem:
             if os.path.exists(temp_path):
                 os.remove(temp_path)
 
+    def test_rules_published_between_workers(self, tmp_path):
+        """Une règle créée par un worker est visible des autres (mode prefork)"""
+        import multiprocessing
+
+        path = str(tmp_path / 'rules.json')
+        generation = multiprocessing.Value('Q', 0)
+        worker_a = AIMemory(path)
+        worker_b = AIMemory(path)
+        worker_a.attach_generation(generation)
+        worker_b.attach_generation(generation)
+
+        for memory, rule_id in ((worker_a, 'rule_a'), (worker_b, 'rule_b')):
+            memory.save_rule({
+                'id': rule_id,
+                'name': rule_id,
+                'conditions': {'signature': rule_id},
+                'actions': {},
+                'metadata': {'usage_count': 0}
+            })
+
+        # worker_b a rechargé avant d'écrire : aucune règle écrasée
+        assert [r.id for r in AIMemory(path).rules] == ['rule_a', 'rule_b']
+        assert worker_a.get_rule_stats()['total_rules'] == 2
+
+    def _usage_memory(self, path, **kwargs):
+        memory = AIMemory(path, **kwargs)
+        memory.save_rule({
+            'id': 'rule_usage',
+            'name': 'rule_usage',
+            'conditions': {'document_type': 'facture'},
+            'actions': {},
+            'metadata': {'entreprise': 'ACME', 'usage_count': 0}
+        })
+        return memory
+
+    def _apply(self, memory, document, context, ok=True):
+        """Règle trouvée puis appliquée (usage compté après application)"""
+        rule = memory.find_matching_rule(document, context)
+        if rule is not None:
+            memory.record_result(rule, ok)
+        return rule
+
+    def _stored_usage(self, path):
+        return AIMemory(path).rules[0].metadata['usage_count']
+
+    def test_usage_counters_written_behind(self, tmp_path):
+        """Les usages ne réécrivent le fichier qu'après N usages"""
+        from types import SimpleNamespace
+
+        path = str(tmp_path / 'rules.json')
+        memory = self._usage_memory(path, flush_interval=60, flush_max_pending=3)
+        context = SimpleNamespace(source_entreprise='ACME')
+
+        for _ in range(2):
+            assert self._apply(memory, "FACTURE", context).id == 'rule_usage'
+        assert memory.pending_usage == 2
+        assert self._stored_usage(path) == 0
+
+        self._apply(memory, "FACTURE", context)
+        assert memory.pending_usage == 0
+        assert self._stored_usage(path) == 3
+
+        self._apply(memory, "FACTURE", context)
+        memory.close()
+        assert self._stored_usage(path) == 4
+
+    def test_usage_counted_after_apply_only(self, tmp_path):
+        """Règle trouvée mais non appliquée : aucun usage ; échec : success_rate en baisse"""
+        from types import SimpleNamespace
+
+        path = str(tmp_path / 'rules.db')
+        memory = self._usage_memory(path, flush_interval=60)
+        context = SimpleNamespace(source_entreprise='ACME')
+
+        memory.find_matching_rule("FACTURE", context)
+        assert memory.pending_usage == 0
+
+        self._apply(memory, "FACTURE", context)
+        self._apply(memory, "FACTURE", context, ok=False)
+        memory.flush()
+
+        stored = AIMemory(path).rules[0].metadata
+        assert stored['usage_count'] == 1
+        assert stored['failure_count'] == 1
+        assert stored['success_rate'] == 0.5
+
+    def test_usage_flushed_by_timer(self, tmp_path):
+        """Usage en attente écrit au plus tard après flush_interval"""
+        import time
+        from types import SimpleNamespace
+
+        path = str(tmp_path / 'rules.json')
+        memory = self._usage_memory(path, flush_interval=0.05)
+        self._apply(memory, "FACTURE", SimpleNamespace(source_entreprise='ACME'))
+
+        deadline = time.time() + 5
+        while memory.pending_usage and time.time() < deadline:
+            time.sleep(0.01)
+        assert self._stored_usage(path) == 1
+
+    def test_usage_counters_not_lost_between_workers(self, tmp_path):
+        """Chaque worker recharge les compteurs écrits par les autres"""
+        import multiprocessing
+        from types import SimpleNamespace
+
+        path = str(tmp_path / 'rules.json')
+        generation = multiprocessing.Value('Q', 0)
+        workers = [self._usage_memory(path, flush_interval=60), AIMemory(path, flush_interval=60)]
+        context = SimpleNamespace(source_entreprise='ACME')
+        for memory in workers:
+            memory.attach_generation(generation)
+
+        for memory in workers + workers:
+            self._apply(memory, "FACTURE", context)
+        for memory in workers:
+            memory.flush()
+
+        assert self._stored_usage(path) == 4
+
+    def test_usage_flush_does_not_reload_other_workers(self, tmp_path):
+        """Flush de compteurs : pas de rechargement ; nouvelle règle : rechargement"""
+        import multiprocessing
+        from types import SimpleNamespace
+
+        path = str(tmp_path / 'rules.db')
+        generation = multiprocessing.Value('Q', 0)
+        worker_a = self._usage_memory(path, flush_interval=60)
+        worker_b = AIMemory(path, flush_interval=60)
+        for memory in (worker_a, worker_b):
+            memory.attach_generation(generation)
+        context = SimpleNamespace(source_entreprise='ACME')
+
+        loads = []
+        load = worker_b._store.load
+        worker_b._store.load = lambda: loads.append(1) or load()
+
+        self._apply(worker_a, "FACTURE", context)
+        worker_a.flush()
+        assert self._apply(worker_b, "FACTURE", context).id == 'rule_usage'
+        assert loads == []
+
+        worker_a.save_rule({
+            'id': 'rule_new',
+            'name': 'rule_new',
+            'conditions': {'signature': 'rule_new'},
+            'actions': {},
+            'metadata': {'entreprise': 'ACME', 'usage_count': 0}
+        })
+        self._apply(worker_b, "FACTURE", context)
+        assert loads == [1]
+        worker_b.flush()
+        assert self._stored_usage(path) == 3
+
+    def test_sqlite_store_shared_between_instances(self, tmp_path):
+        """Base SQLite partagée sans compteur de génération (instances distinctes)"""
+        from types import SimpleNamespace
+
+        path = str(tmp_path / 'rules.db')
+        instance_a = self._usage_memory(path, flush_interval=60)
+        instance_b = AIMemory(path, flush_interval=60)
+        instance_b.save_rule({
+            'id': 'rule_b',
+            'name': 'rule_b',
+            'conditions': {'signature': 'rule_b'},
+            'actions': {},
+            'metadata': {'entreprise': 'OTHER', 'usage_count': 0}
+        })
+        context = SimpleNamespace(source_entreprise='ACME')
+
+        # instance_a voit la règle de instance_b (data_version)
+        assert instance_a.get_rule_stats()['total_rules'] == 2
+        for memory in (instance_a, instance_b, instance_a):
+            self._apply(memory, "FACTURE", context)
+        for memory in (instance_a, instance_b):
+            memory.flush()
+
+        # Incréments atomiques : aucun compteur écrasé
+        assert self._stored_usage(path) == 3
+
+    def test_sqlite_store_reopened_after_fork(self, tmp_path):
+        """Connexion fermée avant le fork, rouverte par le worker"""
+        import os
+        from types import SimpleNamespace
+
+        path = str(tmp_path / 'rules.db')
+        memory = self._usage_memory(path, flush_interval=60)
+        memory.before_fork()
+        assert memory._store._connection is None
+
+        pid = os.fork()
+        if pid == 0:
+            found = self._apply(memory, "FACTURE", SimpleNamespace(source_entreprise='ACME'))
+            os._exit(0 if found is not None and memory.flush() else 1)
+        _, status = os.waitpid(pid, 0)
+
+        assert os.WEXITSTATUS(status) == 0
+        assert self._stored_usage(path) == 1
+
+    def test_failed_reload_keeps_loaded_rules(self, tmp_path, monkeypatch):
+        """Base verrouillée pendant un rechargement : règles conservées, nouvel essai ensuite"""
+        import multiprocessing
+        import sqlite3
+        from types import SimpleNamespace
+
+        memory = self._usage_memory(str(tmp_path / 'rules.db'), flush_interval=60)
+        generation = multiprocessing.Value('Q', 0)
+        memory.attach_generation(generation)
+        generation.value += 1
+        context = SimpleNamespace(source_entreprise='ACME')
+
+        def locked():
+            raise sqlite3.OperationalError("database is locked")
+
+        monkeypatch.setattr(memory._store, 'load', locked)
+        assert self._apply(memory, "FACTURE", context).id == 'rule_usage'
+        assert memory._local_generation == 0
+
+        monkeypatch.undo()
+        self._apply(memory, "FACTURE", context)
+        assert memory._local_generation == 1
+
+    def test_sqlite_store_migrates_json_rules(self, tmp_path):
+        """rules.db vide : reprise des règles de rules.json"""
+        self._usage_memory(str(tmp_path / 'rules.json')).close()
+
+        memory = AIMemory(str(tmp_path / 'rules.db'))
+
+        assert [rule.id for rule in memory.rules] == ['rule_usage']
+        assert memory.rules[0].metadata['entreprise'] == 'ACME'
+
+
+class TestRulePersistence:
+    """Règles du Level 3 enregistrées et réutilisées (level 0)"""
+
+    TEXT = ("MARTIN PLOMBERIE\n12 rue des Lilas\nSIRET 123 456 789 00012\nDocument n° {}\n"
+            "Date 12/03/2026\nMontant 10\nMerci\nIBAN FR76 0000\n")
+
+    def test_signature_stable_across_processes(self):
+        import os
+        import subprocess
+        from utils.signature import document_signature
+
+        code = "import sys; from utils.signature import document_signature; print(document_signature(sys.argv[1]))"
+        root = str(Path(__file__).parent.parent)
+        outputs = {
+            subprocess.run([sys.executable, '-c', code, self.TEXT.format(1)], cwd=root, capture_output=True,
+                           text=True, env={**os.environ, 'PYTHONHASHSEED': seed}).stdout.strip()
+            for seed in ('1', '2')
+        }
+
+        assert outputs == {document_signature(self.TEXT.format(1))}
+        # Numéro de document différent, même gabarit
+        assert document_signature(self.TEXT.format(2)) == document_signature(self.TEXT.format(1))
+
+    def test_level3_rule_enables_fast_path(self, tmp_path):
+        engine = OCREngine("config/config.yaml")
+        engine.memory = AIMemory(str(tmp_path / 'rules.json'))
+        engine.result_cache = None
+        engine.ocr_level2.confidence_threshold = 1.01  # force le Level 3
+
+        levels = []
+        for number in (1, 2):
+            path = tmp_path / f"doc{number}.txt"
+            path.write_text(self.TEXT.format(number), encoding='utf-8')
+            levels.append(engine.process_document(str(path), 'MARTIN').level)
+
+        assert levels == [3, 0]
+        rule = engine.memory.rules[0]
+        assert 'texte_ocr_brut' not in rule.actions
+
 
 class TestDocumentTypes:
     """Tests des types de documents"""
@@ -149,6 +419,77 @@ class TestValidators:
         assert len(result.errors) == 0
 
 
+class TestMixedPDF:
+    """Tests de la détection texte/scan page par page"""
+    
+    def _loader(self, monkeypatch, page_texts):
+        from connectors.document_loader import DocumentLoader
+        
+        loader = DocumentLoader({})
+        loader.has_pypdf2 = False
+        loader.has_pdfplumber = True
+        loader.has_pytesseract = True
+        ocr_calls = []
+        
+        def fake_ocr(pdf, pages=None, **kwargs):
+            ocr_calls.append(pages)
+            return {page: f"OCR page {page} " * 10 for page in pages}
+        
+        monkeypatch.setattr(loader, '_extract_pdf_pdfplumber', lambda pdf: list(page_texts))
+        monkeypatch.setattr(loader, '_extract_pdf_ocr', fake_ocr)
+        return loader, ocr_calls
+    
+    def test_only_image_pages_are_ocrd(self, monkeypatch):
+        digital = "FACTURE N° 001 - Total TTC : 120,00 EUR - Martin's Traiteur Paris"
+        loader, ocr_calls = self._loader(monkeypatch, [digital, "", "  "])
+        
+        document = loader._load_pdf_source(self._source(), "mixed.pdf")
+        
+        assert ocr_calls == [[2, 3]]
+        assert document.metadata['ocr_mode'] == 'MIXED'
+        assert [p['ocr_mode'] for p in document.metadata['pages']] == ['TEXT', 'IMAGE', 'IMAGE']
+        assert document.get_text().startswith(digital)
+        assert "OCR page 3" in document.get_text()
+    
+    def test_text_pdf_is_not_rasterised(self, monkeypatch):
+        page = "Devis N° DEV-42 pour prestation traiteur, validité trente jours."
+        loader, ocr_calls = self._loader(monkeypatch, [page, page])
+        
+        document = loader._load_pdf_source(self._source(), "text.pdf")
+        
+        assert ocr_calls == []
+        assert document.metadata['ocr_mode'] == 'TEXT'
+    
+    def _source(self):
+        from connectors.document_loader import PDFSource
+        
+        return PDFSource(b'%PDF-1.4 /Font', 'test.pdf')
+    
+    def test_page_windows(self):
+        from connectors.document_loader import _page_windows
+        
+        assert list(_page_windows([1, 2, 3, 5, 7, 8], 2)) == [(1, 2), (3, 3), (5, 5), (7, 8)]
+
+
+class TestLoadBytes:
+    """Tests du chargement en mémoire (sans fichier temporaire)"""
+    
+    def test_load_text_bytes(self):
+        from connectors.document_loader import DocumentLoader
+        
+        loader = DocumentLoader({})
+        document = loader.load_bytes(memoryview("Facture N° 42\nTotal TTC : 12,00 €".encode('utf-8')), "upload.txt")
+        
+        assert document.filename == "upload.txt"
+        assert document.get_lines()[1] == "Total TTC : 12,00 €"
+    
+    def test_unsupported_format(self):
+        from connectors.document_loader import DocumentLoader
+        
+        with pytest.raises(ValueError):
+            DocumentLoader({}).load_bytes(b"data", "archive.rar")
+
+
 class TestLogger:
     """Tests du système de logs"""
     
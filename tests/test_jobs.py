@@ -0,0 +1,87 @@
+"""
+Tests de la file de jobs OCR asynchrones
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from jobs import JobQueue, QueueFullError, SQLiteJobBackend
+
+
+def make_queue(tmp_path, handler, **kwargs):
+    backend = SQLiteJobBackend(str(tmp_path / 'jobs.db'))
+    return JobQueue(backend, handler, retry_backoff=0, **kwargs)
+
+
+class TestJobQueue:
+    """Tests de la file de jobs"""
+
+    def test_submit_and_fetch_result(self, tmp_path):
+        queue = make_queue(tmp_path, lambda name, data, params: {'name': name, 'size': len(data)})
+        job_id = queue.submit('facture.pdf', b'%PDF', {'source_entreprise': 'auto-detect'})
+
+        assert queue.get(job_id).status == 'queued'
+        assert queue.metrics()['depth'] == 1
+
+        assert queue.run_pending() == 1
+        job = queue.get(job_id)
+        assert job.status == 'done'
+        assert job.result == {'name': 'facture.pdf', 'size': 4}
+        assert queue.metrics()['depth'] == 0
+
+    def test_retries_then_fails(self, tmp_path):
+        calls = []
+
+        def handler(name, data, params):
+            calls.append(name)
+            raise RuntimeError("tesseract crashed")
+
+        queue = make_queue(tmp_path, handler, max_attempts=2)
+        job_id = queue.submit('scan.pdf', b'x')
+        queue.run_pending()
+
+        job = queue.get(job_id)
+        assert len(calls) == 2
+        assert job.status == 'failed'
+        assert 'tesseract crashed' in job.error
+        assert queue.metrics()['retried'] == 1
+
+    def test_bounded_depth(self, tmp_path):
+        queue = make_queue(tmp_path, lambda *args: {}, max_queued=1)
+        queue.submit('a.pdf', b'a')
+
+        with pytest.raises(QueueFullError):
+            queue.submit('b.pdf', b'b')
+
+    def test_result_ttl(self, tmp_path):
+        queue = make_queue(tmp_path, lambda *args: {}, result_ttl=-1)
+        job_id = queue.submit('a.pdf', b'a')
+        queue.run_pending()
+
+        assert queue.get(job_id) is None
+        assert queue.backend.purge_expired() == 1
+
+    def test_wait_time_excludes_retry_backoff(self, tmp_path):
+        import time
+
+        calls = []
+
+        def handler(name, data, params):
+            calls.append(name)
+            if len(calls) == 1:
+                raise RuntimeError("transient")
+            return {}
+
+        queue = JobQueue(SQLiteJobBackend(str(tmp_path / 'jobs.db')), handler, retry_backoff=1.0)
+        job_id = queue.submit('scan.pdf', b'x')
+        assert queue.run_pending() == 1
+        time.sleep(1.1)
+        assert queue.run_pending() == 1
+
+        assert queue.get(job_id).status == 'done'
+        # Attente mesurée depuis la fin du délai de retry, pas depuis la soumission
+        assert queue.metrics()['avg_wait_seconds'] < 0.3
@@ -0,0 +1,64 @@
+"""
+Tests de l'automate multi-mots-clés
+"""
+
+import random
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils.keyword_automaton import KeywordAutomaton
+
+
+class TestKeywordAutomaton:
+    """Toutes les occurrences, chevauchantes et imbriquées comprises"""
+
+    def test_matches_brute_force(self):
+        rng = random.Random(3)
+        for _ in range(500):
+            keywords = [''.join(rng.choice('ab ') for _ in range(rng.randint(1, 4))) for _ in range(rng.randint(1, 6))]
+            text = ''.join(rng.choice('ab ') for _ in range(rng.randint(0, 30)))
+            automaton = KeywordAutomaton()
+            for index, keyword in enumerate(keywords):
+                automaton.add(keyword, index)
+
+            expected = sorted(
+                index for index, keyword in enumerate(keywords)
+                for pos in range(len(text)) if text.startswith(keyword, pos)
+            )
+            assert sorted(automaton.payloads(text)) == expected
+
+    def test_nested_keywords(self):
+        automaton = KeywordAutomaton()
+        automaton.add("mt production", 'logo')
+        automaton.add("mt production sarl", 'footer')
+        automaton.add("production", 'inner')
+
+        hits = list(automaton.finditer("by mt production sarl"))
+
+        assert [(pos, keyword) for pos, keyword, _ in hits] == [(3, "mt production sarl"), (6, "production")]
+        assert hits[0][2] == ('logo', 'footer')
+
+
+class TestEntrepriseDetection:
+    """Priorité : ordre des entreprises, puis logo < footer < SIRET"""
+
+    def test_priority_is_preserved(self):
+        from ocr_engine import OCREngine
+        from connectors.document_loader import Document
+
+        engine = OCREngine("config/config.yaml")
+        engine.config['entreprises'] = {'entreprises': [
+            {'name': 'A', 'siret': '11122233344455', 'identity': {'footer_patterns': ['Zeta SARL']}},
+            {'name': 'B', 'identity': {'logo_patterns': ['ALPHA']}},
+        ]}
+        engine.entreprise_automaton = engine._build_entreprise_automaton()
+
+        def detect(text):
+            return engine._detect_entreprise(Document('a.txt', text))
+
+        assert detect("Alpha traiteur") == 'B'
+        assert detect("Alpha - zeta sarl") == 'A'
+        assert detect("SIRET 11122233344455 alpha") == 'A'
+        assert detect("rien") == 'UNKNOWN'
@@ -0,0 +1,102 @@
+"""
+Tests du cycle de vie des règles mémoire (capacités, fusion, compaction)
+"""
+
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from memory.ai_memory import AIMemory, Rule
+from memory.lifecycle import RetentionPolicy, retention_score
+from memory.rule_index import RuleIndex
+from utils.text_view import TextView
+
+
+def _rule(rule_id, entreprise='ACME', header=(), usage=0, days_ago=0, success_rate=1.0):
+    last_used = (datetime.now() - timedelta(days=days_ago)).isoformat()
+    return {
+        'id': rule_id, 'name': rule_id,
+        'conditions': {'document_type': 'FACTURE', 'header_contains': list(header)},
+        'actions': {},
+        'metadata': {'entreprise': entreprise, 'usage_count': usage, 'last_used': last_used,
+                     'success_rate': success_rate}
+    }
+
+
+class TestRuleLifecycle:
+    """Mémoire bornée quel que soit le trafic"""
+
+    def test_retention_score_decays_with_age(self):
+        now = datetime.now()
+        fresh = Rule(_rule('fresh', usage=3))
+        stale = Rule(_rule('stale', usage=3, days_ago=30))
+        failing = Rule(_rule('failing', usage=3, success_rate=0.5))
+
+        assert retention_score(fresh, now, 30) == 4
+        assert abs(retention_score(stale, now, 30) - 2) < 0.01
+        assert retention_score(failing, now, 30) == 2
+
+        # Taux dérivé des compteurs d'échecs, même si success_rate n'est pas à jour
+        counted = Rule(_rule('counted', usage=3))
+        counted.metadata['failure_count'] = 3
+        assert retention_score(counted, now, 30) == 2
+
+    def test_capacity_evicts_lowest_value_rules(self, tmp_path):
+        memory = AIMemory(str(tmp_path / 'rules.db'),
+                          retention=RetentionPolicy(max_rules=4, max_rules_per_entreprise=2))
+        memory.save_rule(_rule('acme_used', header=['alpha'], usage=10))
+        memory.save_rule(_rule('acme_old', header=['beta'], usage=10, days_ago=365))
+        memory.save_rule(_rule('acme_new', header=['gamma']))
+        for i in range(3):
+            memory.save_rule(_rule(f'other_{i}', entreprise=f'OTHER{i}', header=[f'w{i}'], usage=i + 1))
+
+        # ACME au-delà de 2 : acme_old (usages anciens) ; au-delà de 4 : acme_new (jamais utilisée)
+        ids = {rule.id for rule in memory.rules}
+        assert ids == {'acme_used', 'other_0', 'other_1', 'other_2'}
+        assert {rule.id for rule in AIMemory(str(tmp_path / 'rules.db')).rules} == ids
+        assert memory.get_rule_stats()['lifecycle']['evicted'] == 2
+
+    def test_failing_rule_evicted_before_reliable_rule(self, tmp_path):
+        memory = AIMemory(str(tmp_path / 'rules.db'), flush_interval=60,
+                          retention=RetentionPolicy(max_rules_per_entreprise=2))
+        memory.save_rule(_rule('failing', header=['alpha'], usage=8))
+        memory.save_rule(_rule('reliable', header=['beta'], usage=3))
+        failing = next(rule for rule in memory.rules if rule.id == 'failing')
+        for _ in range(30):
+            memory.record_result(failing, False)
+
+        # Plus d'usages que `reliable`, mais 30 échecs sur 38 applications
+        now = datetime.now()
+        assert retention_score(failing, now, 30) < retention_score(Rule(_rule('reliable', usage=3)), now, 30)
+        memory.save_rule(_rule('newer', header=['gamma'], usage=5))
+
+        assert {rule.id for rule in memory.rules} == {'reliable', 'newer'}
+
+    def test_compact_merges_near_duplicates(self, tmp_path):
+        path = str(tmp_path / 'rules.db')
+        memory = AIMemory(path, retention=RetentionPolicy(merge_similarity=0.6))
+        memory.save_rule(_rule('main', header=['dupont sarl', 'plomberie paris'], usage=5))
+        memory.save_rule(_rule('variant', header=['dupont sarl', 'plomberie lyon'], usage=2))
+        memory.save_rule(_rule('other', header=['martin bati'], usage=1))
+
+        report = memory.compact()
+
+        assert report == {'merged': 1, 'evicted': 0, 'rules': 2}
+        stored = {rule.id: rule for rule in AIMemory(path).rules}
+        assert sorted(stored) == ['main', 'other']
+        assert stored['main'].metadata['usage_count'] == 7
+        assert stored['main'].metadata['merged_from'] == ['variant']
+        assert 'variant' not in memory._index
+
+    def test_index_remove_keeps_other_candidates(self):
+        rules = [Rule(_rule(f'r{i}', header=[f'ste fournisseur{i % 3} sarl'])) for i in range(6)]
+        index = RuleIndex(rules)
+
+        index.remove('r1')
+        index.remove('r4')
+
+        assert index.candidates(TextView("STE FOURNISSEUR1 SARL\nFacture"), 'ACME') == []
+        assert [r.id for r in index.candidates(TextView("STE FOURNISSEUR2 SARL"), 'ACME')] == ['r2', 'r5']
+        assert len(index) == 4
@@ -0,0 +1,102 @@
+"""
+Tests du registre de patterns compilés
+"""
+
+import re
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils.patterns import PatternRegistry
+
+
+class TestPatternRegistry:
+    """Compilation unique et statistiques par pattern"""
+
+    def test_compile_is_idempotent(self):
+        registry = PatternRegistry()
+        first = registry.compile('siret', r'\d{14}')
+
+        assert registry.compile('siret', r'\d{14}') is first
+        with pytest.raises(ValueError):
+            registry.compile('siret', r'\d{14}', re.IGNORECASE)
+
+    def test_stats_count_calls_and_hits(self):
+        registry = PatternRegistry()
+        total = registry.compile('total', r'TOTAL\s*(\d+)', re.IGNORECASE)
+
+        assert total.search("total 12").group(1) == '12'
+        assert total.findall("rien") == []
+        assert total.sub('X', "Total 3") == 'X'
+
+        row = registry.stats()['by_pattern'][0]
+        assert (row['name'], row['calls'], row['hits']) == ('total', 3, 2)
+
+        registry.reset_stats()
+        assert registry.stats()['calls'] == 0
+
+    def test_levels_share_engine_registry(self):
+        from levels.ocr_level1 import OCRLevel1
+        from levels.ocr_level2 import OCRLevel2
+
+        registry = PatternRegistry(collect_stats=False)
+        OCRLevel1({}, patterns=registry)
+        OCRLevel2({}, patterns=registry)
+        count = len(registry)
+
+        # Un second jeu de niveaux réutilise les patterns déjà compilés
+        OCRLevel1({}, patterns=registry)
+        assert len(registry) == count
+        assert 'level1.siret.label' in registry and 'level2.siret' in registry
+
+
+class TestTriggerScanner:
+    """Balayage unique : mêmes résultats que search / findall"""
+
+    def test_overlapping_keywords_and_digits(self):
+        from utils.patterns import DIGITS, TriggerScanner
+
+        registry = PatternRegistry()
+        total = registry.compile('total', r'Total\s*:?\s*(\d+)', re.IGNORECASE)
+        subtotal = registry.compile('subtotal', r'Subtotal\s*(\d+)', re.IGNORECASE)
+        rate = registry.compile('rate', r'(\d+)\s*%\s*TVA', re.IGNORECASE)
+        scanner = TriggerScanner(registry, 'scan')
+        scanner.add(total, ('total',))
+        scanner.add(subtotal, ('subtotal',))
+        scanner.add(rate, (DIGITS,))
+        scanner.build()
+
+        text = "SUBTOTAL 100\n20 % TVA, TVA20 % TVA\nTotal: 120"
+        scan = scanner.scan(text)
+
+        for compiled in (total, subtotal, rate):
+            assert scan.search(compiled).span() == compiled.regex.search(text).span()
+            assert scan.findall(compiled) == compiled.regex.findall(text)
+
+    def test_level1_scan_matches_full_search(self):
+        import random
+        from levels.ocr_level1 import OCRLevel1
+
+        level1 = OCRLevel1({})
+        compiled_patterns = (
+            level1.re_date_context + level1.re_date + level1.re_date_echeance + level1.re_ttc
+            + level1.re_ht + level1.re_montant_tva + level1.re_tva_rate + level1.re_client
+            + level1.re_numero_tva + [level1.re_siret_raw, level1.re_siret_label, level1.re_adresse]
+        )
+        vocabulary = [
+            "Total", "Sous-total", "HT", "TVA", "VAT", "Montant", "Net à payer", "Date", "Invoice date",
+            "Échéance", "SIRET", "N°", "Client", "À", "Bill to", "EU VAT", "12/03/2024", "15 mars 2024",
+            "24,99", "20", "%", "€", "FR12345678901", "12345678901234", "12 Rue", "Street", " ", "\n", ":"
+        ]
+        rng = random.Random(7)
+        for _ in range(200):
+            text = ''.join(rng.choice(vocabulary) + rng.choice(['', ' ', '\n']) for _ in range(40))
+            scan = level1.scanner.scan(text)
+            for compiled in compiled_patterns:
+                expected = compiled.regex.search(text)
+                found = scan.search(compiled)
+                assert (found and found.span()) == (expected and expected.span()), compiled.name
+                assert scan.findall(compiled) == compiled.regex.findall(text), compiled.name
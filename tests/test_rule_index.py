@@ -0,0 +1,107 @@
+"""
+Tests de l'index des règles mémoire
+"""
+
+import random
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from memory.ai_memory import AIMemory, Rule
+from memory.rule_index import MATCH_THRESHOLD, RuleIndex
+from utils.text_view import TextView
+
+WORDS = ['dupont', 'martin', 'sarl', 'bati', 'plomberie', 'paris', 'lyon', 'merci', 'iban', 'tel']
+
+
+class _Context:
+    def __init__(self, entreprise):
+        self.source_entreprise = entreprise
+
+
+def _rule(rule_id, entreprise, header=(), footer=(), siret=None, logo=None):
+    conditions = {'document_type': 'FACTURE', 'header_contains': list(header), 'footer_contains': list(footer)}
+    if siret:
+        conditions['siret_matches'] = siret
+    if logo:
+        conditions['logo_keywords'] = logo
+    return {'id': rule_id, 'name': rule_id, 'conditions': conditions, 'actions': {},
+            'metadata': {'entreprise': entreprise, 'usage_count': 0}}
+
+
+def _linear_best(rules, view, entreprise):
+    scored = [(rule, rule.matches(view, None)) for rule in rules if rule.metadata['entreprise'] == entreprise]
+    scored = [(rule, score) for rule, score in scored if score > MATCH_THRESHOLD]
+    return max(scored, key=lambda item: item[1])[0].id if scored else None
+
+
+class TestRuleIndex:
+    """Pré-filtre des règles plausibles"""
+
+    def test_same_selection_as_linear_scan(self):
+        rng = random.Random(3)
+        rules = []
+        for i in range(300):
+            header = [' '.join(rng.sample(WORDS, 2)) for _ in range(rng.randint(0, 2))]
+            footer = [rng.choice(WORDS)] if rng.random() < 0.5 else []
+            siret = f"{rng.randint(0, 20):014d}" if rng.random() < 0.5 else None
+            rules.append(Rule(_rule(f"r{i}", rng.choice(['A', 'B']), header, footer, siret)))
+        index = RuleIndex(rules)
+
+        for _ in range(200):
+            lines = [' '.join(rng.sample(WORDS, 3)) for _ in range(rng.randint(1, 25))]
+            if rng.random() < 0.5:
+                lines.insert(rng.randrange(len(lines)), f"SIRET 9{rng.randint(0, 20):014d}")
+            view = TextView('\n'.join(lines))
+            for entreprise in ('A', 'B', 'C'):
+                candidates = index.candidates(view, entreprise)
+                expected = _linear_best(rules, view, entreprise)
+                assert _linear_best(candidates, view, entreprise) == expected
+
+    def test_candidates_stay_few_as_rules_grow(self, tmp_path):
+        memory = AIMemory(str(tmp_path / 'rules.json'))
+        memory._set_rules([
+            Rule(_rule(f"r{i}", 'ACME', [f"fournisseur{i} sarl"], [f"iban{i}"], f"{i:014d}"))
+            for i in range(2000)
+        ])
+        text = "FOURNISSEUR1234 SARL\nFacture\nSIRET 00000000001234\nIBAN1234"
+
+        rule = memory.find_matching_rule(TextView(text), _Context('ACME'))
+
+        assert rule.id == 'r1234'
+        stats = memory.get_rule_stats()['index']
+        assert stats['rules'] == 2000
+        assert stats['avg_candidates'] <= 2
+
+    def test_find_matching_rule_same_as_linear_scan(self, tmp_path):
+        rng = random.Random(7)
+
+        def line():
+            return ' '.join(rng.choice(WORDS + ['12', '112', 'rue', 'paix']) for _ in range(rng.randint(2, 4)))
+
+        def fragment():
+            # Sous-chaîne quelconque : mots coupés au bord ("12 rue" dans "112 rue")
+            source = line()
+            start = rng.randrange(len(source))
+            return source[start:rng.randint(start + 1, len(source))]
+
+        rules = []
+        for i in range(300):
+            kind = rng.random()
+            if kind < 0.3:
+                rule = _rule(f"r{i}", 'A', logo=[fragment()])
+                del rule['conditions']['header_contains'], rule['conditions']['footer_contains']
+            else:
+                header = [fragment() for _ in range(rng.randint(0, 2))]
+                footer = [fragment() for _ in range(rng.randint(0, 1))]
+                logo = [fragment()] if kind < 0.5 else None
+                rule = _rule(f"r{i}", 'A', header, footer, logo=logo)
+            rules.append(Rule(rule))
+        memory = AIMemory(str(tmp_path / 'rules.json'))
+        memory._set_rules(rules)
+
+        for _ in range(300):
+            view = TextView('\n'.join(line() for _ in range(rng.randint(1, 25))))
+            rule = memory.find_matching_rule(view, _Context('A'))
+            assert (rule.id if rule else None) == _linear_best(rules, view, 'A')
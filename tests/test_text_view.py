@@ -0,0 +1,44 @@
+"""
+Tests des vues de texte partagées
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils.text_view import TextView, as_text_view
+
+
+class TestTextView:
+    """Formes dérivées mémorisées"""
+
+    def test_derived_forms(self):
+        view = TextView("F a c t u r e\nTotal TTC\n\nMerci")
+
+        assert view.upper_no_space == "FACTURETOTALTTCMERCI"
+        assert view.lines == ("F a c t u r e", "Total TTC", "", "Merci")
+        assert view.header_lower == "f a c t u r e total ttc  merci"
+        assert view.line_index(view.text.index("Merci")) == 3
+
+    def test_forms_are_computed_once(self):
+        view = TextView("Facture")
+        calls = []
+
+        def compute():
+            calls.append(1)
+            return view.text.strip()
+
+        assert view.memo('clean', compute) is view.memo('clean', compute)
+        assert view.lower is view.lower
+        assert calls == [1]
+
+    def test_document_shares_its_view(self):
+        from connectors.document_loader import Document
+        from utils.type_detector import detect_document_type
+
+        document = Document('a.txt', "FACTURE N° 12\nTotal TTC : 10,00 €")
+
+        assert as_text_view(document) is document.view
+        assert detect_document_type(document.view) == detect_document_type(document.get_text())
+        assert 'upper_no_space' in repr(document.view)
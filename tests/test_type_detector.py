@@ -0,0 +1,36 @@
+"""
+Tests de la détection du type de document
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils.text_view import TextView
+from utils.type_detector import detect_document_type, get_document_type_confidence, scan_document_type
+
+
+class TestTypeDetector:
+    """Tests de l'automate de mots-clés"""
+
+    def test_spaced_keywords_and_penalties(self):
+        assert detect_document_type("F A C T U R E  N° 12\nTotal TTC 10 €\n3 articles") == 'FACTURE'
+        assert detect_document_type("BON DE LIVRAISON N° 4\nFacture jointe") == 'BON_LIVRAISON'
+        assert detect_document_type("CARREFOUR\n12 ARTICLES\nMERCI DE VOTRE VISITE") == 'TICKET'
+        assert detect_document_type("   ") == 'AUTRE'
+
+    def test_confidence_uses_exact_text(self):
+        # "TOTAL TTC" compte en confiance, pas "TOTALTTC"
+        assert get_document_type_confidence("FACTURE TVA TOTAL TTC", 'FACTURE') == 0.95
+        assert get_document_type_confidence("FACTURE TVA TOTALTTC", 'FACTURE') == 0.85
+        assert get_document_type_confidence("rien", 'AUTRE') == 0.3
+
+    def test_single_pass_is_shared(self):
+        view = TextView("DEVIS N° 7\nESTIMATION")
+        evidence = scan_document_type(view)
+
+        assert detect_document_type(view) == 'DEVIS'
+        assert scan_document_type(view) is evidence
+        assert evidence.matched['DEVIS'] == ['DEVIS', 'ESTIMATION', 'DEVIS N°']
+        assert evidence.confidence_hits['DEVIS'] == ['DEVIS', 'ESTIMATION']
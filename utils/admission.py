@@ -0,0 +1,228 @@
+"""
+Contrôle d'admission des requêtes OCR
+
+Budget de coût en cours de traitement + file d'attente bornée (FIFO).
+Coût d'une requête = base + pages à rasteriser (sonde légère de l'en-tête
+PDF) + taille. Instance saturée : 429 (file pleine) ou 503 (attente trop
+longue), avec Retry-After, pour que l'autoscaler répartisse la charge.
+"""
+
+import asyncio
+import logging
+import math
+import re
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Optional
+
+logger = logging.getLogger("OCREngine.Admission")
+
+# Sonde PDF sans parsing : /Count de l'arbre des pages, sinon objets /Page
+_PDF_COUNT_RE = re.compile(rb"/Count\s+(\d+)")
+_PDF_PAGE_RE = re.compile(rb"/Type\s*/Page(?![A-Za-z])")
+
+
+def probe_pdf_pages(data: bytes) -> int:
+    """
+    Estime le nombre de pages d'un PDF sans le parser
+
+    Retourne 1 si rien n'est visible (arbre des pages compressé).
+    """
+    counts = [int(m) for m in _PDF_COUNT_RE.findall(data)]
+    if counts:
+        return max(1, max(counts))
+    return max(1, len(_PDF_PAGE_RE.findall(data)))
+
+
+class AdmissionRejected(Exception):
+    """Requête refusée : instance saturée"""
+
+    def __init__(self, status_code: int, detail: str, retry_after: int):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Sémaphore pondéré par le coût + file d'attente bornée
+
+    Les requêtes sont admises dans l'ordre d'arrivée ; une requête plus
+    chère que le budget total est ramenée au budget (elle passe seule).
+    Instance par processus, utilisée depuis la boucle asyncio.
+    """
+
+    def __init__(self,
+                 max_cost: float = 8.0,
+                 max_waiting: int = 16,
+                 max_wait_seconds: float = 20.0,
+                 retry_after_seconds: int = 5,
+                 bytes_per_unit: int = 5 * 1024 * 1024,
+                 max_cost_pages: Optional[int] = None):
+        """
+        Args:
+            max_cost: Budget de coût traité simultanément
+            max_waiting: Nombre maximal de requêtes en attente (429 au-delà)
+            max_wait_seconds: Attente maximale avant 503
+            retry_after_seconds: Retry-After minimal renvoyé
+            bytes_per_unit: Octets comptant pour une unité de coût
+            max_cost_pages: Pages PDF comptées au plus dans le coût d'un
+                document (None : toutes). Réglage propre à l'admission : le
+                pipeline rasterise toutes les pages, et
+                processing.max_pages_per_document ne borne que les pages
+                OCRisées simultanément
+        """
+        self.max_cost = float(max_cost)
+        self.max_waiting = max(0, int(max_waiting))
+        self.max_wait_seconds = float(max_wait_seconds)
+        self.retry_after_seconds = max(1, int(retry_after_seconds))
+        self.bytes_per_unit = max(1, int(bytes_per_unit))
+        self.max_cost_pages = max_cost_pages
+
+        self._in_use = 0.0
+        self._waiters = deque()  # [cost, future]
+
+        # Durée moyenne (EWMA) d'une unité de coût, pour Retry-After
+        self._seconds_per_unit: Optional[float] = None
+
+        self.admitted = 0
+        self.waited = 0
+        self.rejected_full = 0
+        self.rejected_timeout = 0
+
+    @classmethod
+    def from_config(cls, admission_config: dict) -> Optional['AdmissionController']:
+        """Construit le contrôleur depuis la section `admission` (None si désactivé)"""
+        admission_config = admission_config or {}
+        if not admission_config.get('enabled', True):
+            return None
+
+        return cls(
+            max_cost=admission_config.get('max_cost', 8),
+            max_waiting=admission_config.get('max_waiting', 16),
+            max_wait_seconds=admission_config.get('max_wait_seconds', 20),
+            retry_after_seconds=admission_config.get('retry_after_seconds', 5),
+            bytes_per_unit=admission_config.get('bytes_per_unit', 5 * 1024 * 1024),
+            max_cost_pages=admission_config.get('max_cost_pages')
+        )
+
+    def estimate_cost(self, data: bytes, filename: str) -> float:
+        """Coût estimé : 1 + pages à rasteriser + taille / bytes_per_unit"""
+        if filename.lower().endswith('.pdf') or data[:5] == b'%PDF-':
+            pages = probe_pdf_pages(data)
+            if self.max_cost_pages:
+                pages = min(pages, int(self.max_cost_pages))
+        elif filename.lower().endswith('.txt'):
+            pages = 0
+        else:
+            pages = 1
+
+        return 1.0 + pages + len(data) / self.bytes_per_unit
+
+    def retry_after(self) -> int:
+        """Délai suggéré : temps estimé pour écouler le travail en cours et en attente"""
+        if not self._seconds_per_unit:
+            return self.retry_after_seconds
+        backlog = self._in_use + sum(cost for cost, _ in self._waiters)
+        seconds = self._seconds_per_unit * backlog / self.max_cost
+        return max(self.retry_after_seconds, math.ceil(seconds))
+
+    def check_capacity(self):
+        """
+        Refus rapide (avant lecture du corps) si la file d'attente est pleine
+
+        Raises:
+            AdmissionRejected: 429
+        """
+        if self._waiters and len(self._waiters) >= self.max_waiting:
+            self.rejected_full += 1
+            raise AdmissionRejected(429, "OCR instance saturated, retry later", self.retry_after())
+
+    @asynccontextmanager
+    async def admit(self, cost: float):
+        """
+        Réserve `cost` unités pour la durée du bloc
+
+        Raises:
+            AdmissionRejected: 429 si la file est pleine, 503 après max_wait_seconds
+        """
+        cost = min(float(cost), self.max_cost)
+        await self._acquire(cost)
+
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._release(cost)
+            per_unit = (time.monotonic() - started) / cost
+            if self._seconds_per_unit is None:
+                self._seconds_per_unit = per_unit
+            else:
+                self._seconds_per_unit = 0.8 * self._seconds_per_unit + 0.2 * per_unit
+
+    async def _acquire(self, cost: float):
+        if not self._waiters and self._in_use + cost <= self.max_cost:
+            self._in_use += cost
+            self.admitted += 1
+            return
+
+        if len(self._waiters) >= self.max_waiting:
+            self.rejected_full += 1
+            raise AdmissionRejected(429, "OCR instance saturated, retry later", self.retry_after())
+
+        future = asyncio.get_running_loop().create_future()
+        entry = [cost, future]
+        self._waiters.append(entry)
+        self.waited += 1
+
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.max_wait_seconds)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled():
+                # Admise au moment de l'abandon : rendre le budget
+                self._release(cost)
+            else:
+                future.cancel()
+                self._waiters.remove(entry)
+                self._wake()
+
+            if isinstance(e, asyncio.CancelledError):
+                raise
+
+            self.rejected_timeout += 1
+            raise AdmissionRejected(503, "OCR instance busy, retry later", self.retry_after())
+
+        self.admitted += 1
+
+    def _release(self, cost: float):
+        self._in_use = max(0.0, self._in_use - cost)
+        self._wake()
+
+    def _wake(self):
+        """Admet les requêtes en tête de file tant que le budget le permet"""
+        while self._waiters:
+            cost, future = self._waiters[0]
+            if future.done():
+                self._waiters.popleft()
+                continue
+            if self._in_use > 0 and self._in_use + cost > self.max_cost:
+                break
+            self._waiters.popleft()
+            self._in_use += cost
+            future.set_result(True)
+
+    def stats(self) -> dict:
+        """État courant et compteurs"""
+        return {
+            'in_use': round(self._in_use, 2),
+            'max_cost': self.max_cost,
+            'waiting': len(self._waiters),
+            'max_waiting': self.max_waiting,
+            'admitted': self.admitted,
+            'waited': self.waited,
+            'rejected_full': self.rejected_full,
+            'rejected_timeout': self.rejected_timeout,
+            'retry_after': self.retry_after()
+        }
@@ -0,0 +1,320 @@
+"""
+Caches OCR
+
+- LRUCache : cache mémoire borné (nombre d'entrées + octets)
+- DiskCache : tier disque optionnel avec éviction par taille
+- ResultCache : cache des résultats complets, clé = SHA-256 du fichier
+  + version moteur/config
+"""
+
+import hashlib
+import json
+import logging
+import os
+import pickle
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Optional
+
+logger = logging.getLogger("OCREngine.Cache")
+
+
+def sha256_file(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+    """Calcule le SHA-256 d'un fichier par blocs"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class LRUCache:
+    """
+    Cache LRU en mémoire, thread-safe
+
+    Borné en nombre d'entrées et (optionnellement) en octets. La taille
+    de chaque entrée est fournie par l'appelant.
+    """
+
+    def __init__(self, max_entries: int = 256, max_bytes: Optional[int] = None):
+        """
+        Args:
+            max_entries: Nombre maximal d'entrées
+            max_bytes: Budget mémoire total (None = illimité)
+        """
+        self.max_entries = max(1, int(max_entries))
+        self.max_bytes = int(max_bytes) if max_bytes else None
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        """Retourne la valeur (et la marque récente) ou None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: str, value: Any, size: int = 0):
+        """Ajoute une entrée puis évince les plus anciennes si nécessaire"""
+        with self._lock:
+            if self.max_bytes is not None and size > self.max_bytes:
+                return  # Entrée plus grosse que le budget : non cachée
+
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+
+            self._entries[key] = (value, size)
+            self._bytes += size
+
+            while (len(self._entries) > self.max_entries
+                   or (self.max_bytes is not None and self._bytes > self.max_bytes)):
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        """Vide le cache"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        """Statistiques du cache"""
+        return {
+            'entries': len(self._entries),
+            'bytes': self._bytes,
+            'max_entries': self.max_entries,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions
+        }
+
+
+class DiskCache:
+    """
+    Cache disque (un fichier par entrée) avec éviction par taille totale
+
+    Les fichiers les moins récemment utilisés (mtime) sont supprimés
+    quand `max_bytes` est dépassé. Écriture atomique (tmp + rename).
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 512 * 1024 * 1024):
+        """
+        Args:
+            directory: Répertoire du cache
+            max_bytes: Taille disque maximale
+        """
+        self.directory = directory
+        self.max_bytes = int(max_bytes)
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self._bytes = sum(size for _, size, _ in self._scan())
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.bin")
+
+    def _scan(self):
+        """Liste (path, size, mtime) de toutes les entrées"""
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith('.bin'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                yield path, st.st_size, st.st_mtime
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Retourne le contenu brut de l'entrée ou None"""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path, None)  # Marque l'entrée comme récente
+        except OSError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return data
+
+    def put(self, key: str, data: bytes):
+        """Écrit une entrée puis évince si la taille totale est dépassée"""
+        if len(data) > self.max_bytes:
+            return
+
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        with self._lock:
+            try:
+                previous_size = os.path.getsize(path)
+            except OSError:
+                previous_size = 0
+
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                logger.warning(f"Disk cache write failed: {e}")
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                return
+
+            self._bytes += len(data) - previous_size
+            if self._bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """Supprime les entrées les plus anciennes jusqu'à repasser sous le budget"""
+        entries = sorted(self._scan(), key=lambda e: e[2])
+        self._bytes = sum(size for _, size, _ in entries)
+
+        for path, size, _ in entries:
+            if self._bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self._bytes -= size
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        """Statistiques du cache disque"""
+        return {
+            'directory': self.directory,
+            'bytes': self._bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions
+        }
+
+
+class ResultCache:
+    """
+    Cache des résultats OCR complets (adressé par contenu)
+
+    Clé = SHA-256 du fichier + version moteur/config + paramètres d'appel.
+    Les résultats sont stockés sérialisés (pickle) : chaque lecture
+    retourne une copie indépendante.
+    """
+
+    def __init__(self,
+                 version: str,
+                 memory_max_entries: int = 256,
+                 memory_max_bytes: Optional[int] = 64 * 1024 * 1024,
+                 disk_path: Optional[str] = None,
+                 disk_max_bytes: int = 512 * 1024 * 1024):
+        """
+        Args:
+            version: Version moteur/config (invalide le cache si elle change)
+            memory_max_entries: Nombre maximal d'entrées en mémoire
+            memory_max_bytes: Budget mémoire du tier LRU
+            disk_path: Répertoire du tier disque (None = désactivé)
+            disk_max_bytes: Taille maximale du tier disque
+        """
+        self.version = version
+        self.memory = LRUCache(memory_max_entries, memory_max_bytes)
+        self.disk = DiskCache(disk_path, disk_max_bytes) if disk_path else None
+
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+
+        logger.info(f"Result cache initialized (version={version}, disk={'on' if self.disk else 'off'})")
+
+    @classmethod
+    def from_config(cls, cache_config: dict, version: str) -> Optional['ResultCache']:
+        """Construit le cache depuis la section `result_cache` (None si désactivé)"""
+        cache_config = cache_config or {}
+        if not cache_config.get('enabled', False):
+            return None
+
+        return cls(
+            version=version,
+            memory_max_entries=cache_config.get('memory_max_entries', 256),
+            memory_max_bytes=cache_config.get('memory_max_bytes', 64 * 1024 * 1024),
+            disk_path=cache_config.get('disk_path') or None,
+            disk_max_bytes=cache_config.get('disk_max_bytes', 512 * 1024 * 1024)
+        )
+
+    def make_key(self, content_hash: str, **params) -> str:
+        """Construit la clé : hash contenu + version + paramètres de traitement"""
+        payload = json.dumps(
+            {'content': content_hash, 'version': self.version, 'params': params},
+            sort_keys=True,
+            default=str
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        """Retourne une copie du résultat caché ou None"""
+        data = self.memory.get(key)
+
+        if data is None and self.disk is not None:
+            data = self.disk.get(key)
+            if data is not None:
+                self.memory.put(key, data, len(data))  # Promotion en mémoire
+
+        if data is None:
+            self.misses += 1
+            return None
+
+        try:
+            value = pickle.loads(data)
+        except Exception as e:
+            logger.warning(f"Corrupted cache entry {key[:12]}: {e}")
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return value
+
+    def put(self, key: str, value: Any):
+        """Enregistre un résultat dans les deux tiers"""
+        try:
+            data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            logger.warning(f"Result not cacheable: {e}")
+            return
+
+        self.memory.put(key, data, len(data))
+        if self.disk is not None:
+            self.disk.put(key, data)
+        self.stores += 1
+
+    def stats(self) -> dict:
+        """Compteurs hit/miss et état des tiers"""
+        return {
+            'version': self.version,
+            'hits': self.hits,
+            'misses': self.misses,
+            'stores': self.stores,
+            'memory': self.memory.stats(),
+            'disk': self.disk.stats() if self.disk else None
+        }
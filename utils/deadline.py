@@ -0,0 +1,63 @@
+"""
+Échéances de traitement (budget temps par requête, par niveau, par page)
+"""
+
+import time
+from typing import Optional
+
+
+class DeadlineExceeded(Exception):
+    """Budget temps épuisé"""
+
+
+class Deadline:
+    """
+    Échéance sur horloge monotone
+
+    `Deadline()` ou `Deadline(None)` = pas de limite. Les budgets imbriqués
+    (niveau OCR, appel Tesseract) s'obtiennent avec `child()` et ne
+    dépassent jamais l'échéance parente.
+    """
+
+    def __init__(self, seconds: Optional[float] = None):
+        """
+        Args:
+            seconds: Budget en secondes à partir de maintenant (None = illimité)
+        """
+        self.expires_at = time.monotonic() + float(seconds) if seconds is not None else None
+
+    def child(self, seconds: Optional[float]) -> 'Deadline':
+        """Sous-budget : min(échéance courante, maintenant + seconds)"""
+        child = Deadline(seconds)
+        if child.expires_at is None or (self.expires_at is not None and self.expires_at < child.expires_at):
+            child.expires_at = self.expires_at
+        return child
+
+    def remaining(self) -> Optional[float]:
+        """Secondes restantes (None = illimité, 0 si dépassée)"""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        """True si l'échéance est dépassée"""
+        return self.expires_at is not None and time.monotonic() >= self.expires_at
+
+    def timeout(self, cap: Optional[float] = None) -> Optional[float]:
+        """Timeout à passer à un appel bloquant : min(temps restant, cap)"""
+        remaining = self.remaining()
+        if remaining is None:
+            return cap
+        return remaining if cap is None else min(remaining, cap)
+
+    def check(self, what: str = "processing"):
+        """
+        Raises:
+            DeadlineExceeded: si l'échéance est dépassée
+        """
+        if self.expired():
+            raise DeadlineExceeded(f"Time budget exhausted during {what}")
+
+    def __repr__(self) -> str:
+        remaining = self.remaining()
+        return "Deadline(unlimited)" if remaining is None else f"Deadline({remaining:.3f}s left)"
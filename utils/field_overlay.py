@@ -0,0 +1,44 @@
+"""
+Champs d'un résultat OCR en copie sur écriture
+
+Chaque niveau (2, 3) travaillait sur un deepcopy des champs du niveau
+précédent : texte brut (texte_ocr_brut) et dicts imbriqués copiés à
+chaque escalade. Un FieldOverlay n'enregistre que les champs que le
+niveau modifie, au-dessus des champs du niveau précédent (non copiés,
+jamais modifiés : les FieldValue sont remplacés, pas mutés). Les couches
+sont aplaties une seule fois en fin de traitement.
+"""
+
+from collections import ChainMap
+from typing import Dict, Mapping
+
+
+class FieldOverlay(ChainMap):
+    """
+    ChainMap des champs : maps[0] = champs écrits par le niveau courant,
+    puis ceux des niveaux précédents (lecture seule)
+
+    L'ordre d'itération est celui d'un dict copié puis complété : champs
+    existants d'abord, nouveaux champs ensuite.
+    """
+
+    @classmethod
+    def over(cls, fields: Mapping) -> 'FieldOverlay':
+        """Nouvelle couche vide au-dessus des champs du niveau précédent"""
+        if isinstance(fields, ChainMap):
+            return cls({}, *fields.maps)
+        return cls({}, fields)
+
+    @property
+    def changed(self) -> Dict:
+        """Champs ajoutés ou remplacés par le niveau courant"""
+        return self.maps[0]
+
+    def flatten(self) -> Dict:
+        """Dict ordinaire (sérialisation, cache, réponse API)"""
+        return dict(self)
+
+
+def flatten_fields(fields: Mapping) -> Dict:
+    """Aplatit des champs en couches (un dict est retourné tel quel)"""
+    return fields.flatten() if isinstance(fields, FieldOverlay) else fields
@@ -0,0 +1,94 @@
+"""
+Automate multi-mots-clés (recherche de N mots-clés en un passage)
+
+Les mots-clés sont rangés dans un trie, compilé en une expression
+régulière factorisée (ex: `mt prod(?:uction(?: sarl)?)?`) : le moteur
+`re` parcourt le trie en C à chaque position, le coût ne dépend plus du
+nombre de mots-clés. Toutes les occurrences sont rapportées, y compris
+chevauchantes ou imbriquées.
+"""
+
+import re
+from typing import Any, Dict, Iterator, List, Tuple
+
+
+class KeywordAutomaton:
+    """
+    Index de mots-clés → charges utiles (payloads)
+
+    Usage:
+        automaton = KeywordAutomaton()
+        automaton.add("facture", ("FACTURE", 3))
+        automaton.build()
+        for start, keyword, payloads in automaton.finditer(text): ...
+
+    La recherche est sensible à la casse : normaliser texte et mots-clés
+    (lower/upper) avant `add()` et `finditer()`.
+    """
+
+    def __init__(self):
+        self._payloads: Dict[str, List[Any]] = {}
+        self._implied: Dict[str, Tuple[Any, ...]] = {}
+        self._regex = None
+
+    def add(self, keyword: str, payload: Any = None):
+        """Ajoute un mot-clé (plusieurs payloads possibles par mot-clé)"""
+        self._payloads.setdefault(keyword, []).append(payload)
+        self._regex = None
+
+    def build(self) -> 'KeywordAutomaton':
+        """Construit le trie et compile l'expression"""
+        trie: dict = {}
+        for keyword in self._payloads:
+            if not keyword:
+                continue
+            node = trie
+            for char in keyword:
+                node = node.setdefault(char, {})
+            node[''] = True
+
+        # Occurrence la plus longue à une position ⇒ ses préfixes mots-clés aussi
+        self._implied = {}
+        for keyword in self._payloads:
+            payloads = []
+            for end in range(1, len(keyword) + 1):
+                payloads.extend(self._payloads.get(keyword[:end], ()))
+            self._implied[keyword] = tuple(payloads)
+
+        self._regex = re.compile(_trie_regex(trie) if trie else r'(?!)')
+        return self
+
+    def finditer(self, text: str) -> Iterator[Tuple[int, str, Tuple[Any, ...]]]:
+        """
+        Occurrences dans l'ordre des positions
+
+        Yields:
+            (position, mot-clé le plus long à cette position, payloads de ce
+            mot-clé et de ses préfixes qui sont aussi des mots-clés)
+        """
+        if self._regex is None:
+            self.build()
+        if '' in self._payloads:
+            yield 0, '', tuple(self._payloads[''])
+        search = self._regex.search
+        match = search(text)
+        while match:
+            keyword = match.group()
+            yield match.start(), keyword, self._implied[keyword]
+            match = search(text, match.start() + 1)
+
+    def payloads(self, text: str) -> List[Any]:
+        """Tous les payloads trouvés (une entrée par occurrence)"""
+        return [payload for _, _, payloads in self.finditer(text) for payload in payloads]
+
+    def __len__(self) -> int:
+        return len(self._payloads)
+
+
+def _trie_regex(node: dict) -> str:
+    """Expression d'un nœud du trie (branches longues d'abord via `?` glouton)"""
+    branches = [re.escape(char) + _trie_regex(child) for char, child in sorted(node.items()) if char]
+    if not branches:
+        return ''
+    body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+    return '(?:' + body + ')?' if '' in node else body
@@ -0,0 +1,331 @@
+"""
+Registre central des expressions régulières compilées
+
+Les niveaux OCR déclarent leurs patterns une seule fois (à la création du
+moteur) et les exécutent via le registre : pas de recompilation, pas de
+dépendance au petit cache du module `re`. Chaque pattern compte ses
+appels, ses succès et le temps passé (statistiques du moteur).
+"""
+
+import re
+import sys
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+class CompiledPattern:
+    """
+    Pattern compilé et instrumenté
+
+    Même interface que `re.Pattern` pour les méthodes utilisées par les
+    niveaux. `finditer` retourne une liste (le temps mesuré inclut
+    l'itération complète). `regex` donne accès au pattern brut.
+    """
+
+    __slots__ = ('name', 'regex', 'calls', 'hits', 'seconds', '_registry')
+
+    def __init__(self, name: str, regex: 're.Pattern', registry: 'PatternRegistry'):
+        self.name = name
+        self.regex = regex
+        self.calls = 0
+        self.hits = 0
+        self.seconds = 0.0
+        self._registry = registry
+
+    @property
+    def pattern(self) -> str:
+        return self.regex.pattern
+
+    def _run(self, method, hit, *args):
+        if not self._registry.collect_stats:
+            return method(*args)
+        started = time.perf_counter()
+        result = method(*args)
+        elapsed = time.perf_counter() - started
+        with self._registry._lock:
+            self.calls += 1
+            self.seconds += elapsed
+            if hit(result):
+                self.hits += 1
+        return result
+
+    def search(self, string: str, pos: int = 0, endpos: int = sys.maxsize):
+        return self._run(self.regex.search, _is_match, string, pos, endpos)
+
+    def match(self, string: str, pos: int = 0, endpos: int = sys.maxsize):
+        return self._run(self.regex.match, _is_match, string, pos, endpos)
+
+    def findall(self, string: str, pos: int = 0, endpos: int = sys.maxsize) -> list:
+        return self._run(self.regex.findall, bool, string, pos, endpos)
+
+    def finditer(self, string: str, pos: int = 0, endpos: int = sys.maxsize) -> list:
+        return self._run(lambda *args: list(self.regex.finditer(*args)), bool, string, pos, endpos)
+
+    def split(self, string: str, maxsplit: int = 0) -> list:
+        return self._run(self.regex.split, lambda parts: len(parts) > 1, string, maxsplit)
+
+    def sub(self, repl, string: str, count: int = 0) -> str:
+        return self._run(self.regex.subn, lambda result: result[1] > 0, repl, string, count)[0]
+
+    def __repr__(self) -> str:
+        return f"CompiledPattern({self.name!r}, {self.regex.pattern!r})"
+
+
+def _is_match(result) -> bool:
+    return result is not None
+
+
+class PatternRegistry:
+    """
+    Patterns compilés, adressés par nom ("level1.date.context.0"...)
+
+    `compile()` est idempotent pour un même (nom, pattern, flags) ; un nom
+    réutilisé avec un autre pattern lève ValueError.
+    """
+
+    def __init__(self, collect_stats: bool = True):
+        """
+        Args:
+            collect_stats: Mesurer appels / succès / temps par pattern
+        """
+        self.collect_stats = collect_stats
+        self._patterns: Dict[str, CompiledPattern] = {}
+        self._specs: Dict[str, Tuple[str, int]] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config: dict) -> 'PatternRegistry':
+        """Construit le registre depuis la section `patterns` de la config"""
+        return cls(collect_stats=(config or {}).get('collect_stats', True))
+
+    def compile(self, name: str, pattern: str, flags: int = 0) -> CompiledPattern:
+        """Compile et enregistre un pattern (ou retourne celui déjà enregistré)"""
+        with self._lock:
+            existing = self._patterns.get(name)
+            if existing is not None:
+                if self._specs[name] != (pattern, flags):
+                    raise ValueError(f"Pattern name already registered with another expression: {name}")
+                return existing
+            compiled = self._patterns[name] = CompiledPattern(name, re.compile(pattern, flags), self)
+            self._specs[name] = (pattern, flags)
+            return compiled
+
+    def compile_many(self, prefix: str, patterns: Iterable[str], flags: int = 0) -> List[CompiledPattern]:
+        """Compile une liste de patterns nommés `prefix.0`, `prefix.1`..."""
+        return [self.compile(f"{prefix}.{i}", pattern, flags) for i, pattern in enumerate(patterns)]
+
+    def __getitem__(self, name: str) -> CompiledPattern:
+        return self._patterns[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._patterns
+
+    def __len__(self) -> int:
+        return len(self._patterns)
+
+    def reset_stats(self):
+        """Remet les compteurs à zéro"""
+        with self._lock:
+            for compiled in self._patterns.values():
+                compiled.calls = compiled.hits = 0
+                compiled.seconds = 0.0
+
+    def stats(self, top: Optional[int] = None) -> dict:
+        """
+        Statistiques par pattern, triées par temps total décroissant
+
+        Args:
+            top: Nombre maximum de patterns détaillés (None = tous)
+        """
+        with self._lock:
+            rows = [
+                {
+                    'name': compiled.name,
+                    'calls': compiled.calls,
+                    'hits': compiled.hits,
+                    'total_ms': round(compiled.seconds * 1000, 3),
+                    'avg_us': round(compiled.seconds * 1e6 / compiled.calls, 2) if compiled.calls else 0.0
+                }
+                for compiled in self._patterns.values()
+            ]
+        rows.sort(key=lambda row: row['total_ms'], reverse=True)
+        return {
+            'patterns': len(rows),
+            'collect_stats': self.collect_stats,
+            'calls': sum(row['calls'] for row in rows),
+            'total_ms': round(sum(row['total_ms'] for row in rows), 3),
+            'by_pattern': rows if top is None else rows[:top]
+        }
+
+
+# Déclencheur "début de suite de chiffres" (patterns commençant par \d)
+DIGITS = '<digits>'
+
+
+class ScanResult:
+    """
+    Positions candidates relevées par TriggerScanner pour un texte
+
+    `search` / `findall` donnent les mêmes résultats que les méthodes du
+    pattern sur tout le texte, en n'essayant `match` qu'aux positions
+    candidates. Un pattern non déclaré au scanner est exécuté normalement.
+    """
+
+    def __init__(self, text: str, positions: Dict[str, List[int]], scanned: frozenset):
+        self.text = text
+        self._positions = positions
+        self._scanned = scanned
+
+    def positions(self, compiled: CompiledPattern) -> List[int]:
+        return self._positions.get(compiled.name, [])
+
+    def search(self, compiled: CompiledPattern):
+        """Équivalent de `compiled.search(text)` (correspondance la plus à gauche)"""
+        if compiled.name not in self._scanned:
+            return compiled.search(self.text)
+        return compiled._run(self._first, _is_match, compiled.regex, self.positions(compiled))
+
+    def findall(self, compiled: CompiledPattern) -> list:
+        """Équivalent de `compiled.findall(text)` (correspondances sans chevauchement)"""
+        if compiled.name not in self._scanned:
+            return compiled.findall(self.text)
+        return compiled._run(self._all, bool, compiled.regex, self.positions(compiled))
+
+    def _first(self, regex, positions):
+        text = self.text
+        for pos in positions:
+            match = regex.match(text, pos)
+            if match:
+                return match
+        return None
+
+    def _all(self, regex, positions):
+        text = self.text
+        results = []
+        end = 0
+        for pos in positions:
+            if pos < end:
+                continue
+            match = regex.match(text, pos)
+            if match:
+                results.append(_findall_item(match, regex.groups))
+                end = max(match.end(), pos + 1)
+                # Fin au milieu d'une suite de chiffres : position non relevée par le scan
+                while 0 < end < len(text) and text[end - 1].isdecimal() and text[end].isdecimal():
+                    match = regex.match(text, end)
+                    if not match:
+                        break
+                    results.append(_findall_item(match, regex.groups))
+                    end = max(match.end(), end + 1)
+        return results
+
+
+def _findall_item(match, groups: int):
+    """Élément retourné par re.findall pour cette correspondance"""
+    if groups == 0:
+        return match.group(0)
+    if groups == 1:
+        return match.group(1) or ''
+    return match.groups('')
+
+
+class TriggerScanner:
+    """
+    Balayage unique d'un texte pour un ensemble de patterns
+
+    Chaque pattern est déclaré avec ses déclencheurs : mots-clés littéraux
+    (casse ignorée) par lesquels toute correspondance commence, ou DIGITS.
+    Un passage relève les positions de chaque mot-clé (chevauchements
+    compris) dans le texte en minuscules et les débuts de suites de
+    chiffres ; chaque pattern n'est ensuite essayé (`match`) qu'à ses
+    positions. Un mot-clé dont un autre déclencheur est préfixe est absorbé
+    par celui-ci.
+    """
+
+    def __init__(self, registry: PatternRegistry, name: str):
+        """
+        Args:
+            registry: Registre où compiler les patterns du balayage
+            name: Préfixe des noms dans le registre
+        """
+        self.registry = registry
+        self.name = name
+        self._triggers: Dict[str, Tuple[str, ...]] = {}
+        self._keywords: Dict[str, Tuple[str, ...]] = {}
+        self._digit_owners: Tuple[str, ...] = ()
+        self._digits: Optional[CompiledPattern] = None
+        self._alternation: Optional[CompiledPattern] = None
+        self._built = False
+
+    def add(self, compiled: CompiledPattern, triggers: Iterable[str]):
+        """Déclare un pattern et ses déclencheurs (avant `build()`)"""
+        triggers = tuple(t if t == DIGITS else t.lower() for t in triggers)
+        if not triggers or any(t != DIGITS and (not t or t[0].isdecimal()) for t in triggers):
+            raise ValueError(f"Invalid scan triggers for {compiled.name}: {triggers}")
+        self._triggers[compiled.name] = triggers
+        self._built = False
+
+    def build(self) -> 'TriggerScanner':
+        """Réduit les mots-clés et compile les patterns du balayage"""
+        keywords = sorted({t for triggers in self._triggers.values() for t in triggers if t != DIGITS}, key=len)
+        kept = []
+        absorbed_by = {}
+        for keyword in keywords:
+            prefix = next((k for k in kept if keyword.startswith(k)), None)
+            absorbed_by[keyword] = prefix or keyword
+            if prefix is None:
+                kept.append(keyword)
+
+        owners = {keyword: [] for keyword in kept}
+        digit_owners = []
+        for name, triggers in self._triggers.items():
+            for trigger in triggers:
+                bucket = digit_owners if trigger == DIGITS else owners[absorbed_by[trigger]]
+                if name not in bucket:
+                    bucket.append(name)
+        self._keywords = {keyword: tuple(names) for keyword, names in owners.items()}
+        self._digit_owners = tuple(digit_owners)
+
+        self._digits = self.registry.compile(f"{self.name}.digits", r'\d+')
+        # Repli si lower() change la longueur du texte (positions non alignées)
+        alternation = '|'.join(re.escape(k) for k in sorted(kept, key=len, reverse=True)) or r'(?!)'
+        self._alternation = self.registry.compile(f"{self.name}.keywords", f'(?=({alternation}))', re.IGNORECASE)
+        self._built = True
+        return self
+
+    def scan(self, text: str, lower: Optional[str] = None) -> ScanResult:
+        """
+        Relève en un passage les positions candidates de chaque pattern
+
+        Args:
+            text: Texte à analyser
+            lower: text.lower() déjà calculé (ex: vue partagée du document)
+        """
+        if not self._built:
+            self.build()
+        if lower is None:
+            lower = text.lower()
+
+        found: Dict[str, List[int]] = {}
+        if len(lower) == len(text):
+            for keyword, names in self._keywords.items():
+                find = lower.find
+                pos = find(keyword)
+                while pos != -1:
+                    for name in names:
+                        found.setdefault(name, []).append(pos)
+                    pos = find(keyword, pos + 1)
+        else:
+            for match in self._alternation.finditer(text):
+                names = self._keywords.get(match.group(1).lower(), tuple(self._triggers))
+                for name in names:
+                    found.setdefault(name, []).append(match.start())
+
+        if self._digit_owners:
+            starts = [match.start() for match in self._digits.finditer(text)]
+            for name in self._digit_owners:
+                found.setdefault(name, []).extend(starts)
+
+        positions = {name: sorted(set(pos)) for name, pos in found.items()}
+        return ScanResult(text, positions, frozenset(self._triggers))
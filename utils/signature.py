@@ -0,0 +1,63 @@
+"""
+Signature de mise en page d'un document
+
+Empreinte stable (entre processus et redémarrages, contrairement à
+hash()) des premières lignes d'en-tête et dernières lignes de pied,
+normalisées : deux documents du même fournisseur, au même gabarit,
+partagent la même signature.
+"""
+
+import hashlib
+import re
+from typing import List, Tuple
+
+from utils.text_view import as_text_view
+
+# Lignes non vides retenues : 5 en-tête / 5 pied, dont 3 / 2 dans la signature
+HEADER_LINES = 5
+FOOTER_LINES = 5
+SIGNATURE_HEADER_LINES = 3
+SIGNATURE_FOOTER_LINES = 2
+
+# Clé du digest : changer la version invalide toutes les signatures
+_SIGNATURE_KEY = b'ocr-engine/layout-signature/v1'
+
+_DIGITS_RE = re.compile(r'\d+')
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def edge_lines(source) -> Tuple[List[str], List[str]]:
+    """
+    Lignes non vides d'en-tête et de pied (parmi les 10 premières / dernières)
+
+    Returns:
+        (header_lines, footer_lines)
+    """
+    lines = as_text_view(source).lines
+    header = [line.strip() for line in lines[:10] if line.strip()][:HEADER_LINES]
+    footer = [line.strip() for line in lines[-10:] if line.strip()][-FOOTER_LINES:]
+    return header, footer
+
+
+def normalize_line(line: str) -> str:
+    """Minuscules, blancs réduits, nombres remplacés (n° de facture, dates...)"""
+    line = _DIGITS_RE.sub('#', line.lower())
+    return _WHITESPACE_RE.sub(' ', line).strip()
+
+
+def document_signature(source) -> str:
+    """
+    Signature du document (hex, 16 caractères), mémorisée sur sa vue
+
+    Args:
+        source: Texte, TextView ou Document
+    """
+    view = as_text_view(source)
+
+    def compute():
+        header, footer = edge_lines(view)
+        lines = header[:SIGNATURE_HEADER_LINES] + footer[-SIGNATURE_FOOTER_LINES:]
+        payload = '\n'.join(normalize_line(line) for line in lines).encode('utf-8')
+        return hashlib.blake2b(payload, digest_size=8, key=_SIGNATURE_KEY).hexdigest()
+
+    return view.memo('signature', compute)
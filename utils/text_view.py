@@ -0,0 +1,107 @@
+"""
+Vues dérivées du texte d'un document
+
+Les formes dérivées (minuscules, majuscules, lignes, sans espaces,
+en-tête/pied, offsets de lignes) sont calculées à la première demande
+puis mémorisées : toutes les étapes du pipeline partagent le même calcul.
+"""
+
+import re
+from bisect import bisect_right
+from typing import Any, Callable, Tuple
+
+# Nombre de lignes considérées comme en-tête / pied de page
+HEADER_LINES = 10
+FOOTER_LINES = 10
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+class TextView:
+    """
+    Texte immuable + formes dérivées mémorisées
+
+    Les formes sont calculées sans verrou : deux threads peuvent calculer
+    la même forme en parallèle, le résultat est identique.
+    """
+
+    def __init__(self, text: str):
+        """
+        Args:
+            text: Texte source
+        """
+        self.text = text or ''
+        self._memo = {}
+
+    def memo(self, key: str, compute: Callable[[], Any]) -> Any:
+        """Mémorise une forme dérivée arbitraire (ex: texte nettoyé d'un niveau)"""
+        try:
+            return self._memo[key]
+        except KeyError:
+            value = self._memo[key] = compute()
+            return value
+
+    @property
+    def lower(self) -> str:
+        return self.memo('lower', self.text.lower)
+
+    @property
+    def upper(self) -> str:
+        return self.memo('upper', self.text.upper)
+
+    @property
+    def lines(self) -> Tuple[str, ...]:
+        """Lignes (split sur '\\n')"""
+        return self.memo('lines', lambda: tuple(self.text.split('\n')))
+
+    @property
+    def lines_lower(self) -> Tuple[str, ...]:
+        return self.memo('lines_lower', lambda: tuple(self.lower.split('\n')))
+
+    @property
+    def upper_no_space(self) -> str:
+        """Majuscules sans aucun blanc ("F A C T U R E" → "FACTURE")"""
+        return self.memo('upper_no_space', lambda: _WHITESPACE_RE.sub('', self.upper))
+
+    @property
+    def header_lower(self) -> str:
+        """Premières lignes jointes par un espace, en minuscules"""
+        return self.memo('header_lower', lambda: ' '.join(self.lines_lower[:HEADER_LINES]))
+
+    @property
+    def footer_lower(self) -> str:
+        """Dernières lignes jointes par un espace, en minuscules"""
+        return self.memo('footer_lower', lambda: ' '.join(self.lines_lower[-FOOTER_LINES:]))
+
+    @property
+    def line_offsets(self) -> Tuple[int, ...]:
+        """Offset de début de chaque ligne dans `text`"""
+        def compute():
+            offsets = [0]
+            for line in self.lines[:-1]:
+                offsets.append(offsets[-1] + len(line) + 1)
+            return tuple(offsets)
+        return self.memo('line_offsets', compute)
+
+    def line_index(self, offset: int) -> int:
+        """Numéro de ligne (0-based) contenant l'offset"""
+        return bisect_right(self.line_offsets, offset) - 1
+
+    def __len__(self) -> int:
+        return len(self.text)
+
+    def __str__(self) -> str:
+        return self.text
+
+    def __repr__(self) -> str:
+        return f"TextView(length={len(self.text)}, memo={sorted(self._memo)})"
+
+
+def as_text_view(source) -> TextView:
+    """Vue d'un texte, d'un Document (vue partagée) ou d'une vue existante"""
+    if isinstance(source, TextView):
+        return source
+    view = getattr(source, 'view', None)
+    if isinstance(view, TextView):
+        return view
+    return TextView(source if isinstance(source, str) else str(source))
@@ -5,17 +5,234 @@ Détection simple par mots-clés (pas d'IA)
 """
 
 import logging
-import re
-from typing import Optional
+from typing import Dict, List, Tuple, Union
+
+from utils.keyword_automaton import KeywordAutomaton
+from utils.text_view import TextView, as_text_view
 
 logger = logging.getLogger("OCREngine.TypeDetector")
 
+# Ordre de priorité en cas d'égalité de scores
+PRIORITY_ORDER = ['FACTURE', 'BON_LIVRAISON', 'DEVIS', 'BON_COMMANDE', 'TICKET']
+
+# Mots-clés de classification : (type, mot-clé, points, force)
+# Cherchés dans le texte en majuscules SANS espaces ("F A C T U R E" = "FACTURE")
+TYPE_KEYWORDS = [
+    # === FACTURE ===
+    # [FIX] Patterns renforcés avec pondération : forts = +3, moyens = +2, faibles = +1
+    ('FACTURE', 'FACTURE N°', 3, 'strong'),
+    ('FACTURE', 'INVOICE N°', 3, 'strong'),
+    ('FACTURE', 'NUMÉRO DE FACTURE', 3, 'strong'),
+    ('FACTURE', 'INVOICE NUMBER', 3, 'strong'),
+    ('FACTURE', 'FACTURE', 2, 'medium'),
+    ('FACTURE', 'INVOICE', 2, 'medium'),
+    ('FACTURE', 'FACT N°', 2, 'medium'),
+    ('FACTURE', 'FACT.', 2, 'medium'),
+    ('FACTURE', 'DATE D\'ÉCHÉANCE', 2, 'medium'),
+    ('FACTURE', 'DUE DATE', 2, 'medium'),
+    ('FACTURE', 'TOTAL TTC', 1, 'weak'),
+    ('FACTURE', 'MONTANT TTC', 1, 'weak'),
+    ('FACTURE', 'NET À PAYER', 1, 'weak'),
+    ('FACTURE', 'TVA', 1, 'weak'),
+    ('FACTURE', 'HT', 1, 'weak'),
+    
+    # === BON DE LIVRAISON ===
+    ('BON_LIVRAISON', 'BON DE LIVRAISON', 2, 'medium'),
+    ('BON_LIVRAISON', 'DELIVERY NOTE', 2, 'medium'),
+    ('BON_LIVRAISON', 'BL N°', 2, 'medium'),
+    ('BON_LIVRAISON', 'BON LIVRAISON', 2, 'medium'),
+    ('BON_LIVRAISON', 'LIVRAISON N°', 2, 'medium'),
+    
+    # === DEVIS ===
+    ('DEVIS', 'DEVIS', 2, 'medium'),
+    ('DEVIS', 'QUOTATION', 2, 'medium'),
+    ('DEVIS', 'ESTIMATION', 2, 'medium'),
+    ('DEVIS', 'QUOTE', 2, 'medium'),
+    ('DEVIS', 'DEVIS N°', 2, 'medium'),
+    
+    # === BON DE COMMANDE ===
+    ('BON_COMMANDE', 'BON DE COMMANDE', 2, 'medium'),
+    ('BON_COMMANDE', 'PURCHASE ORDER', 2, 'medium'),
+    ('BON_COMMANDE', 'BC N°', 2, 'medium'),
+    ('BON_COMMANDE', 'COMMANDE N°', 2, 'medium'),
+    ('BON_COMMANDE', 'ORDER N°', 2, 'medium'),
+    
+    # === TICKET DE CAISSE ===
+    # [FIX] Patterns affinés pour éviter faux positifs avec FACTURE
+    # Retrait : CB, CARTE BANCAIRE, TOTAL A PAYER (présents dans factures)
+    # Score augmenté (+2) car patterns plus précis
+    ('TICKET', 'TICKET DE CAISSE', 2, 'medium'),
+    ('TICKET', 'TICKET N°', 2, 'medium'),
+    ('TICKET', 'N° CAISSE', 2, 'medium'),
+    ('TICKET', 'NUMERO DE CAISSE', 2, 'medium'),
+    ('TICKET', 'CODE CAISSE', 2, 'medium'),
+    ('TICKET', 'MERCI DE VOTRE VISITE', 2, 'medium'),
+    ('TICKET', 'A BIENTOT', 2, 'medium'),
+]
+
+# Grands distributeurs (ticket) : +3 une seule fois
+DISTRIBUTEURS = ['CARREFOUR', 'LECLERC', 'AUCHAN', 'INTERMARCHE', 'LIDL', 'CASINO']
+
+# Mots-clés de confiance, cherchés tels quels dans le texte en majuscules
+CONFIDENCE_KEYWORDS = {
+    'FACTURE': ['FACTURE', 'INVOICE', 'TOTAL TTC', 'TVA'],
+    'BON_LIVRAISON': ['BON DE LIVRAISON', 'DELIVERY NOTE', 'BL'],
+    'DEVIS': ['DEVIS', 'QUOTATION', 'ESTIMATION'],
+    'BON_COMMANDE': ['BON DE COMMANDE', 'PURCHASE ORDER'],
+    'TICKET': ['TICKET', 'CAISSE', 'ARTICLE(S)']
+}
+
+# Drapeaux : exclusion BL, priorité FACTURE, "<n>ARTICLES"
+_FLAGS = ('BON', 'LIVRAISON', 'FACTURE', 'INVOICE', 'ARTICLE')
+
+# Catégories de payloads des automates
+_TYPE, _DISTRIB, _FLAG, _CONFIDENCE = 'type', 'distrib', 'flag', 'confidence'
+
+
+def _build_automata() -> Tuple[KeywordAutomaton, KeywordAutomaton]:
+    """
+    Automates compilés une seule fois à l'import
+    
+    - texte majuscules SANS blancs : mots-clés de classification (sans
+      espaces), distributeurs et drapeaux
+    - texte majuscules exact : mots-clés de confiance
+    
+    Returns:
+        (automate sans blancs, automate exact)
+    """
+    no_space = KeywordAutomaton()
+    for index, (_, keyword, _, _) in enumerate(TYPE_KEYWORDS):
+        no_space.add(keyword.replace(' ', ''), (_TYPE, index))
+    for distrib in DISTRIBUTEURS:
+        no_space.add(distrib, (_DISTRIB, distrib))
+    for flag in _FLAGS:
+        no_space.add(flag, (_FLAG, flag))
+    
+    exact = KeywordAutomaton()
+    for doc_type, keywords in CONFIDENCE_KEYWORDS.items():
+        for keyword in keywords:
+            exact.add(keyword, (_CONFIDENCE, doc_type, keyword))
+    return no_space.build(), exact.build()
+
+
+_NO_SPACE_AUTOMATON, _EXACT_AUTOMATON = _build_automata()
+
+
+class TypeEvidence:
+    """
+    Résultat de l'analyse unique des mots-clés d'un document
+
+    Attributes:
+        scores: Points par type
+        matched: Mots-clés de classification trouvés, par type
+        confidence_hits: Mots-clés de confiance trouvés, par type
+    """
+    
+    def __init__(self, scores: Dict[str, int], matched: Dict[str, List[str]],
+                 confidence_hits: Dict[str, List[str]], empty: bool = False):
+        self.scores = scores
+        self.matched = matched
+        self.confidence_hits = confidence_hits
+        self.empty = empty
+    
+    def best_type(self) -> str:
+        """Type au meilleur score (ordre de priorité si égalité), AUTRE si aucun"""
+        max_score = max(self.scores.values())
+        if self.empty or max_score == 0:
+            return 'AUTRE'
+        return next(doc_type for doc_type in PRIORITY_ORDER if self.scores[doc_type] == max_score)
+    
+    def confidence(self, detected_type: str) -> float:
+        """Confiance selon le nombre de mots-clés de confiance du type"""
+        if detected_type == 'AUTRE':
+            return 0.3
+        
+        # Score basé sur nombre de matches
+        matches = len(self.confidence_hits.get(detected_type, []))
+        if matches >= 3:
+            return 0.95
+        elif matches == 2:
+            return 0.85
+        elif matches == 1:
+            return 0.70
+        else:
+            return 0.50
+    
+    def __repr__(self) -> str:
+        return f"TypeEvidence(type={self.best_type()}, scores={self.scores})"
+
+
+def scan_document_type(text: Union[str, TextView]) -> TypeEvidence:
+    """
+    Analyse des mots-clés (mémorisée sur la vue du document)
+    
+    Type, confiance et mots-clés trouvés proviennent d'une seule liste
+    d'occurrences (un passage d'automate par forme du texte) : pas de second
+    balayage pour la confiance.
+    """
+    view = as_text_view(text)
+    return view.memo('type_evidence', lambda: _scan(view))
+
+
+def _scan(view: TextView) -> TypeEvidence:
+    no_space = view.upper_no_space
+    
+    # Un passage par forme du texte : toutes les occurrences pondérées
+    type_hits, distribs, flags = set(), set(), set()
+    digit_article = False
+    for pos, _, payloads in _NO_SPACE_AUTOMATON.finditer(no_space):
+        for payload in payloads:
+            kind, value = payload
+            if kind == _TYPE:
+                type_hits.add(value)
+            elif kind == _DISTRIB:
+                distribs.add(value)
+            else:
+                flags.add(value)
+                # Patterns spécifiques tickets : "5ARTICLES" sans espace
+                if value == 'ARTICLE' and pos > 0 and no_space[pos - 1].isdecimal():
+                    digit_article = True
+    
+    confidence_found = {(doc_type, keyword) for _, doc_type, keyword in _EXACT_AUTOMATON.payloads(view.upper)}
+    confidence_hits = {
+        doc_type: [keyword for keyword in keywords if (doc_type, keyword) in confidence_found]
+        for doc_type, keywords in CONFIDENCE_KEYWORDS.items()
+    }
+    
+    scores = {doc_type: 0 for doc_type in PRIORITY_ORDER}
+    matched: Dict[str, List[str]] = {doc_type: [] for doc_type in PRIORITY_ORDER}
+    for index in sorted(type_hits):
+        doc_type, keyword, points, strength = TYPE_KEYWORDS[index]
+        scores[doc_type] += points
+        matched[doc_type].append(keyword)
+        logger.debug(f"  ✓ {doc_type} {strength}: '{keyword}' matched")
+    
+    # Exclure si c'est un BL
+    if 'BON' in flags and 'LIVRAISON' in flags:
+        scores['FACTURE'] = max(0, scores['FACTURE'] - 3)
+    
+    if digit_article:
+        scores['TICKET'] += 2
+        matched['TICKET'].append('<n> ARTICLES')
+    
+    # Détection grands distributeurs (ticket) : score renforcé
+    distrib = next((d for d in DISTRIBUTEURS if d in distribs), None)
+    if distrib:
+        scores['TICKET'] += 3
+        matched['TICKET'].append(distrib)
+    
+    # [FIX] PRIORITÉ FACTURE : Si "FACTURE" détecté, pénaliser TICKET
+    if ('FACTURE' in flags or 'INVOICE' in flags) and scores['FACTURE'] > 0:
+        scores['TICKET'] = max(0, scores['TICKET'] - 3)
+    
+    return TypeEvidence(scores, matched, confidence_hits, empty=not view.text.strip())
+
 
-def detect_document_type(text: str) -> str:
+def detect_document_type(text: Union[str, TextView]) -> str:
     """
     Détecte le type de document basé sur le contenu textuel
     
-    Règles simples par mots-clés :
+    Règles simples par mots-clés (TYPE_KEYWORDS) :
     - FACTURE : "facture", "invoice", "total TTC", "TVA"
     - BON_LIVRAISON : "bon de livraison", "delivery note", "BL"
     - DEVIS : "devis", "quotation", "estimation"
@@ -24,11 +241,14 @@ def detect_document_type(text: str) -> str:
     - AUTRE : si aucun match
     
     Args:
-        text: Texte extrait du document
+        text: Texte extrait du document (ou sa TextView, formes dérivées partagées)
     
     Returns:
         Type de document (FACTURE, BON_LIVRAISON, DEVIS, BON_COMMANDE, TICKET, AUTRE)
     """
+    view = as_text_view(text)
+    text = view.text
+    
     if not text or not text.strip():
         logger.warning("detect_document_type: empty text, returning AUTRE")
         return 'AUTRE'
@@ -41,153 +261,9 @@ def detect_document_type(text: str) -> str:
     logger.info(f"[OCR_TEXT_BRUT] Longueur totale: {len(text)} caractères")
     logger.info("=" * 80)
     
-    text_upper = text.upper()
-    
-    # [FIX] Nettoyer espaces multiples causés par certains PDF (PyPDF2)
-    # Exemple : "F a c t u r e" devient "FACTURE"
-    text_normalized = re.sub(r'\s+', ' ', text_upper)  # Normaliser espaces
-    
-    # [FIX CRITIQUE] Supprimer TOUS les espaces pour matching robuste
-    # Permet de matcher "F A C T U R E" avec "FACTURE"
-    text_no_spaces = text_normalized.replace(' ', '')
-    
-    # Score par type
-    scores = {
-        'FACTURE': 0,
-        'BON_LIVRAISON': 0,
-        'DEVIS': 0,
-        'BON_COMMANDE': 0,
-        'TICKET': 0
-    }
-    
-    # === FACTURE ===
-    # [FIX] Patterns renforcés avec pondération
-    facture_keywords_strong = [
-        'FACTURE N°',
-        'INVOICE N°',
-        'NUMÉRO DE FACTURE',
-        'INVOICE NUMBER'
-    ]
-    
-    facture_keywords_medium = [
-        'FACTURE',
-        'INVOICE',
-        'FACT N°',
-        'FACT.',
-        'DATE D\'ÉCHÉANCE',
-        'DUE DATE'
-    ]
-    
-    facture_keywords_weak = [
-        'TOTAL TTC',
-        'MONTANT TTC',
-        'NET À PAYER',
-        'TVA',
-        'HT'
-    ]
-    
-    # Patterns forts = +3 points
-    for kw in facture_keywords_strong:
-        kw_no_space = kw.replace(' ', '')
-        if kw_no_space in text_no_spaces:
-            scores['FACTURE'] += 3
-            logger.debug(f"  ✓ FACTURE strong: '{kw}' matched")
-    
-    # Patterns moyens = +2 points
-    for kw in facture_keywords_medium:
-        kw_no_space = kw.replace(' ', '')
-        if kw_no_space in text_no_spaces:
-            scores['FACTURE'] += 2
-            logger.debug(f"  ✓ FACTURE medium: '{kw}' matched")
-    
-    # Patterns faibles = +1 point
-    for kw in facture_keywords_weak:
-        kw_no_space = kw.replace(' ', '')
-        if kw_no_space in text_no_spaces:
-            scores['FACTURE'] += 1
-            logger.debug(f"  ✓ FACTURE weak: '{kw}' matched")
-    
-    # Exclure si c'est un BL
-    if 'BON' in text_no_spaces and 'LIVRAISON' in text_no_spaces:
-        scores['FACTURE'] = max(0, scores['FACTURE'] - 3)
-    
-    # === BON DE LIVRAISON ===
-    bl_keywords = [
-        'BON DE LIVRAISON',
-        'DELIVERY NOTE',
-        'BL N°',
-        'BON LIVRAISON',
-        'LIVRAISON N°'
-    ]
-    
-    for kw in bl_keywords:
-        kw_no_space = kw.replace(' ', '')
-        if kw_no_space in text_no_spaces:
-            scores['BON_LIVRAISON'] += 2
-    
-    # === DEVIS ===
-    devis_keywords = [
-        'DEVIS',
-        'QUOTATION',
-        'ESTIMATION',
-        'QUOTE',
-        'DEVIS N°'
-    ]
-    
-    for kw in devis_keywords:
-        kw_no_space = kw.replace(' ', '')
-        if kw_no_space in text_no_spaces:
-            scores['DEVIS'] += 2
-    
-    # === BON DE COMMANDE ===
-    bc_keywords = [
-        'BON DE COMMANDE',
-        'PURCHASE ORDER',
-        'BC N°',
-        'COMMANDE N°',
-        'ORDER N°'
-    ]
-    
-    for kw in bc_keywords:
-        kw_no_space = kw.replace(' ', '')
-        if kw_no_space in text_no_spaces:
-            scores['BON_COMMANDE'] += 2
-    
-    # === TICKET DE CAISSE ===
-    # [FIX] Patterns affinés pour éviter faux positifs avec FACTURE
-    # Retrait : CB, CARTE BANCAIRE, TOTAL A PAYER (présents dans factures)
-    ticket_keywords = [
-        'TICKET DE CAISSE',  # Pattern spécifique
-        'TICKET N°',
-        'N° CAISSE',
-        'NUMERO DE CAISSE',
-        'CODE CAISSE',
-        'MERCI DE VOTRE VISITE',
-        'A BIENTOT'
-    ]
-    
-    for kw in ticket_keywords:
-        kw_no_space = kw.replace(' ', '')
-        if kw_no_space in text_no_spaces:
-            scores['TICKET'] += 2  # Score augmenté car patterns plus précis
-    
-    # Patterns spécifiques tickets
-    if re.search(r'\d+ARTICLE', text_no_spaces):  # "5ARTICLES" sans espace
-        scores['TICKET'] += 2
-    
-    # Détection grands distributeurs (ticket)
-    distributeurs = ['CARREFOUR', 'LECLERC', 'AUCHAN', 'INTERMARCHE', 'LIDL', 'CASINO']
-    for distrib in distributeurs:
-        if distrib in text_no_spaces:
-            scores['TICKET'] += 3  # Score renforcé pour grande distribution
-            break
-    
-    # [FIX] PRIORITÉ FACTURE : Si "FACTURE" détecté, pénaliser TICKET
-    if 'FACTURE' in text_no_spaces or 'INVOICE' in text_no_spaces:
-        if scores['FACTURE'] > 0:
-            scores['TICKET'] = max(0, scores['TICKET'] - 3)  # Réduction score ticket
-    
-    # === SÉLECTION DU TYPE ===
+    # Analyse unique (mots-clés, drapeaux, confiance)
+    evidence = scan_document_type(view)
+    scores = evidence.scores
     max_score = max(scores.values())
     
     # [FIX] LOGGING EXHAUSTIF - Tous les scores
@@ -201,31 +277,22 @@ def detect_document_type(text: str) -> str:
         logger.warning(f"[TYPE_DETECTION] Aucun mot-clé matché → AUTRE")
         return 'AUTRE'
     
-    # Prendre le type avec le meilleur score
     detected_types = [doc_type for doc_type, score in scores.items() if score == max_score]
-    
-    # Si égalité, ordre de priorité
-    priority_order = ['FACTURE', 'BON_LIVRAISON', 'DEVIS', 'BON_COMMANDE', 'TICKET']
-    
     if len(detected_types) > 1:
         logger.warning(f"[TYPE_DETECTION] Égalité de scores ({max_score}) entre: {detected_types}")
-        logger.warning(f"[TYPE_DETECTION] Application ordre de priorité: {priority_order}")
-    
-    for doc_type in priority_order:
-        if doc_type in detected_types:
-            logger.info(f"[TYPE_DETECTION] ✅ TYPE FINAL = {doc_type} (score: {max_score})")
-            return doc_type
+        logger.warning(f"[TYPE_DETECTION] Application ordre de priorité: {PRIORITY_ORDER}")
     
-    logger.warning(f"[TYPE_DETECTION] Fallback → AUTRE")
-    return 'AUTRE'
+    doc_type = evidence.best_type()
+    logger.info(f"[TYPE_DETECTION] ✅ TYPE FINAL = {doc_type} (score: {max_score})")
+    return doc_type
 
 
-def get_document_type_confidence(text: str, detected_type: str) -> float:
+def get_document_type_confidence(text: Union[str, TextView], detected_type: str) -> float:
     """
     Calcule un score de confiance pour le type détecté
     
     Args:
-        text: Texte du document
+        text: Texte du document (ou sa TextView : réutilise le passage de detect_document_type)
         detected_type: Type détecté
     
     Returns:
@@ -233,30 +300,7 @@ def get_document_type_confidence(text: str, detected_type: str) -> float:
     """
     if detected_type == 'AUTRE':
         return 0.3
-    
-    # Recompter les mots-clés pour le type détecté
-    text_upper = text.upper()
-    
-    keyword_map = {
-        'FACTURE': ['FACTURE', 'INVOICE', 'TOTAL TTC', 'TVA'],
-        'BON_LIVRAISON': ['BON DE LIVRAISON', 'DELIVERY NOTE', 'BL'],
-        'DEVIS': ['DEVIS', 'QUOTATION', 'ESTIMATION'],
-        'BON_COMMANDE': ['BON DE COMMANDE', 'PURCHASE ORDER'],
-        'TICKET': ['TICKET', 'CAISSE', 'ARTICLE(S)']
-    }
-    
-    keywords = keyword_map.get(detected_type, [])
-    matches = sum(1 for kw in keywords if kw in text_upper)
-    
-    # Score basé sur nombre de matches
-    if matches >= 3:
-        return 0.95
-    elif matches == 2:
-        return 0.85
-    elif matches == 1:
-        return 0.70
-    else:
-        return 0.50
+    return scan_document_type(text).confidence(detected_type)
 
 
 if __name__ == "__main__":